@@ -0,0 +1,352 @@
+"""
+数据库在线备份与恢复
+
+使用 SQLite 备份接口分步复制数据库页：每步只短暂占用读锁，步骤之间其他客户端可以继续写入；
+复制期间源库被修改时，备份接口会自动从头重新复制，得到的始终是某一时刻的一致快照。
+快照按时间命名，写入临时文件并通过完整性检查后才改为正式文件名，只保留最近若干份。
+"""
+
+import os
+import re
+import gzip
+import time
+import shutil
+import logging
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from database.db_init import upgrade_schema
+
+# 每步复制的页数及步骤之间的间隔（秒）
+BACKUP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+
+# 默认保留的快照份数
+KEEP_BACKUPS = 10
+
+# 自动备份间隔（小时）
+AUTO_BACKUP_HOURS = 24
+
+BACKUP_SUFFIXES = ('.db', '.db.gz')
+TIME_FORMAT = '%Y%m%d-%H%M%S'
+# 恢复前自动备份的标签
+RESTORE_LABEL = 'before-restore'
+
+# 快照文件名: 数据库名-时间[-标签].db[.gz]
+SNAPSHOT_PATTERN = re.compile(r'^(?P<time>\d{8}-\d{6})(?:-(?P<label>[\w-]+))?$')
+
+logger = logging.getLogger(__name__)
+
+
+class BackupError(Exception):
+    """备份或恢复失败（快照损坏、文件无法写入等）"""
+
+
+def default_backup_dir(db_path):
+    """默认的备份目录：数据库文件所在目录下的 backups"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
+
+
+def _base_name(db_path):
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+
+def _copy_pages(source, dest, pages=BACKUP_PAGES, sleep=BACKUP_STEP_SLEEP, progress=None):
+    """分步复制数据库，progress(剩余页数, 总页数)"""
+    source.backup(dest, pages=pages, sleep=sleep,
+                  progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None)
+
+
+def verify_backup(path, compressed=None):
+    """检查快照的完整性，损坏时抛出 BackupError；compressed 为 None 时按 .gz 后缀判断"""
+    with _opened_snapshot(path, compressed) as db_file:
+        conn = sqlite3.connect(f"{Path(os.path.abspath(db_file)).as_uri()}?mode=ro", uri=True)
+        try:
+            result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        except sqlite3.DatabaseError as e:
+            raise BackupError(f"备份文件已损坏: {path}: {str(e)}")
+        finally:
+            conn.close()
+    if result != ['ok']:
+        raise BackupError(f"备份文件完整性检查失败: {path}\n" + "\n".join(result[:10]))
+
+
+class _opened_snapshot:
+    """以数据库文件的形式打开快照：压缩的快照解压到临时文件，用完后删除"""
+
+    def __init__(self, path, compressed=None):
+        self.path = path
+        self.compressed = path.endswith('.gz') if compressed is None else compressed
+        self._temp = None
+
+    def __enter__(self):
+        if not self.compressed:
+            return self.path
+        fd, self._temp = tempfile.mkstemp(suffix='.db')
+        with os.fdopen(fd, 'wb') as out, gzip.open(self.path, 'rb') as src:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+        return self._temp
+
+    def __exit__(self, *exc):
+        if self._temp and os.path.exists(self._temp):
+            os.remove(self._temp)
+
+
+def backup_to_file(db_path, target_path, compress=False, progress=None):
+    """备份数据库到指定文件，通过完整性检查后才写入正式文件名，返回文件路径"""
+    target_dir = os.path.dirname(os.path.abspath(target_path))
+    os.makedirs(target_dir, exist_ok=True)
+    # 先写入隐藏的临时文件，检查通过后再改名，备份目录中不会出现不完整的快照
+    partial = os.path.join(target_dir, f".{os.path.basename(target_path)}.partial")
+    partial_db = partial + '.db' if compress else partial
+
+    start = time.perf_counter()
+    try:
+        source = sqlite3.connect(db_path)
+        try:
+            source.execute("PRAGMA busy_timeout = 3000")
+            dest = sqlite3.connect(partial_db)
+            try:
+                _copy_pages(source, dest, progress=progress)
+            finally:
+                dest.close()
+        finally:
+            source.close()
+
+        if compress:
+            with open(partial_db, 'rb') as src, gzip.open(partial, 'wb', compresslevel=6) as out:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            os.remove(partial_db)
+        verify_backup(partial, compressed=compress)
+        os.replace(partial, target_path)
+    except sqlite3.Error as e:
+        raise BackupError(f"备份数据库失败: {str(e)}")
+    finally:
+        for path in {partial, partial_db}:
+            if os.path.exists(path):
+                os.remove(path)
+    logger.info(f"数据库已备份到 {target_path}（{os.path.getsize(target_path) / 1024:.0f} KB，"
+                f"耗时 {time.perf_counter() - start:.2f} 秒）")
+    return target_path
+
+
+def create_backup(db_path, backup_dir=None, keep=KEEP_BACKUPS, compress=False, progress=None, label=None):
+    """在备份目录中创建带时间戳的快照，并删除超出保留份数的旧快照，返回快照路径
+
+    label 为文件名中时间之后的标签（如恢复前的自动备份），同一秒内的多次备份自动编号。
+    """
+    backup_dir = backup_dir or default_backup_dir(db_path)
+    suffix = '.db.gz' if compress else '.db'
+    stem = f"{_base_name(db_path)}-{datetime.now():{TIME_FORMAT}}"
+    target = os.path.join(backup_dir, f"{stem}{'-' + label if label else ''}{suffix}")
+    counter = 1
+    while os.path.exists(target):
+        counter += 1
+        target = os.path.join(backup_dir, f"{stem}-{label + '-' if label else ''}{counter}{suffix}")
+    backup_to_file(db_path, target, compress=compress, progress=progress)
+    if keep:
+        prune_backups(db_path, backup_dir, keep)
+    return target
+
+
+def list_backups(db_path, backup_dir=None):
+    """备份目录中该数据库的快照 [(路径, 备份时间, 字节数)]，最新的在前（同一秒内按文件名）"""
+    return [(path, when, size) for path, when, size, _ in _list_snapshots(db_path, backup_dir)]
+
+
+def _list_snapshots(db_path, backup_dir=None):
+    """同 list_backups，每项另带文件名中的标签（没有则为 None）"""
+    backup_dir = backup_dir or default_backup_dir(db_path)
+    if not os.path.isdir(backup_dir):
+        return []
+    prefix = _base_name(db_path) + '-'
+    backups = []
+    for name in os.listdir(backup_dir):
+        suffix = next((s for s in BACKUP_SUFFIXES if name.endswith(s)), None)
+        if not name.startswith(prefix) or suffix is None:
+            continue
+        match = SNAPSHOT_PATTERN.match(name[len(prefix):-len(suffix)])
+        if match is None:
+            continue
+        try:
+            when = datetime.strptime(match.group('time'), TIME_FORMAT)
+        except ValueError:
+            continue
+        path = os.path.join(backup_dir, name)
+        backups.append((path, when, os.path.getsize(path), match.group('label')))
+    backups.sort(key=lambda item: (item[1], os.path.getmtime(item[0])), reverse=True)
+    return backups
+
+
+def _is_restore_label(label):
+    """是否为恢复前自动备份的标签（同一秒内的多次备份带编号）"""
+    return label is not None and (label == RESTORE_LABEL or label.startswith(RESTORE_LABEL + '-'))
+
+
+def prune_backups(db_path, backup_dir=None, keep=KEEP_BACKUPS):
+    """只保留最新的 keep 份快照，返回删除的文件；恢复前的自动备份不计入份数，也不删除"""
+    removed = []
+    snapshots = [path for path, _, _, label in _list_snapshots(db_path, backup_dir) if not _is_restore_label(label)]
+    for path in snapshots[keep:]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError as e:
+            logger.warning(f"删除旧备份失败: {path}: {str(e)}")
+    return removed
+
+
+def restore_backup(snapshot_path, db_path, keep_current=True):
+    """用快照恢复数据库
+
+    先检查快照完整性，keep_current 时再备份当前数据库；快照复制到临时文件并升级到当前的表结构
+    （旧版本的快照缺少后来迁移增加的表和列），然后通过备份接口整体写回，
+    正在运行的其他连接不需要重新打开。数据表版本号调整为比恢复前更大，
+    保证各缓存和窗口都会重新加载。返回恢复前的备份路径（没有则为 None）。
+    """
+    verify_backup(snapshot_path)
+    safety = None
+    if keep_current and os.path.exists(db_path):
+        safety = create_backup(db_path, os.path.dirname(os.path.abspath(snapshot_path)), keep=0,
+                               label=RESTORE_LABEL)
+
+    with _opened_snapshot(snapshot_path) as snapshot_file, tempfile.TemporaryDirectory(prefix='restore-') as tmp:
+        # 在副本上升级，不修改备份文件本身；升级失败时当前数据库保持不变
+        upgraded = os.path.join(tmp, 'restore.db')
+        shutil.copyfile(snapshot_file, upgraded)
+        conn = sqlite3.connect(upgraded)
+        try:
+            upgrade_schema(conn)
+        except sqlite3.Error as e:
+            raise BackupError(f"升级备份文件的表结构失败: {str(e)}")
+        finally:
+            conn.close()
+
+        source = sqlite3.connect(upgraded)
+        dest = sqlite3.connect(db_path)
+        try:
+            dest.execute("PRAGMA busy_timeout = 10000")
+            versions = _read_versions(dest)
+            source.backup(dest)
+            if versions and _has_table(dest, 'table_versions'):
+                cursor = dest.cursor()
+                for table_name, version in versions.items():
+                    cursor.execute("""
+                                   INSERT INTO table_versions (table_name, version)
+                                   VALUES (?, ?)
+                                   ON CONFLICT(table_name) DO UPDATE SET version = MAX(version, excluded.version) + 1
+                                   """, (table_name, version + 1))
+                dest.commit()
+        except sqlite3.Error as e:
+            raise BackupError(f"恢复数据库失败: {str(e)}")
+        finally:
+            source.close()
+            dest.close()
+    logger.info(f"已从 {snapshot_path} 恢复数据库" + (f"，恢复前的数据已备份到 {safety}" if safety else ""))
+    return safety
+
+
+def _has_table(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (table_name,)).fetchone() is not None
+
+
+def _read_versions(conn):
+    try:
+        return dict(conn.execute("SELECT table_name, version FROM table_versions"))
+    except sqlite3.Error:
+        return {}
+
+
+class _BackupSignals(QObject):
+    progress = pyqtSignal(int, int)  # 剩余页数, 总页数
+    finished = pyqtSignal(str)  # 快照路径
+    failed = pyqtSignal(str)  # 错误信息
+
+
+class _BackupTask(QRunnable):
+    def __init__(self, func, signals):
+        super().__init__()
+        self.func = func
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.func(self.signals.progress.emit))
+        except Exception as e:
+            logger.error(f"备份数据库错误: {str(e)}")
+            self.signals.failed.emit(str(e))
+
+
+class BackupService(QObject):
+    """在后台线程中备份数据库，并按间隔自动备份
+
+    同一时间只执行一个备份任务；自动备份每小时检查一次最新快照的时间。
+    """
+    backup_started = pyqtSignal()
+    backup_progress = pyqtSignal(int, int)
+    backup_finished = pyqtSignal(str)
+    backup_failed = pyqtSignal(str)
+
+    def __init__(self, db_path, backup_dir=None, keep=KEEP_BACKUPS, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.backup_dir = backup_dir or default_backup_dir(db_path)
+        self.keep = keep
+        self.running = False
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._signals = _BackupSignals()
+        self._signals.progress.connect(self.backup_progress)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._auto_timer = None
+        self._auto_hours = AUTO_BACKUP_HOURS
+
+    def backup_now(self, compress=False):
+        """开始备份，已有备份在进行时返回 False"""
+        if self.running:
+            return False
+        self.running = True
+        self.backup_started.emit()
+        self._pool.start(_BackupTask(
+            lambda progress: create_backup(self.db_path, self.backup_dir, self.keep, compress, progress),
+            self._signals
+        ))
+        return True
+
+    def start_auto_backup(self, hours=AUTO_BACKUP_HOURS, check_interval_ms=60 * 60 * 1000):
+        """最新快照超过 hours 小时时自动备份（启动时检查一次，之后每小时检查）"""
+        self._auto_hours = hours
+        if self._auto_timer is None:
+            self._auto_timer = QTimer(self)
+            self._auto_timer.timeout.connect(self.check_auto_backup)
+        self._auto_timer.start(check_interval_ms)
+        self.check_auto_backup()
+
+    def check_auto_backup(self):
+        backups = list_backups(self.db_path, self.backup_dir)
+        if not backups or (datetime.now() - backups[0][1]).total_seconds() >= self._auto_hours * 3600:
+            self.backup_now(compress=True)
+
+    def list_backups(self):
+        return list_backups(self.db_path, self.backup_dir)
+
+    def wait(self):
+        """等待正在进行的备份结束"""
+        self._pool.waitForDone()
+
+    def stop(self):
+        if self._auto_timer is not None:
+            self._auto_timer.stop()
+        self.wait()
+
+    def _on_finished(self, path):
+        self.running = False
+        self.backup_finished.emit(path)
+
+    def _on_failed(self, error):
+        self.running = False
+        self.backup_failed.emit(error)
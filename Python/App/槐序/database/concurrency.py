@@ -0,0 +1,237 @@
+"""
+多个客户端共用一个数据库文件时的写入控制
+
+scores、classroom_scores、assignment_submissions 带 row_version 列，记录每次修改后由触发器加一。
+界面读取记录时同时记下 row_version，保存时只在版本号未变时写入（乐观锁）；
+版本号已变说明其他人修改过，按字段三方合并，双方改了同一字段时再询问用户。
+
+写入使用 BEGIN IMMEDIATE 短事务：一开始就取得写锁，不会在事务中途因为升级锁而报
+"database is locked"；取不到写锁时等待 busy_timeout，仍失败则退避后重试。
+在界面线程中只短暂等待锁，退避期间用 QTimer 驱动的事件循环等待，界面不会卡住。
+"""
+
+import time
+import random
+import logging
+import sqlite3
+from PyQt5.QtCore import QCoreApplication, QEventLoop, QThread, QTimer
+
+# 等待其他客户端释放锁的最长时间（毫秒）
+BUSY_TIMEOUT_MS = 3000
+
+# 界面线程中取写锁时等待的时间（毫秒），取不到时退避重试而不是阻塞界面
+GUI_BUSY_TIMEOUT_MS = 100
+
+# 写入重试次数及退避时间（秒）
+WRITE_RETRIES = 8
+BACKOFF_BASE = 0.05
+BACKOFF_MAX = 1.0
+
+# 合并冲突最多重试的轮数（每轮都可能又被其他人修改）
+MERGE_ROUNDS = 3
+
+logger = logging.getLogger(__name__)
+
+
+class RowConflict:
+    """一条版本冲突的记录
+
+    key: 主键值；base: 读取时的值（新记录为 None）；mine: 本次要写入的值（删除记录时为 None）；
+    theirs: 数据库中的当前值（已被删除时为 None）；version: 当前版本号。
+    values 和 theirs 的字段顺序与保存时的 value_columns 相同。
+    """
+
+    def __init__(self, key, base, mine, theirs, version):
+        self.key = key
+        self.base = base
+        self.mine = mine
+        self.theirs = theirs
+        self.version = version
+
+    def conflicting_fields(self):
+        """双方都修改了且结果不同的字段下标；一方删除了记录时，另一方修改过的字段都算冲突"""
+        if self.mine is None:
+            if self.theirs is None:
+                return []
+            base = self.base if self.base is not None else (None,) * len(self.theirs)
+            return [i for i, (b, t) in enumerate(zip(base, self.theirs)) if t != b]
+        if self.theirs is None:
+            return list(range(len(self.mine)))
+        base = self.base if self.base is not None else (None,) * len(self.mine)
+        return [i for i, (b, m, t) in enumerate(zip(base, self.mine, self.theirs))
+                if m != t and m != b and t != b]
+
+    def auto_merge(self):
+        """按字段合并：只有一方修改的字段取修改后的值；存在真正冲突或删除了记录时返回 None"""
+        if self.mine is None or self.theirs is None or self.conflicting_fields():
+            return None
+        base = self.base if self.base is not None else (None,) * len(self.mine)
+        return tuple(t if m == b else m for b, m, t in zip(base, self.mine, self.theirs))
+
+
+def configure_connection(conn, busy_timeout_ms=BUSY_TIMEOUT_MS):
+    """设置等待锁的超时时间（默认遇到锁立即报错）"""
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+
+
+def is_busy_error(error):
+    """是否为数据库被其他连接锁定的错误"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+def _in_gui_thread():
+    app = QCoreApplication.instance()
+    return app is not None and QThread.currentThread() == app.thread()
+
+
+def _begin_immediate(conn, gui_thread):
+    """开始写事务；界面线程中只短暂等待写锁"""
+    if not gui_thread:
+        conn.execute("BEGIN IMMEDIATE")
+        return
+    busy_timeout = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    conn.execute(f"PRAGMA busy_timeout = {min(busy_timeout, GUI_BUSY_TIMEOUT_MS)}")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    finally:
+        conn.execute(f"PRAGMA busy_timeout = {busy_timeout}")
+
+
+def _wait(delay, gui_thread):
+    """退避等待：界面线程中继续处理绘制等事件（不处理用户输入，避免重复操作），其他线程直接休眠"""
+    if not gui_thread:
+        time.sleep(delay)
+        return
+    loop = QEventLoop()
+    QTimer.singleShot(int(delay * 1000), loop.quit)
+    loop.exec_(QEventLoop.ExcludeUserInputEvents)
+
+
+def write_transaction(conn, func, retries=WRITE_RETRIES):
+    """在 BEGIN IMMEDIATE 短事务中执行 func(cursor) 并提交，返回 func 的结果
+
+    数据库被锁定时回滚并按指数退避（带随机抖动）重试，其他错误回滚后抛出。
+    连接上已有未提交的事务时抛出 sqlite3.ProgrammingError，不会替别人提交或回滚。
+    """
+    if conn.in_transaction:
+        raise sqlite3.ProgrammingError("连接上有未提交的事务，无法开始新的写入事务")
+    gui_thread = _in_gui_thread()
+    for attempt in range(retries + 1):
+        try:
+            _begin_immediate(conn, gui_thread)
+            result = func(conn.cursor())
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if not is_busy_error(e) or attempt == retries:
+                raise
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+            logger.warning(f"数据库被其他客户端锁定，{delay:.2f} 秒后重试（第 {attempt + 1} 次）")
+            _wait(delay, gui_thread)
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def read_versions(conn, table, key_columns, value_columns, keys):
+    """读取记录的当前值和版本号，返回 {主键: (值, 版本号)}"""
+    keys = list(keys)
+    result = {}
+    cursor = conn.cursor()
+    condition = " AND ".join(f"{column} = ?" for column in key_columns)
+    columns = ", ".join(list(key_columns) + list(value_columns) + ["row_version"])
+    for key in keys:
+        cursor.execute(f"SELECT {columns} FROM {table} WHERE {condition}", key)
+        row = cursor.fetchone()
+        if row is not None:
+            n = len(key_columns)
+            result[tuple(row[:n])] = (tuple(row[n:-1]), row[-1])
+    return result
+
+
+def _save_rows(cursor, table, key_columns, value_columns, rows):
+    """按版本号写入，返回冲突列表；rows 为 (主键, 读取时的值, 新值, 读取时的版本号)，新值为 None 时删除记录"""
+    condition = " AND ".join(f"{column} = ?" for column in key_columns)
+    insert_sql = (
+        f"INSERT INTO {table} ({', '.join(list(key_columns) + list(value_columns))}) "
+        f"VALUES ({', '.join('?' * (len(key_columns) + len(value_columns)))}) "
+        f"ON CONFLICT({', '.join(key_columns)}) DO NOTHING"
+    )
+    update_sql = (
+        f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in value_columns)} "
+        f"WHERE {condition} AND row_version = ?"
+    )
+    delete_sql = f"DELETE FROM {table} WHERE {condition} AND row_version = ?"
+    select_sql = f"SELECT {', '.join(value_columns)}, row_version FROM {table} WHERE {condition}"
+
+    conflicts = []
+    for key, base, values, version in rows:
+        if values is None:
+            cursor.execute(delete_sql, (*key, version))
+        elif version is None:
+            cursor.execute(insert_sql, (*key, *values))
+        else:
+            cursor.execute(update_sql, (*values, *key, version))
+        if cursor.rowcount:
+            continue
+        cursor.execute(select_sql, key)
+        current = cursor.fetchone()
+        theirs, their_version = (tuple(current[:-1]), current[-1]) if current else (None, None)
+        conflicts.append(RowConflict(key, base, values, theirs, their_version))
+    return conflicts
+
+
+def save_versioned(conn, table, key_columns, value_columns, rows, resolve=None):
+    """带版本检查地保存多条记录（一个事务）
+
+    rows 为 (主键, 读取时的值, 新值, 读取时的版本号)，新记录的读取值和版本号为 None，
+    要删除的记录新值为 None。
+    版本已变的记录先按字段自动合并（删除的记录在对方没有改动任何字段时照常删除）；
+    仍有冲突时调用 resolve(冲突列表)，它返回 {主键: 最终写入的值}，值为 None 表示删除，
+    不在结果中的记录放弃本次修改。
+    返回 (写入条数, 放弃修改的冲突列表)。
+    """
+    rows = [(tuple(key), base, None if values is None else tuple(values), version)
+            for key, base, values, version in rows]
+    written = len(rows)
+    skipped = []
+    for _ in range(MERGE_ROUNDS):
+        conflicts = write_transaction(
+            conn, lambda cursor, pending=rows: _save_rows(cursor, table, key_columns, value_columns, pending)
+        )
+        if not conflicts:
+            return written - len(skipped), skipped
+
+        rows, unresolved = [], []
+        for conflict in conflicts:
+            if conflict.mine is None:
+                if conflict.theirs is None:
+                    continue  # 对方也已删除
+                if not conflict.conflicting_fields():
+                    rows.append((conflict.key, conflict.theirs, None, conflict.version))
+                    continue
+                unresolved.append(conflict)
+                continue
+            merged = conflict.auto_merge()
+            if merged is None:
+                unresolved.append(conflict)
+            elif merged != conflict.theirs:
+                rows.append((conflict.key, conflict.theirs, merged, conflict.version))
+        if unresolved:
+            logger.warning(f"{table} 有 {len(unresolved)} 条记录与其他客户端的修改冲突")
+            resolutions = resolve(unresolved) if resolve else {}
+            for conflict in unresolved:
+                if conflict.key not in resolutions:
+                    skipped.append(conflict)
+                    continue
+                values = resolutions[conflict.key]
+                if values is None:
+                    if conflict.theirs is not None:
+                        rows.append((conflict.key, conflict.theirs, None, conflict.version))
+                elif tuple(values) != conflict.theirs:
+                    rows.append((conflict.key, conflict.theirs, tuple(values), conflict.version))
+        if not rows:
+            return written - len(skipped), skipped
+    raise sqlite3.OperationalError(f"{table} 的记录被频繁修改，请稍后重试")
@@ -0,0 +1,12 @@
+def get_table_versions(conn, table_names):
+    """读取数据表的版本号，返回 {表名: 版本号}（由 table_versions 触发器维护）"""
+    table_names = list(table_names)
+    placeholders = ", ".join("?" * len(table_names))
+    cursor = conn.cursor()
+    cursor.execute(f"""
+                   SELECT table_name, version
+                   FROM table_versions
+                   WHERE table_name IN ({placeholders})
+                   """, table_names)
+    versions = dict(cursor.fetchall())
+    return {name: versions.get(name, 0) for name in table_names}
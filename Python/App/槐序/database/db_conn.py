@@ -1,5 +1,16 @@
 import sqlite3
-from PyQt5.QtWidgets import QMessageBox
+import logging
+from PyQt5.QtWidgets import QApplication, QMessageBox
+from database.concurrency import configure_connection
+
+def show_database_message(title, message, icon=QMessageBox.Critical):
+    """提示数据库错误：图形界面中弹窗，命令行模式（没有 QApplication）只写日志"""
+    if QApplication.instance() is None:
+        logging.getLogger(__name__).error(f"{title}: {message}")
+    elif icon == QMessageBox.Warning:
+        QMessageBox.warning(None, title, message)
+    else:
+        QMessageBox.critical(None, title, message)
 
 def create_connection(db_file):
     """创建数据库连接"""
@@ -8,23 +19,24 @@ def create_connection(db_file):
         conn = sqlite3.connect(db_file)
         # 启用外键约束
         conn.execute("PRAGMA foreign_keys = ON")
+        # 其他客户端正在写入时等待一会儿，而不是立即报"database is locked"
+        configure_connection(conn)
         return conn
     except sqlite3.Error as e:
-        QMessageBox.critical(
-            None,
-            "数据库错误",
-            f"无法连接数据库 {db_file}:\n{str(e)}"
-        )
+        show_database_message("数据库错误", f"无法连接数据库 {db_file}:\n{str(e)}")
     return conn
 
+def get_database_path(conn):
+    """获取连接对应的数据库文件路径，内存数据库返回空字符串"""
+    for _, name, file_path in conn.execute("PRAGMA database_list"):
+        if name == 'main':
+            return file_path or ""
+    return ""
+
 def close_connection(conn):
     """关闭数据库连接"""
     if conn:
         try:
             conn.close()
         except sqlite3.Error as e:
-            QMessageBox.warning(
-                None,
-                "数据库警告",
-                f"关闭数据库连接时出错:\n{str(e)}"
-            )
\ No newline at end of file
+            show_database_message("数据库警告", f"关闭数据库连接时出错:\n{str(e)}", QMessageBox.Warning)
\ No newline at end of file
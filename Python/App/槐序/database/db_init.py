@@ -1,5 +1,8 @@
+import time
 import logging
-from PyQt5.QtWidgets import QMessageBox
+from database.db_conn import show_database_message
+from database.search_index import sync_search_index, STUDENT_INDEX_SQL
+from utils.log_utils import timing_extra
 
 # ======================
 # 数据库表创建 SQL 语句（已删除所有 term 字段）
@@ -367,7 +370,7 @@ CREATE_TABLES = [
        )
     )""",
 
-    # 课堂活动评分表（无 term 字段，无需改动）
+    # 课堂活动评分表（无 term 字段；(activity_id, student_id) 唯一索引见迁移版本1）
     """CREATE TABLE IF NOT EXISTS classroom_scores
     (
         score_id
@@ -438,29 +441,379 @@ INITIAL_DATA = [
 
 
 # ======================
-# 数据库初始化函数（保持不变）
+# 数据库迁移（按 PRAGMA user_version 依次执行，每个版本只执行一次）
 # ======================
 
-def initialize_database(conn):
-    """初始化数据库表结构"""
-    try:
-        cursor = conn.cursor()
+# 版本3 的课堂表现汇总（不区分加分活动），只用于执行版本3 迁移
+PARTICIPATION_REBUILD_SQL_V3 = """
+    INSERT INTO classroom_participation
+        (course_id, student_id, total_score, max_score, activity_count, last_activity_date)
+    SELECT a.course_id,
+           cs.student_id,
+           SUM(COALESCE(cs.score, 0)),
+           SUM(COALESCE(a.max_score, 0)),
+           COUNT(*),
+           MAX(a.activity_date)
+    FROM classroom_scores cs
+             JOIN classroom_activities a ON cs.activity_id = a.activity_id
+    WHERE {filter}
+    GROUP BY a.course_id, cs.student_id"""
+
+# 按条件重新汇总课堂表现（filter 中 a 为课堂活动表，cs 为课堂评分表）
+# 满分为 0 的活动（如课堂发言）的得分计入加分，不计入按满分折算的得分
+PARTICIPATION_REBUILD_SQL = """
+    INSERT INTO classroom_participation
+        (course_id, student_id, total_score, max_score, activity_count, last_activity_date, bonus_score)
+    SELECT a.course_id,
+           cs.student_id,
+           SUM(CASE WHEN a.max_score > 0 THEN COALESCE(cs.score, 0) ELSE 0 END),
+           SUM(COALESCE(a.max_score, 0)),
+           COUNT(*),
+           MAX(a.activity_date),
+           SUM(CASE WHEN a.max_score > 0 THEN 0 ELSE COALESCE(cs.score, 0) END)
+    FROM classroom_scores cs
+             JOIN classroom_activities a ON cs.activity_id = a.activity_id
+    WHERE {filter}
+    GROUP BY a.course_id, cs.student_id"""
+
+
+def version_trigger_sql(table_name):
+    """数据表版本号触发器：表中任意行增删改时版本号加一，供缓存判断是否失效"""
+    return [
+        f"""INSERT OR IGNORE INTO table_versions (table_name) VALUES ('{table_name}')"""
+    ] + [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table_name}_{event.lower()}_version
+            AFTER {event} ON {table_name}
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE table_name = '{table_name}';
+            END"""
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+
+
+def row_version_sql(table_name):
+    """记录版本号列及触发器：更新记录时版本号加一（语句自己修改了版本号时不再重复加）"""
+    return [
+        f"""ALTER TABLE {table_name} ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table_name}_row_version
+            AFTER UPDATE ON {table_name}
+            WHEN NEW.row_version = OLD.row_version
+            BEGIN
+                UPDATE {table_name} SET row_version = OLD.row_version + 1 WHERE rowid = NEW.rowid;
+            END""",
+    ]
+
+
+MIGRATIONS = [
+    # 版本1: 课堂评分表 (activity_id, student_id) 唯一，先清理重复评分（保留最新一条）
+    [
+        """DELETE FROM classroom_scores
+           WHERE score_id NOT IN (SELECT MAX(score_id)
+                                  FROM classroom_scores
+                                  GROUP BY activity_id, student_id)""",
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_classroom_scores_activity_student
+           ON classroom_scores (activity_id, student_id)"""
+    ],
+
+    # 版本2: 数据表版本号（学生名单相关表）
+    [
+        """CREATE TABLE IF NOT EXISTS table_versions
+        (
+            table_name TEXT PRIMARY KEY,
+            version    INTEGER NOT NULL DEFAULT 0
+        )"""
+    ] + version_trigger_sql('students')
+      + version_trigger_sql('classes')
+      + version_trigger_sql('course_class'),
+
+    # 版本3: 学生课堂表现汇总，由触发器随课堂评分增量维护
+    [
+        """CREATE TABLE IF NOT EXISTS classroom_participation
+        (
+            course_id          INTEGER NOT NULL,
+            student_id         TEXT    NOT NULL,
+            total_score        REAL    NOT NULL DEFAULT 0,
+            max_score          REAL    NOT NULL DEFAULT 0,
+            activity_count     INTEGER NOT NULL DEFAULT 0,
+            last_activity_date DATE,
+            PRIMARY KEY (course_id, student_id)
+        )""",
+        PARTICIPATION_REBUILD_SQL_V3.format(filter="1 = 1"),
+
+        # 新增评分：累加到对应课程
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_scores_insert_participation
+            AFTER INSERT ON classroom_scores
+            BEGIN
+                INSERT INTO classroom_participation
+                    (course_id, student_id, total_score, max_score, activity_count, last_activity_date)
+                SELECT a.course_id, NEW.student_id, COALESCE(NEW.score, 0), COALESCE(a.max_score, 0), 1, a.activity_date
+                FROM classroom_activities a
+                WHERE a.activity_id = NEW.activity_id
+                ON CONFLICT(course_id, student_id) DO UPDATE SET
+                    total_score        = total_score + excluded.total_score,
+                    max_score          = max_score + excluded.max_score,
+                    activity_count     = activity_count + 1,
+                    last_activity_date = MAX(COALESCE(last_activity_date, ''), excluded.last_activity_date);
+            END""",
+
+        # 修改分数：只累加差值
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_scores_update_participation
+            AFTER UPDATE OF score ON classroom_scores
+            WHEN OLD.activity_id = NEW.activity_id AND OLD.student_id = NEW.student_id
+            BEGIN
+                UPDATE classroom_participation
+                SET total_score = total_score + COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0)
+                WHERE course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = NEW.activity_id)
+                  AND student_id = NEW.student_id;
+            END""",
+
+        # 删除评分或评分改挂到其他活动/学生：重算涉及的汇总行
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_scores_delete_participation
+            AFTER DELETE ON classroom_scores
+            BEGIN
+                DELETE FROM classroom_participation
+                WHERE student_id = OLD.student_id
+                  AND course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = OLD.activity_id);
+                """ + PARTICIPATION_REBUILD_SQL_V3.format(filter="""
+                    a.course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = OLD.activity_id)
+                    AND cs.student_id = OLD.student_id""") + """;
+            END""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_scores_move_participation
+            AFTER UPDATE OF activity_id, student_id ON classroom_scores
+            WHEN OLD.activity_id != NEW.activity_id OR OLD.student_id != NEW.student_id
+            BEGIN
+                DELETE FROM classroom_participation
+                WHERE (student_id = OLD.student_id
+                       AND course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = OLD.activity_id))
+                   OR (student_id = NEW.student_id
+                       AND course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = NEW.activity_id));
+                """ + PARTICIPATION_REBUILD_SQL_V3.format(filter="""
+                    ((a.course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = OLD.activity_id)
+                      AND cs.student_id = OLD.student_id)
+                     OR (a.course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = NEW.activity_id)
+                      AND cs.student_id = NEW.student_id))""") + """;
+            END""",
+
+        # 活动的课程、日期或满分变化：重算该活动涉及学生的汇总行
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_activities_update_participation
+            AFTER UPDATE OF course_id, activity_date, max_score ON classroom_activities
+            BEGIN
+                DELETE FROM classroom_participation
+                WHERE course_id IN (OLD.course_id, NEW.course_id)
+                  AND student_id IN (SELECT student_id FROM classroom_scores WHERE activity_id = NEW.activity_id);
+                """ + PARTICIPATION_REBUILD_SQL_V3.format(filter="""
+                    a.course_id IN (OLD.course_id, NEW.course_id)
+                    AND cs.student_id IN (SELECT student_id FROM classroom_scores WHERE activity_id = NEW.activity_id)""") + """;
+            END""",
+    ],
+
+    # 版本4: 课堂活动按课程、日期分页查询的索引
+    [
+        """CREATE INDEX IF NOT EXISTS idx_classroom_activities_course_date
+           ON classroom_activities (course_id, activity_date)""",
+        """CREATE INDEX IF NOT EXISTS idx_classroom_activities_date
+           ON classroom_activities (activity_date)""",
+    ],
+
+    # 版本5: 其余数据表的版本号，供窗口再次显示时判断需要刷新的数据
+    version_trigger_sql('users')
+    + version_trigger_sql('courses')
+    + version_trigger_sql('scores')
+    + version_trigger_sql('assignment_folders')
+    + version_trigger_sql('assignment_submissions')
+    + version_trigger_sql('evaluations')
+    + version_trigger_sql('classroom_activities')
+    + version_trigger_sql('classroom_scores'),
+
+    # 版本6: 多个客户端共用数据库时的乐观锁，记录每次修改后 row_version 加一
+    row_version_sql('scores')
+    + row_version_sql('classroom_scores')
+    + row_version_sql('assignment_submissions'),
+
+    # 版本7: 数据库维护记录；改用增量 auto_vacuum（旧数据库在下次 VACUUM 时生效）
+    [
+        """CREATE TABLE IF NOT EXISTS maintenance_log
+        (
+            log_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_at      TIMESTAMP NOT NULL,
+            status      TEXT      NOT NULL,
+            duration_ms REAL,
+            report      TEXT
+        )""",
+        """PRAGMA auto_vacuum = INCREMENTAL""",
+    ],
+
+    # 版本8: 学生姓名拼音检索表；新增或改名的学生先记入待更新表，由 search_index 计算检索键
+    [
+        """CREATE TABLE IF NOT EXISTS student_search
+        (
+            search_key TEXT NOT NULL,
+            student_id TEXT NOT NULL,
+            PRIMARY KEY (search_key, student_id)
+        ) WITHOUT ROWID""",
+        STUDENT_INDEX_SQL,
+        """CREATE TABLE IF NOT EXISTS student_search_pending
+        (
+            student_id TEXT PRIMARY KEY
+        ) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS trg_students_search_insert
+            AFTER INSERT ON students
+            BEGIN
+                INSERT OR IGNORE INTO student_search_pending (student_id) VALUES (NEW.student_id);
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_students_search_update
+            AFTER UPDATE OF student_id, name ON students
+            BEGIN
+                DELETE FROM student_search WHERE student_id = OLD.student_id;
+                INSERT OR IGNORE INTO student_search_pending (student_id) VALUES (NEW.student_id);
+            END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_students_search_delete
+            AFTER DELETE ON students
+            BEGIN
+                DELETE FROM student_search WHERE student_id = OLD.student_id;
+                DELETE FROM student_search_pending WHERE student_id = OLD.student_id;
+            END""",
+        """INSERT OR IGNORE INTO student_search_pending (student_id)
+           SELECT student_id FROM students""",
+    ],
+
+    # 版本9: 课堂表现汇总分开记录加分（满分为 0 的活动），重建汇总和维护它的触发器
+    [
+        """ALTER TABLE classroom_participation ADD COLUMN bonus_score REAL NOT NULL DEFAULT 0""",
+        """DROP TRIGGER IF EXISTS trg_classroom_scores_insert_participation""",
+        """DROP TRIGGER IF EXISTS trg_classroom_scores_update_participation""",
+        """DROP TRIGGER IF EXISTS trg_classroom_scores_delete_participation""",
+        """DROP TRIGGER IF EXISTS trg_classroom_scores_move_participation""",
+        """DROP TRIGGER IF EXISTS trg_classroom_activities_update_participation""",
+        """DELETE FROM classroom_participation""",
+        PARTICIPATION_REBUILD_SQL.format(filter="1 = 1"),
 
-        # 创建表
-        for create_table_sql in CREATE_TABLES:
-            cursor.execute(create_table_sql)
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_scores_insert_participation
+            AFTER INSERT ON classroom_scores
+            BEGIN
+                INSERT INTO classroom_participation
+                    (course_id, student_id, total_score, max_score, activity_count, last_activity_date, bonus_score)
+                SELECT a.course_id, NEW.student_id,
+                       CASE WHEN a.max_score > 0 THEN COALESCE(NEW.score, 0) ELSE 0 END,
+                       COALESCE(a.max_score, 0), 1, a.activity_date,
+                       CASE WHEN a.max_score > 0 THEN 0 ELSE COALESCE(NEW.score, 0) END
+                FROM classroom_activities a
+                WHERE a.activity_id = NEW.activity_id
+                ON CONFLICT(course_id, student_id) DO UPDATE SET
+                    total_score        = total_score + excluded.total_score,
+                    max_score          = max_score + excluded.max_score,
+                    activity_count     = activity_count + 1,
+                    last_activity_date = MAX(COALESCE(last_activity_date, ''), excluded.last_activity_date),
+                    bonus_score        = bonus_score + excluded.bonus_score;
+            END""",
 
-        # 插入初始数据
-        for insert_sql in INITIAL_DATA:
-            cursor.execute(insert_sql)
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_scores_update_participation
+            AFTER UPDATE OF score ON classroom_scores
+            WHEN OLD.activity_id = NEW.activity_id AND OLD.student_id = NEW.student_id
+            BEGIN
+                UPDATE classroom_participation
+                SET total_score = total_score + (SELECT CASE WHEN max_score > 0
+                                                             THEN COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0)
+                                                             ELSE 0 END
+                                                 FROM classroom_activities WHERE activity_id = NEW.activity_id),
+                    bonus_score = bonus_score + (SELECT CASE WHEN max_score > 0
+                                                             THEN 0
+                                                             ELSE COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0) END
+                                                 FROM classroom_activities WHERE activity_id = NEW.activity_id)
+                WHERE course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = NEW.activity_id)
+                  AND student_id = NEW.student_id;
+            END""",
 
-        conn.commit()
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_scores_delete_participation
+            AFTER DELETE ON classroom_scores
+            BEGIN
+                DELETE FROM classroom_participation
+                WHERE student_id = OLD.student_id
+                  AND course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = OLD.activity_id);
+                """ + PARTICIPATION_REBUILD_SQL.format(filter="""
+                    a.course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = OLD.activity_id)
+                    AND cs.student_id = OLD.student_id""") + """;
+            END""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_scores_move_participation
+            AFTER UPDATE OF activity_id, student_id ON classroom_scores
+            WHEN OLD.activity_id != NEW.activity_id OR OLD.student_id != NEW.student_id
+            BEGIN
+                DELETE FROM classroom_participation
+                WHERE (student_id = OLD.student_id
+                       AND course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = OLD.activity_id))
+                   OR (student_id = NEW.student_id
+                       AND course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = NEW.activity_id));
+                """ + PARTICIPATION_REBUILD_SQL.format(filter="""
+                    ((a.course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = OLD.activity_id)
+                      AND cs.student_id = OLD.student_id)
+                     OR (a.course_id = (SELECT course_id FROM classroom_activities WHERE activity_id = NEW.activity_id)
+                      AND cs.student_id = NEW.student_id))""") + """;
+            END""",
+
+        """CREATE TRIGGER IF NOT EXISTS trg_classroom_activities_update_participation
+            AFTER UPDATE OF course_id, activity_date, max_score ON classroom_activities
+            BEGIN
+                DELETE FROM classroom_participation
+                WHERE course_id IN (OLD.course_id, NEW.course_id)
+                  AND student_id IN (SELECT student_id FROM classroom_scores WHERE activity_id = NEW.activity_id);
+                """ + PARTICIPATION_REBUILD_SQL.format(filter="""
+                    a.course_id IN (OLD.course_id, NEW.course_id)
+                    AND cs.student_id IN (SELECT student_id FROM classroom_scores WHERE activity_id = NEW.activity_id)""") + """;
+            END""",
+    ],
+]
+
+
+def apply_migrations(cursor):
+    """执行尚未执行的数据库迁移"""
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+
+    for target_version in range(version + 1, len(MIGRATIONS) + 1):
+        start = time.perf_counter()
+        for migration_sql in MIGRATIONS[target_version - 1]:
+            cursor.execute(migration_sql)
+        cursor.execute(f"PRAGMA user_version = {target_version}")
+        logging.info(f"数据库迁移到版本 {target_version}",
+                     **timing_extra(f"数据库迁移 {target_version}", time.perf_counter() - start))
+
+
+# ======================
+# 数据库初始化函数
+# ======================
+
+def upgrade_schema(conn):
+    """创建缺少的表并执行迁移，使数据库结构与当前版本一致（出错时抛出异常，由调用方处理）"""
+    cursor = conn.cursor()
+
+    # 新数据库在创建表之前设置才会立即生效
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    # 创建表
+    for create_table_sql in CREATE_TABLES:
+        cursor.execute(create_table_sql)
+
+    # 执行数据库迁移
+    apply_migrations(cursor)
+
+    # 插入初始数据
+    for insert_sql in INITIAL_DATA:
+        cursor.execute(insert_sql)
+
+    # 为迁移或其他客户端新增的学生生成拼音检索键
+    sync_search_index(conn)
+
+    conn.commit()
+
+
+def initialize_database(conn):
+    """初始化数据库表结构"""
+    try:
+        upgrade_schema(conn)
         return True
     except Exception as e:
-        QMessageBox.critical(
-            None,
-            "数据库错误",
-            f"初始化数据库时出错:\n{str(e)}"
-        )
+        show_database_message("数据库错误", f"初始化数据库时出错:\n{str(e)}")
         logging.error(f"数据库初始化错误: {str(e)}")
         return False
\ No newline at end of file
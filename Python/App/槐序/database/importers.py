@@ -0,0 +1,111 @@
+"""学生、成绩批量导入（学生管理窗口和命令行共用，不依赖界面）"""
+import csv
+import logging
+from database.search_index import sync_search_index
+
+logger = logging.getLogger(__name__)
+
+EXAM_TYPES = ("期末", "期中", "平时", "作业")
+
+
+def read_table_rows(file_path):
+    """读取 Excel(.xlsx) 或 CSV 文件，跳过标题行，返回各行的值元组"""
+    if file_path.lower().endswith('.csv'):
+        with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.reader(f))
+        return [tuple(row) for row in rows[1:]]
+
+    # openpyxl 导入较慢，用到时再导入
+    from openpyxl import load_workbook
+    wb = load_workbook(filename=file_path, read_only=True)
+    try:
+        return list(wb.active.iter_rows(min_row=2, values_only=True))
+    finally:
+        wb.close()
+
+
+def parse_student_rows(rows):
+    """从表格行中取出 (学号, 姓名)，忽略学号或姓名为空的行"""
+    students = []
+    for row in rows:
+        if row and len(row) >= 2 and row[0] and row[1]:  # 确保学号和姓名不为空
+            students.append((str(row[0]).strip(), str(row[1]).strip()))
+    return students
+
+
+def import_students(conn, students, class_id):
+    """导入学生，已存在的学号跳过；返回 (导入的学号列表, 跳过的学号列表)，调用方负责提交"""
+    cursor = conn.cursor()
+    imported = []
+    duplicates = []
+    for student_id, name in students:
+        # 检查学号是否已存在
+        cursor.execute("SELECT 1 FROM students WHERE student_id = ?", (student_id,))
+        if cursor.fetchone():
+            duplicates.append(student_id)
+            continue
+
+        cursor.execute("""
+                       INSERT INTO students (student_id, name, class_id)
+                       VALUES (?, ?, ?)
+                       """, (student_id, name, class_id))
+        imported.append(student_id)
+
+    if duplicates:
+        logger.warning(f"学号已存在，跳过 {len(duplicates)} 名学生")
+    # 导入时一并生成姓名的拼音检索键
+    sync_search_index(conn)
+    return imported, duplicates
+
+
+def parse_grade_rows(conn, rows, default_exam_type="期末"):
+    """从表格行中取出成绩 (学号, 课程ID, 成绩, 考试类型)
+
+    列依次为 学号、课程（ID 或名称）、成绩、考试类型（可省略）。
+    返回 (有效成绩列表, 错误说明列表)。
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT course_id, course_name FROM courses")
+    courses = {}
+    for course_id, course_name in cursor.fetchall():
+        courses[str(course_id)] = course_id
+        courses[course_name] = course_id
+
+    grades = []
+    errors = []
+    for line, row in enumerate(rows, 2):
+        if not row or not row[0]:
+            continue
+        if len(row) < 3:
+            errors.append(f"第 {line} 行: 列数不足")
+            continue
+        student_id = str(row[0]).strip()
+        course_id = courses.get(str(row[1]).strip())
+        if course_id is None:
+            errors.append(f"第 {line} 行: 未知课程 {row[1]}")
+            continue
+        try:
+            score = float(row[2])
+        except (TypeError, ValueError):
+            errors.append(f"第 {line} 行: 成绩无效 {row[2]}")
+            continue
+        if score < 0 or score > 100:
+            errors.append(f"第 {line} 行: 成绩应在 0-100 之间")
+            continue
+        exam_type = str(row[3]).strip() if len(row) > 3 and row[3] else default_exam_type
+        if exam_type not in EXAM_TYPES:
+            errors.append(f"第 {line} 行: 未知考试类型 {exam_type}")
+            continue
+        grades.append((student_id, course_id, score, exam_type))
+    return grades, errors
+
+
+def import_grades(conn, grades):
+    """导入成绩（同一学生、课程、考试类型已有成绩时覆盖），返回写入的条数，调用方负责提交"""
+    cursor = conn.cursor()
+    cursor.executemany("""
+                       INSERT INTO scores (student_id, course_id, score, exam_type)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT(student_id, course_id, exam_type) DO UPDATE SET score = excluded.score
+                       """, grades)
+    return len(grades)
@@ -0,0 +1,376 @@
+"""
+数据库维护：完整性检查、更新统计信息、回收空闲页
+
+    run_maintenance(conn)                      空闲时的例行维护（快速检查、ANALYZE、optimize、增量回收）
+    run_maintenance(conn, MAINTENANCE_TASKS)   完整维护（完整性检查、重建汇总表），可加 vacuum=True
+
+VACUUM 重写整个文件，期间一直持有排他锁，远超其他客户端等待锁的时间（busy_timeout），
+只在用户明确要求时执行（命令行 maintenance --vacuum），空闲时的例行维护从不执行。
+
+每次维护前后记录数据库页统计和常用查询的耗时，写入 maintenance_log 表。
+数据库使用增量 auto_vacuum（版本7迁移设置）：删除数据后空闲页留在文件中，
+由 incremental_vacuum 分批归还；旧数据库需执行一次 VACUUM 才会切换到增量模式。
+"""
+
+import json
+import time
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, QEvent, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+from database.db_init import PARTICIPATION_REBUILD_SQL
+from utils.log_utils import timing_extra
+from utils.report_builder import REPORT_SQL
+
+# 例行维护的任务和完整维护的任务
+ROUTINE_TASKS = ('quick_check', 'analyze', 'optimize', 'incremental_vacuum')
+MAINTENANCE_TASKS = ('integrity_check', 'foreign_key_check', 'participation', 'analyze', 'optimize',
+                     'incremental_vacuum')
+
+# 空闲页超过该比例（且至少 MIN_FREE_PAGES 页）时回收
+FREE_PAGE_RATIO = 0.1
+MIN_FREE_PAGES = 64
+
+# 例行维护的间隔（小时），以及用户多久没有操作算作空闲（毫秒）
+MAINTENANCE_INTERVAL_HOURS = 24
+IDLE_MS = 5 * 60 * 1000
+
+AUTO_VACUUM_MODES = {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}
+
+# 用于比较维护前后耗时的常用查询: 名称 -> (SQL, 取参数的 SQL)
+BENCHMARK_QUERIES = {
+    '成绩报表': (REPORT_SQL, "SELECT course_id, course_id, class_id FROM course_class ORDER BY id LIMIT 1"),
+    '课程名单': ("""
+        SELECT s.student_id, s.name
+        FROM students s
+                 JOIN classes c ON s.class_id = c.class_id
+                 JOIN course_class cc ON c.class_id = cc.class_id
+        WHERE cc.course_id = ?
+        ORDER BY s.student_id
+        """, "SELECT course_id FROM course_class ORDER BY id LIMIT 1"),
+    '班级成绩': ("""
+        SELECT s.student_id, s.name, sc.score
+        FROM students s
+                 LEFT JOIN scores sc ON s.student_id = sc.student_id AND sc.course_id = ?
+        WHERE s.class_id = ?
+        ORDER BY s.student_id
+        """, "SELECT course_id, class_id FROM course_class ORDER BY id LIMIT 1"),
+    '课堂活动分页': ("""
+        SELECT a.activity_id, c.course_name, a.activity_date, a.activity_type, a.course_id
+        FROM classroom_activities a
+                 JOIN courses c ON a.course_id = c.course_id
+        WHERE a.course_id = ?
+        ORDER BY a.activity_date DESC, a.activity_id DESC
+        LIMIT 100
+        """, "SELECT course_id FROM classroom_activities GROUP BY course_id ORDER BY COUNT(*) DESC LIMIT 1"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceError(Exception):
+    """完整性检查发现数据库损坏"""
+
+
+def database_stats(conn):
+    """数据库页统计：总页数、空闲页、页内未使用字节比例（需要 dbstat）及 auto_vacuum 模式"""
+    cursor = conn.cursor()
+    page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+    page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+    auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+    stats = {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist_count,
+        'file_bytes': page_size * page_count,
+        'free_ratio': freelist_count / page_count if page_count else 0.0,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, str(auto_vacuum)),
+        'unused_ratio': None,
+    }
+    try:
+        unused, total = cursor.execute("SELECT SUM(unused), SUM(pgsize) FROM dbstat").fetchone()
+        if total:
+            stats['unused_ratio'] = unused / total
+    except sqlite3.Error:
+        pass  # 未编译 dbstat 虚拟表
+    return stats
+
+
+def time_benchmark_queries(conn, repeat=5):
+    """常用查询的耗时（毫秒，取多次运行的中位数）；缺少数据的查询跳过"""
+    cursor = conn.cursor()
+    timings = {}
+    for name, (sql, params_sql) in BENCHMARK_QUERIES.items():
+        params = cursor.execute(params_sql).fetchone()
+        if params is None:
+            continue
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        timings[name] = samples[len(samples) // 2]
+    return timings
+
+
+def _task_quick_check(conn, report):
+    _check_integrity(conn, "PRAGMA quick_check", report)
+
+
+def _task_integrity_check(conn, report):
+    _check_integrity(conn, "PRAGMA integrity_check", report)
+
+
+def _check_integrity(conn, sql, report):
+    result = [row[0] for row in conn.execute(sql)]
+    if result != ['ok']:
+        report['problems'].extend(result[:20])
+        raise MaintenanceError("完整性检查失败:\n" + "\n".join(result[:20]))
+
+
+def _task_foreign_key_check(conn, report):
+    violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if violations:
+        report['problems'].append(f"有 {len(violations)} 条记录违反外键约束")
+
+
+def _task_participation(conn, report):
+    """重建课堂表现汇总表"""
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        cursor.execute("DELETE FROM classroom_participation")
+        cursor.execute(PARTICIPATION_REBUILD_SQL.format(filter="1 = 1"))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _task_analyze(conn, report):
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def _task_optimize(conn, report):
+    conn.execute("PRAGMA optimize")
+
+
+def _task_incremental_vacuum(conn, report):
+    """空闲页较多时分批归还给文件系统（仅增量 auto_vacuum 模式）"""
+    stats = database_stats(conn)
+    if stats['auto_vacuum'] != 'INCREMENTAL':
+        return
+    if stats['freelist_count'] >= MIN_FREE_PAGES and stats['free_ratio'] >= FREE_PAGE_RATIO:
+        conn.execute("PRAGMA incremental_vacuum")
+        conn.commit()
+
+
+def _task_vacuum(conn, report):
+    """整理数据库文件，同时把旧数据库切换到增量 auto_vacuum
+
+    VACUUM 不能在事务中执行，需先提交当前连接上未提交的事务。
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+TASKS = {
+    'quick_check': _task_quick_check,
+    'integrity_check': _task_integrity_check,
+    'foreign_key_check': _task_foreign_key_check,
+    'participation': _task_participation,
+    'analyze': _task_analyze,
+    'optimize': _task_optimize,
+    'incremental_vacuum': _task_incremental_vacuum,
+    'vacuum': _task_vacuum,
+}
+
+
+def needs_vacuum(stats):
+    """是否需要 VACUUM：尚未切换到增量模式，或空闲页过多"""
+    return stats['auto_vacuum'] != 'INCREMENTAL' or (
+        stats['freelist_count'] >= MIN_FREE_PAGES and stats['free_ratio'] >= 2 * FREE_PAGE_RATIO)
+
+
+def run_maintenance(conn, tasks=ROUTINE_TASKS, vacuum=False, record=True):
+    """执行维护任务，返回报告字典；失败时记录后抛出异常（完整性检查失败为 MaintenanceError）"""
+    tasks = list(tasks) + (['vacuum'] if vacuum and 'vacuum' not in tasks else [])
+    report = {
+        'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'tasks': {},
+        'problems': [],
+        'stats_before': database_stats(conn),
+        'queries_before': time_benchmark_queries(conn),
+    }
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        for name in tasks:
+            task_start = time.perf_counter()
+            TASKS[name](conn, report)
+            report['tasks'][name] = (time.perf_counter() - task_start) * 1000
+    except Exception:
+        status = 'failed'
+        raise
+    finally:
+        report['duration_ms'] = (time.perf_counter() - start) * 1000
+        report['stats_after'] = database_stats(conn)
+        report['queries_after'] = time_benchmark_queries(conn) if status == 'ok' else {}
+        report['status'] = status
+        if record:
+            _record(conn, report)
+        logger.info(f"数据库维护{'完成' if status == 'ok' else '失败'}: {'、'.join(report['tasks'])}",
+                    **timing_extra("数据库维护", report['duration_ms'] / 1000))
+    return report
+
+
+def _record(conn, report):
+    try:
+        conn.execute("""
+                     INSERT INTO maintenance_log (run_at, status, duration_ms, report)
+                     VALUES (?, ?, ?, ?)
+                     """, (report['started_at'], report['status'], report['duration_ms'],
+                           json.dumps(report, ensure_ascii=False)))
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"写入维护记录错误: {str(e)}")
+
+
+def last_maintenance(conn):
+    """最近一次成功维护的时间，没有记录时返回 None"""
+    row = conn.execute("""
+                       SELECT MAX(run_at)
+                       FROM maintenance_log
+                       WHERE status = 'ok'
+                       """).fetchone()
+    return datetime.strptime(row[0], '%Y-%m-%d %H:%M:%S') if row and row[0] else None
+
+
+def format_report(report):
+    """维护报告的显示文本"""
+    before, after = report['stats_before'], report['stats_after']
+    lines = [
+        f"数据库维护{'完成' if report['status'] == 'ok' else '失败'}，耗时 {report['duration_ms']:.0f} ms",
+        "任务: " + "、".join(f"{name} {ms:.0f} ms" for name, ms in report['tasks'].items()),
+        f"页数 {before['page_count']} -> {after['page_count']}，"
+        f"空闲页 {before['freelist_count']} -> {after['freelist_count']}（{after['free_ratio']:.1%}），"
+        f"auto_vacuum {after['auto_vacuum']}",
+    ]
+    if after['unused_ratio'] is not None:
+        lines.append(f"页内未使用空间 {after['unused_ratio']:.1%}")
+    for name, ms in report['queries_before'].items():
+        after_ms = report['queries_after'].get(name)
+        lines.append(f"  {name:<10} {ms:7.2f} ms -> " + (f"{after_ms:7.2f} ms" if after_ms is not None else "-"))
+    lines += [f"问题: {problem}" for problem in report['problems']]
+    return "\n".join(lines)
+
+
+class _MaintenanceSignals(QObject):
+    finished = pyqtSignal(object)  # 报告
+    failed = pyqtSignal(str)
+
+
+class _MaintenanceTask(QRunnable):
+    def __init__(self, db_path, tasks, vacuum, signals):
+        super().__init__()
+        self.db_path = db_path
+        self.tasks = tasks
+        self.vacuum = vacuum
+        self.signals = signals
+
+    def run(self):
+        # 工作线程使用单独的连接
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA busy_timeout = 3000")
+            self.signals.finished.emit(run_maintenance(conn, self.tasks, self.vacuum))
+        except Exception as e:
+            logger.error(f"数据库维护错误: {str(e)}")
+            self.signals.failed.emit(str(e))
+        finally:
+            conn.close()
+
+
+class MaintenanceScheduler(QObject):
+    """在用户空闲时执行例行维护
+
+    每分钟检查一次：距上次维护超过间隔，且用户已有一段时间没有操作时，在工作线程中维护。
+    例行维护不执行 VACUUM；维护后的统计显示需要整理时，由界面提示用户手动执行。
+    维护记录保存在数据库中，多个客户端共用数据库时只有一个会执行。
+    """
+    maintenance_finished = pyqtSignal(object)
+    maintenance_failed = pyqtSignal(str)
+
+    def __init__(self, db_conn, db_path, interval_hours=MAINTENANCE_INTERVAL_HOURS, idle_ms=IDLE_MS, parent=None):
+        super().__init__(parent)
+        self.db_conn = db_conn
+        self.db_path = db_path
+        self.interval = timedelta(hours=interval_hours)
+        self.idle_ms = idle_ms
+        self.running = False
+        self._last_input = time.monotonic()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._signals = _MaintenanceSignals()
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.check)
+
+    INPUT_EVENTS = (QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.Wheel)
+
+    def start(self, check_interval_ms=60 * 1000):
+        app = QApplication.instance()
+        if app is not None:
+            app.installEventFilter(self)
+        self._timer.start(check_interval_ms)
+
+    def stop(self):
+        self._timer.stop()
+        app = QApplication.instance()
+        if app is not None:
+            app.removeEventFilter(self)
+        self._pool.waitForDone()
+
+    def eventFilter(self, obj, event):
+        if event.type() in self.INPUT_EVENTS:
+            self._last_input = time.monotonic()
+        return False
+
+    def idle_ms_elapsed(self):
+        return (time.monotonic() - self._last_input) * 1000
+
+    def is_due(self):
+        try:
+            last = last_maintenance(self.db_conn)
+        except sqlite3.Error as e:
+            logger.error(f"读取维护记录错误: {str(e)}")
+            return False
+        return last is None or datetime.now() - last >= self.interval
+
+    def check(self):
+        """空闲且到期时开始维护"""
+        if not self.running and self.idle_ms_elapsed() >= self.idle_ms and self.is_due():
+            self.run_now()
+
+    def run_now(self, tasks=ROUTINE_TASKS, vacuum=False):
+        """在工作线程中维护（数据库统计也在工作线程中计算）；vacuum 为 True 时最后执行 VACUUM"""
+        if self.running:
+            return False
+        self.running = True
+        self._pool.start(_MaintenanceTask(self.db_path, tuple(tasks), vacuum, self._signals))
+        return True
+
+    def _on_finished(self, report):
+        self.running = False
+        self.maintenance_finished.emit(report)
+
+    def _on_failed(self, error):
+        self.running = False
+        self.maintenance_failed.emit(error)
@@ -0,0 +1,77 @@
+import logging
+from database.data_version import get_table_versions
+
+# 学生名单依赖的数据表，其中任意一张表变化时缓存失效
+ROSTER_TABLES = ('students', 'classes', 'course_class')
+
+
+class RosterService:
+    """课程学生名单缓存
+
+    在内存中保存 课程 -> 按学号排序的学生列表，各窗口共享。
+    每次读取只检查一次数据表版本号，名单相关表未变化时不重新查询。
+    """
+
+    def __init__(self, db_conn):
+        self.db_conn = db_conn
+        self.logger = logging.getLogger(__name__)
+        self._rosters = {}  # 课程ID -> [(学号, 姓名)]
+        self._versions = None
+
+    def on_data_changed(self, table, keys):
+        """数据变更通知：课程班级关联变化时只清除对应课程，其余情况全部清除"""
+        if table == 'course_class' and keys is not None:
+            for course_id in keys:
+                self.invalidate(course_id)
+        else:
+            self.invalidate()
+
+    def _check_versions(self):
+        versions = get_table_versions(self.db_conn, ROSTER_TABLES)
+        if versions != self._versions:
+            self._rosters.clear()
+            self._versions = versions
+
+    def get_roster(self, course_id):
+        """获取课程的学生名单 [(学号, 姓名)]，按学号排序"""
+        self._check_versions()
+        roster = self._rosters.get(course_id)
+        if roster is None:
+            cursor = self.db_conn.cursor()
+            cursor.execute("""
+                           SELECT s.student_id, s.name
+                           FROM students s
+                                    JOIN classes c ON s.class_id = c.class_id
+                                    JOIN course_class cc ON c.class_id = cc.class_id
+                           WHERE cc.course_id = ?
+                           ORDER BY s.student_id
+                           """, (course_id,))
+            roster = cursor.fetchall()
+            self._rosters[course_id] = roster
+        return roster
+
+    def get_student_ids(self, course_id):
+        """获取课程的学号列表"""
+        return [student_id for student_id, _ in self.get_roster(course_id)]
+
+    def invalidate(self, course_id=None):
+        """清除缓存，不指定课程时全部清除"""
+        if course_id is None:
+            self._rosters.clear()
+        else:
+            self._rosters.pop(course_id, None)
+
+
+_services = {}
+
+
+def get_roster_service(db_conn):
+    """获取数据库连接共享的名单服务"""
+    entry = _services.get(id(db_conn))
+    if entry is None or entry[0] is not db_conn:
+        entry = (db_conn, RosterService(db_conn))
+        _services[id(db_conn)] = entry
+        # 界面中的修改即时清除缓存；其他途径的修改仍由数据表版本号发现
+        from utils.event_bus import get_change_bus
+        get_change_bus().subscribe(None, ROSTER_TABLES, entry[1].on_data_changed)
+    return entry[1]
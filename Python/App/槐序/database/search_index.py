@@ -0,0 +1,169 @@
+"""
+学生姓名拼音检索
+
+    张三丰 -> zhangsanfeng、zsf、zhangsf、zhangsanf（全拼、首字母及两者混合），
+              以及名字部分 sanfeng、sf、sanf 和姓名中的汉字片段 张三丰、三丰、丰
+
+检索词按前缀匹配这些检索键，如 zhangs、zs、sanf、三丰 都能找到张三丰；多音字的各读音都会生成检索键。
+检索键保存在 student_search 表中（版本8迁移）。学生新增或改名时触发器把学号写入
+student_search_pending，由 sync_search_index 计算拼音后更新检索表：导入、添加和编辑学生后立即更新，
+检索前也会先处理其他客户端留下的待更新记录。拼音取自程序自带的 resources/pinyin.txt，不需要联网。
+"""
+
+import os
+import time
+import logging
+from utils.log_utils import timing_extra
+
+PINYIN_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'resources', 'pinyin.txt')
+
+# 多音字组合出的读法超过该数目时只保留前面的（常用读音在前）
+MAX_READINGS = 4
+
+# 待更新的学生超过该数目时按批量方式重建
+BULK_STUDENTS = 5000
+
+# 检索表按学号的索引（改名、删除学生时删除旧的检索键）
+STUDENT_INDEX_SQL = """CREATE INDEX IF NOT EXISTS idx_student_search_student
+           ON student_search (student_id)"""
+
+# 前缀检索的上界：比任何检索键都大的字符
+_KEY_END = '\U0010ffff'
+
+logger = logging.getLogger(__name__)
+
+_pinyin = None
+
+
+def load_pinyin():
+    """汉字 -> 读音列表（不带声调，含 ü 的读音另加 u 的写法，如 吕 lv、lu），首次使用时读取"""
+    global _pinyin
+    if _pinyin is None:
+        table = {}
+        try:
+            with open(PINYIN_FILE, encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('#') or '\t' not in line:
+                        continue
+                    char, readings = line.rstrip('\n').split('\t', 1)
+                    readings = readings.split()
+                    table[char] = readings + [r.replace('v', 'u') for r in readings
+                                              if 'v' in r and r.replace('v', 'u') not in readings]
+        except OSError as e:
+            logger.error(f"读取拼音表错误: {str(e)}")
+        _pinyin = table
+    return _pinyin
+
+
+def _is_cjk(char):
+    return '㐀' <= char <= '鿿'
+
+
+def name_syllables(name):
+    """姓名的音节 [(原文, [读音...])]；连续的字母数字作为一个音节，其他符号（如 ·）忽略"""
+    pinyin = load_pinyin()
+    syllables = []
+    latin = ""
+    for char in name.strip().lower():
+        if char.isascii() and char.isalnum():
+            latin += char
+            continue
+        if latin:
+            syllables.append((latin, [latin]))
+            latin = ""
+        if _is_cjk(char):
+            syllables.append((char, pinyin.get(char) or [char]))
+    if latin:
+        syllables.append((latin, [latin]))
+    return syllables
+
+
+def _reading_combinations(syllables):
+    """各音节读音的组合：姓（第一个音节）的每个读音都保留（单 shan、曾 zeng 等姓氏读音常不是第一个），
+    名字部分按读音的常用程度（各读音序号之和）排序，最多 MAX_READINGS 种"""
+    if not syllables:
+        return []
+    ranked = [((), 0)]
+    for _, readings in syllables[1:]:
+        ranked = [(combo + (reading,), rank + i) for combo, rank in ranked for i, reading in enumerate(readings)]
+        ranked.sort(key=lambda item: item[1])
+        ranked = ranked[:MAX_READINGS]
+    return [(surname,) + combo for surname in syllables[0][1] for combo, _ in ranked]
+
+
+def search_keys(name):
+    """姓名的全部检索键"""
+    syllables = name_syllables(name)
+    keys = set()
+    # 汉字片段：各个后缀，检索词为其前缀即匹配（等同于子串匹配）
+    for start in range(len(syllables)):
+        keys.add("".join(original for original, _ in syllables[start:]))
+    # 全名和名字部分的全拼、首字母及混合：前 k 个音节全拼，其余取首字母
+    # （只有最后一个音节取首字母时是全拼的前缀，不必单独保存）
+    for combo in _reading_combinations(syllables):
+        n = len(combo)
+        initials = "".join(reading[0] for reading in combo)
+        for start in range(min(2, n)):
+            full = ""
+            for k in range(start, n + 1):
+                if k != n - 1:
+                    keys.add(full + initials[k:])
+                if k < n:
+                    full += combo[k]
+    keys.discard("")
+    return keys
+
+
+def normalize_query(text):
+    """检索词: 小写，去掉空格和隔音符号；同时含汉字和字母时汉字换成拼音（如 张s -> zhangs）"""
+    text = "".join(text.lower().split()).replace("'", "").replace('ü', 'v')
+    if any(_is_cjk(char) for char in text) and any(char.isascii() and char.isalpha() for char in text):
+        pinyin = load_pinyin()
+        text = "".join(pinyin.get(char, [char])[0] if _is_cjk(char) else char for char in text)
+    return text
+
+
+def sync_search_index(conn):
+    """为待更新的学生计算检索键，返回更新的学生数；调用方负责提交
+
+    学生改名或删除时触发器已删除旧的检索键，这里只需插入。
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+                   SELECT p.student_id, s.name
+                   FROM student_search_pending p
+                            LEFT JOIN students s ON s.student_id = p.student_id
+                   """)
+    pending = cursor.fetchall()
+    if not pending:
+        return 0
+
+    start = time.perf_counter()
+    # 按检索键排序后插入，写入更集中；大批量（如首次迁移）时先删除学号索引，插入后再重建
+    rows = sorted((key, student_id) for student_id, name in pending if name for key in search_keys(name))
+    bulk = len(pending) >= BULK_STUDENTS
+    if bulk:
+        cursor.execute("DROP INDEX IF EXISTS idx_student_search_student")
+    cursor.executemany("INSERT OR IGNORE INTO student_search (search_key, student_id) VALUES (?, ?)", rows)
+    if bulk:
+        cursor.execute(STUDENT_INDEX_SQL)
+    cursor.executemany("DELETE FROM student_search_pending WHERE student_id = ?",
+                       [(student_id,) for student_id, _ in pending])
+    if len(pending) >= 1000:
+        logger.info(f"已为 {len(pending)} 名学生生成拼音检索键",
+                    **timing_extra("生成拼音检索键", time.perf_counter() - start))
+    return len(pending)
+
+
+def student_search_filter(text, column='s.student_id'):
+    """学生检索条件 (SQL 片段, 参数)，按姓名、拼音检索键前缀或学号匹配；检索词为空时返回 None"""
+    query = normalize_query(text)
+    if not query:
+        return None
+    sql = f"{column} IN (SELECT ss.student_id FROM student_search ss WHERE ss.search_key >= ? AND ss.search_key < ?)"
+    params = [query, query + _KEY_END]
+    # 学号中通常有数字，含数字时再按学号子串匹配
+    if any(char.isdigit() for char in query):
+        sql = f"({sql} OR {column} LIKE ?)"
+        params.append(f"%{text.strip()}%")
+    return sql, params
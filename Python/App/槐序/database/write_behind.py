@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+from collections import OrderedDict
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from database.concurrency import is_busy_error, write_transaction
+from utils.log_utils import timing_extra
+
+# 写入失败后重试的最长间隔（毫秒），每次连续失败间隔加倍
+RETRY_MAX_MS = 60 * 1000
+
+
+class WriteBehindQueue(QObject):
+    """延迟写入队列
+
+    界面上的修改先放入内存队列，按键合并（同一条记录只保留最后一次），
+    定时或攒够一批后用 executemany 在一个事务中写入数据库。
+
+    指定 journal_path 时，每条修改先追加到日志文件，写入数据库后清空日志；
+    程序崩溃后下次创建队列时会重放日志。因此 sql 应是幂等的（如 UPSERT 绝对值），
+    key 和 params 需能用 JSON 保存。
+
+    check_conflicts 为 True 时逐条执行 sql，没有修改任何行的记录（如带版本号条件的 UPSERT
+    发现记录已被其他客户端修改）不算写入，通过 conflicted 信号交给界面处理。
+
+    写入失败时记录留在队列中，按加倍的间隔（最长 RETRY_MAX_MS）自动重试，直到写入成功；
+    连续失败只在第一次发出 flush_failed，界面不会被重复的错误提示打断。
+
+    每次写入是一个 write_transaction 短事务，不会提交或回滚连接上的其他事务。
+    个别记录违反约束（如对应的活动已被删除）时只放弃这些记录，通过 rejected 信号交给界面；
+    有日志文件时这些记录另存到 日志文件.rejected，不会随日志一起清空。
+    """
+    flushed = pyqtSignal(int)  # 成功写入的记录数
+    flush_failed = pyqtSignal(str)  # 写入失败的错误信息（连续失败时只在第一次发出）
+    conflicted = pyqtSignal(list)  # [(键, 参数)]，未写入的冲突记录
+    rejected = pyqtSignal(list)  # [(键, 参数, 错误信息)]，违反约束而放弃的记录
+
+    def __init__(self, db_conn, sql, interval_ms=3000, batch_size=20, journal_path=None,
+                 check_conflicts=False, parent=None):
+        super().__init__(parent)
+        self.db_conn = db_conn
+        self.sql = sql
+        self.check_conflicts = check_conflicts
+        self.batch_size = batch_size
+        self.journal_path = journal_path
+        self.interval_ms = interval_ms
+        self.failures = 0  # 连续写入失败的次数
+        self.logger = logging.getLogger(__name__)
+        self._pending = OrderedDict()
+        self._journal = None
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self.flush)
+
+        if self.journal_path:
+            self._replay_journal()
+
+    def _replay_journal(self):
+        """重放上次未写入数据库的日志"""
+        if not os.path.exists(self.journal_path):
+            return
+        replayed = 0
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时写了一半的行
+                self._pending[self._json_key(record['key'])] = tuple(record['params'])
+                replayed += 1
+        if replayed:
+            self.logger.warning(f"重放未写入的日志 {replayed} 条: {self.journal_path}")
+            self.flush()
+        else:
+            self._truncate_journal()
+
+    def _json_key(self, key):
+        return tuple(key) if isinstance(key, list) else key
+
+    def _append_journal(self, key, params):
+        try:
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(json.dumps({'key': key, 'params': params}, ensure_ascii=False) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except OSError as e:
+            self.logger.error(f"写入日志文件错误: {str(e)}")
+
+    def _truncate_journal(self):
+        try:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+        except OSError as e:
+            self.logger.error(f"清理日志文件错误: {str(e)}")
+
+    def put(self, key, params):
+        """加入一条待写入记录，params 为 sql 的参数"""
+        if self.journal_path:
+            self._append_journal(key, params)
+        self._pending[key] = params
+        self._pending.move_to_end(key)
+
+        # 写入失败后等重试定时器，不因攒够一批而提前重试
+        if len(self._pending) >= self.batch_size and not self.failures:
+            self.flush()
+        elif not self._timer.isActive():
+            self._timer.start()
+
+    def pending(self, key):
+        """获取尚未写入的记录参数，没有则返回 None"""
+        return self._pending.get(key)
+
+    def pending_count(self):
+        """尚未写入的记录数"""
+        return len(self._pending)
+
+    def flush(self):
+        """立即写入全部待写入记录，返回写入的记录数；失败时记录保留在队列中"""
+        self._timer.stop()
+        if not self._pending:
+            return 0
+
+        items = list(self._pending.items())
+        start = time.perf_counter()
+        try:
+            rows, conflicts, rejected = write_transaction(
+                self.db_conn, lambda cursor: self._execute(cursor, items), retries=0
+            )
+        except Exception as e:
+            if is_busy_error(e):
+                # 其他客户端正在写入，记录保留在队列中稍后再写
+                self.logger.warning(f"数据库被其他客户端锁定，稍后重试写入 {len(self._pending)} 条记录")
+                self._timer.start()
+                return 0
+            self.failures += 1
+            delay = min(RETRY_MAX_MS, self.interval_ms * 2 ** (self.failures - 1))
+            self.logger.error(f"批量写入错误（第 {self.failures} 次），{delay / 1000:.1f} 秒后重试: {str(e)}")
+            self._timer.start(delay)
+            if self.failures == 1:
+                self.flush_failed.emit(str(e))
+            return 0
+
+        if self.failures:
+            self.logger.info(f"连续 {self.failures} 次失败后写入成功")
+            self.failures = 0
+            self._timer.setInterval(self.interval_ms)
+        self._pending.clear()
+        if self.journal_path:
+            if rejected:
+                self._save_rejected(rejected)
+            self._truncate_journal()
+        self.logger.info(f"批量写入 {len(rows)} 条记录",
+                         **timing_extra("批量写入", time.perf_counter() - start, rows=len(rows)))
+        self.flushed.emit(len(rows))
+        if conflicts:
+            self.logger.warning(f"{len(conflicts)} 条记录与其他客户端的修改冲突，未写入")
+            self.conflicted.emit(conflicts)
+        if rejected:
+            self.rejected.emit(rejected)
+        return len(rows)
+
+    def _execute(self, cursor, items):
+        """在写入事务中执行，返回 (写入的参数列表, 冲突记录, 违反约束的记录)"""
+        if self.check_conflicts:
+            return self._execute_checked(cursor, items)
+        rows = [params for _, params in items]
+        # 先整批写入；有记录违反约束时回到保存点逐条写入，避免一条坏记录让整个队列永远写不进去
+        cursor.execute("SAVEPOINT write_behind_batch")
+        try:
+            cursor.executemany(self.sql, rows)
+        except sqlite3.IntegrityError as e:
+            cursor.execute("ROLLBACK TO write_behind_batch")
+            self.logger.warning(f"批量写入违反约束，改为逐条写入: {str(e)}")
+            rows, rejected = self._execute_one_by_one(cursor, items)
+            return rows, [], rejected
+        finally:
+            cursor.execute("RELEASE write_behind_batch")
+        return rows, [], []
+
+    def _execute_checked(self, cursor, items):
+        """逐条写入，没有修改任何行的记录算作冲突"""
+        written, conflicts, rejected = [], [], []
+        for key, params in items:
+            try:
+                cursor.execute(self.sql, params)
+            except sqlite3.IntegrityError as e:
+                self.logger.error(f"记录违反约束，未写入 {params}: {str(e)}")
+                rejected.append((key, params, str(e)))
+                continue
+            if cursor.rowcount:
+                written.append(params)
+            else:
+                conflicts.append((key, params))
+        return written, conflicts, rejected
+
+    def _execute_one_by_one(self, cursor, items):
+        written, rejected = [], []
+        for key, params in items:
+            try:
+                cursor.execute(self.sql, params)
+                written.append(params)
+            except sqlite3.IntegrityError as e:
+                self.logger.error(f"记录违反约束，未写入 {params}: {str(e)}")
+                rejected.append((key, params, str(e)))
+        return written, rejected
+
+    def _save_rejected(self, rejected):
+        """违反约束的记录另存一份，清空日志后仍可找回"""
+        try:
+            with open(self.journal_path + '.rejected', 'a', encoding='utf-8') as f:
+                for key, params, error in rejected:
+                    f.write(json.dumps({'key': key, 'params': params, 'error': error}, ensure_ascii=False) + "\n")
+        except OSError as e:
+            self.logger.error(f"保存未写入的记录错误: {str(e)}")
+
+    def close(self):
+        """停止定时器并写入剩余记录（写入失败时日志保留，下次重放）"""
+        written = self.flush()
+        self._timer.stop()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        return written
@@ -1,27 +1,89 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTableWidget,
     QTableWidgetItem, QPushButton, QComboBox, QLabel,
-    QMessageBox, QHeaderView, QFileDialog, QInputDialog
+    QMessageBox, QHeaderView, QFileDialog, QInputDialog, QShortcut,
+    QSplitter, QPlainTextEdit
 )
 from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QKeySequence, QPixmap
 import os
 import logging
-from utils.file_monitor import AssignmentFolderMonitor
+from gui.widgets import refill_combo
+from gui.delegates import set_action_column
+from database.roster_service import get_roster_service
+from database.write_behind import WriteBehindQueue
+from database.concurrency import RowConflict, read_versions
+from gui.merge_dialog import conflict_resolver
+from utils.file_monitor import AssignmentFolderMonitor, AssignmentFolderService, DuplicateFinder
+from utils.archive_inspector import split_member_path
+from utils.preview_cache import PreviewLoader, preview_key
+from utils.event_bus import get_change_bus, publish_change
+from utils.ui_monitor import timed
+
+# 预读后续几位学生的提交文件预览
+PREFETCH_ROWS = 3
 
 
 class AssignmentManagementWindow(QWidget):
     """作业管理窗口"""
 
-    def __init__(self, db_conn):
+    def __init__(self, db_conn, folder_service=None):
         super().__init__()
         self.db_conn = db_conn
         self.logger = logging.getLogger(__name__)
 
+        # 文件夹监控服务，通常由主窗口共享；单独打开时自行创建
+        if folder_service is None:
+            folder_service = AssignmentFolderService(self.db_conn, parent=self)
+            folder_service.start()
+        self.folder_service = folder_service
+        self.folder_service.counts_changed.connect(self.on_folder_counts_changed)
+        self.folder_service.files_changed.connect(self.on_folder_files_changed)
+
+        # 文件夹列表、当前显示的文件夹及 学号 -> 行号
+        self.folders = []
+        self.current_folder = None
+        self.student_rows = {}
+        self.student_files = {}
+
+        # 提交文件预览（工作线程生成，LRU 缓存）
+        self.preview_loader = PreviewLoader(parent=self)
+        self.preview_loader.preview_ready.connect(self.on_preview_ready)
+        self.current_preview_key = None
+
+        # 重复提交检查（工作线程计算文件摘要）
+        self.duplicate_finder = DuplicateFinder(parent=self)
+        self.duplicate_finder.finished.connect(self.on_duplicates_found)
+        self.duplicate_finder.failed.connect(self.on_duplicate_check_failed)
+
+        # 批改结果延迟批量写入；只在记录版本号未变时更新，被其他人批改过的记录交给用户合并
+        self.submission_versions = {}  # 学号 -> (分数, 版本号)，读取时的值
+        self.grade_bases = {}  # (学号, 文件夹ID) -> 批改前的分数，合并冲突时使用
+        self.grade_queue = WriteBehindQueue(self.db_conn, """
+            INSERT INTO assignment_submissions
+                (student_id, folder_id, file_name, status, score)
+            VALUES (?, ?, '手动录入', '已批改', ?)
+            ON CONFLICT(student_id, folder_id) DO UPDATE SET score  = excluded.score,
+                                                             status = '已批改'
+            WHERE assignment_submissions.row_version = ?
+            """, check_conflicts=True, parent=self)
+        self.grade_queue.flushed.connect(self.on_grades_flushed)
+        self.grade_queue.conflicted.connect(self.on_grade_conflicts)
+        self.grade_queue.rejected.connect(self.on_grades_rejected)
+        self.grade_queue.flush_failed.connect(
+            lambda error: QMessageBox.critical(self, "错误", f"保存批改结果失败，稍后自动重试: {error}")
+        )
+
         self.setWindowTitle("作业管理")
         self.resize(1000, 700)
         self.init_ui()
         self.load_courses()
 
+        # 其他窗口修改课程或作业文件夹时刷新下拉框和文件夹列表
+        bus = get_change_bus()
+        bus.subscribe(self, ('courses',), lambda table, keys: self.load_courses())
+        bus.subscribe(self, ('assignment_folders',), lambda table, keys: self.load_assignments())
+
     def init_ui(self):
         """初始化界面"""
         layout = QVBoxLayout()
@@ -46,26 +108,77 @@ class AssignmentManagementWindow(QWidget):
 
         # 作业文件夹表格
         self.folder_table = QTableWidget()
-        self.folder_table.setColumnCount(4)
-        self.folder_table.setHorizontalHeaderLabels(["ID", "课程", "文件夹路径", "操作"])
+        self.folder_table.setColumnCount(5)
+        self.folder_table.setHorizontalHeaderLabels(["ID", "课程", "文件夹路径", "提交情况", "操作"])
         self.folder_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.folder_table.setSelectionBehavior(QTableWidget.SelectRows)
+        set_action_column(self.folder_table, 4, "查看", lambda row: self.show_folder_details(self.folders[row]))
         layout.addWidget(self.folder_table)
 
         # 作业提交详情区域
+        detail_layout = QHBoxLayout()
         self.detail_label = QLabel("选择文件夹查看作业提交详情")
-        layout.addWidget(self.detail_label)
+        self.duplicate_btn = QPushButton("检查重复提交")
+        self.duplicate_btn.setEnabled(False)
+        self.duplicate_btn.clicked.connect(self.check_duplicates)
+        detail_layout.addWidget(self.detail_label)
+        detail_layout.addStretch()
+        detail_layout.addWidget(self.duplicate_btn)
+        layout.addLayout(detail_layout)
+
+        hint_label = QLabel("快捷键: 回车 批改当前学生并跳到下一位，Shift+回车 批改并跳到上一位")
+        hint_label.setStyleSheet("color: #666666;")
+        layout.addWidget(hint_label)
 
         self.submission_table = QTableWidget()
         self.submission_table.setColumnCount(6)
         self.submission_table.setHorizontalHeaderLabels(["学号", "姓名", "文件", "状态", "分数", "操作"])
         self.submission_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        layout.addWidget(self.submission_table)
+        self.submission_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.submission_table.currentCellChanged.connect(self.on_submission_row_changed)
+        set_action_column(self.submission_table, 5, "批改", lambda row: self.grade_assignment(
+            self.submission_table.item(row, 0).text(), self.current_folder[0]))
+
+        # 文件预览区域
+        preview_panel = QWidget()
+        preview_layout = QVBoxLayout(preview_panel)
+        preview_layout.setContentsMargins(0, 0, 0, 0)
+
+        self.preview_file_combo = QComboBox()
+        self.preview_file_combo.currentIndexChanged.connect(self.show_preview)
+
+        self.preview_text = QPlainTextEdit()
+        self.preview_text.setReadOnly(True)
+
+        self.preview_image = QLabel()
+        self.preview_image.setAlignment(Qt.AlignCenter)
+        self.preview_image.hide()
+
+        preview_layout.addWidget(self.preview_file_combo)
+        preview_layout.addWidget(self.preview_text)
+        preview_layout.addWidget(self.preview_image)
+
+        splitter = QSplitter(Qt.Horizontal)
+        splitter.addWidget(self.submission_table)
+        splitter.addWidget(preview_panel)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 2)
+        layout.addWidget(splitter)
 
         self.setLayout(layout)
 
         # 连接信号
-        self.folder_table.cellClicked.connect(self.show_folder_details)
+        self.folder_table.cellClicked.connect(lambda row, _: self.show_folder_details(self.folders[row]))
+
+        # 键盘连续批改
+        for key in (Qt.Key_Return, Qt.Key_Enter):
+            next_shortcut = QShortcut(QKeySequence(key), self.submission_table)
+            next_shortcut.setContext(Qt.WidgetShortcut)
+            next_shortcut.activated.connect(lambda: self.grade_current_row(1))
+
+            prev_shortcut = QShortcut(QKeySequence(Qt.SHIFT + key), self.submission_table)
+            prev_shortcut.setContext(Qt.WidgetShortcut)
+            prev_shortcut.activated.connect(lambda: self.grade_current_row(-1))
 
     def load_courses(self):
         """加载课程列表"""
@@ -74,15 +187,12 @@ class AssignmentManagementWindow(QWidget):
             cursor.execute("SELECT course_id, course_name FROM courses ORDER BY course_name")
             courses = cursor.fetchall()
 
-            self.course_combo.clear()
-            self.course_combo.addItem("所有课程", None)
-
-            for course_id, course_name in courses:
-                self.course_combo.addItem(course_name, course_id)
+            refill_combo(self.course_combo, "所有课程", courses)
         except Exception as e:
             self.logger.error(f"加载课程列表错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载课程列表失败: {str(e)}")
 
+    @timed()
     def load_assignments(self):
         """加载作业文件夹列表"""
         course_id = self.course_combo.currentData()
@@ -91,7 +201,7 @@ class AssignmentManagementWindow(QWidget):
             cursor = self.db_conn.cursor()
 
             query = """
-                    SELECT f.folder_id, c.course_name, f.folder_path
+                    SELECT f.folder_id, c.course_name, f.folder_path, f.course_id
                     FROM assignment_folders f
                              JOIN courses c ON f.course_id = c.course_id
                     WHERE 1 = 1 \
@@ -106,16 +216,13 @@ class AssignmentManagementWindow(QWidget):
 
             cursor.execute(query, params)
             folders = cursor.fetchall()
+            self.folders = folders
 
             self.folder_table.setRowCount(len(folders))
             for row, folder in enumerate(folders):
                 for col in range(3):
                     self.folder_table.setItem(row, col, QTableWidgetItem(str(folder[col])))
-
-                # 添加查看按钮
-                view_btn = QPushButton("查看")
-                view_btn.clicked.connect(lambda _, f=folder: self.show_folder_details(f))
-                self.folder_table.setCellWidget(row, 3, view_btn)
+                self.on_folder_counts_changed(folder[0], *self.folder_service.get_counts(folder[0]))
         except Exception as e:
             self.logger.error(f"加载作业文件夹错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载作业文件夹失败: {str(e)}")
@@ -144,117 +251,321 @@ class AssignmentManagementWindow(QWidget):
                                VALUES (?, ?, ?)
                                """, (folder_path, course_id, description))
                 self.db_conn.commit()
+                publish_change('assignment_folders', cursor.lastrowid, source=self)
                 self.load_assignments()
                 self.logger.info(f"添加作业文件夹: {folder_path}")
             except Exception as e:
                 self.logger.error(f"添加作业文件夹错误: {str(e)}")
                 QMessageBox.critical(self, "错误", f"添加作业文件夹失败: {str(e)}")
 
+    @timed()
     def show_folder_details(self, folder):
         """显示选定文件夹的作业提交详情"""
-        folder_id, course_name, folder_path = folder
+        folder_id, course_name, folder_path, course_id = folder
         self.detail_label.setText(f"作业详情 - {course_name}")
 
+        # 先写入未保存的批改结果，保证读取到最新数据
+        self.grade_queue.flush()
+        self.current_folder = folder
+        self.duplicate_btn.setEnabled(True)
+
         try:
-            # 获取该课程的学生列表
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                           SELECT s.student_id, s.name
-                           FROM students s
-                                    JOIN classes c ON s.class_id = c.class_id
-                                    JOIN course_class cc ON c.class_id = cc.class_id
-                           WHERE cc.course_id = (SELECT course_id FROM assignment_folders WHERE folder_id = ?)
-                           ORDER BY s.student_id
-                           """, (folder_id,))
-            students = cursor.fetchall()
+            # 获取该课程的学生列表（共享缓存）
+            students = get_roster_service(self.db_conn).get_roster(course_id)
 
             # 获取已有提交记录
+            cursor = self.db_conn.cursor()
             cursor.execute("""
-                           SELECT student_id, file_name, status, score
+                           SELECT student_id, file_name, status, score, row_version
                            FROM assignment_submissions
                            WHERE folder_id = ?
                            """, (folder_id,))
-            submissions = {row[0]: row[1:] for row in cursor.fetchall()}
+            rows = cursor.fetchall()
+            submissions = {row[0]: row[1:4] for row in rows}
+            self.submission_versions = {row[0]: (row[3], row[4]) for row in rows}
 
-            # 检查文件夹中的文件
-            monitor = AssignmentFolderMonitor(folder_path)
-            current_files = monitor._get_current_files()
+            # 检查文件夹中的文件（压缩包只读取文件列表，不解压）
+            monitor = self.folder_service.get_monitor(folder_id) or AssignmentFolderMonitor(folder_path)
+            submission_index = monitor.get_submission_index([s[0] for s in students])
 
+            self.student_rows = {}
+            self.student_files = submission_index
             self.submission_table.setRowCount(len(students))
             for row, (student_id, name) in enumerate(students):
+                self.student_rows[student_id] = row
                 self.submission_table.setItem(row, 0, QTableWidgetItem(student_id))
                 self.submission_table.setItem(row, 1, QTableWidgetItem(name))
 
                 # 查找学生提交的文件
-                student_files = [f for f in current_files if student_id in f]
-                file_item = QTableWidgetItem(", ".join(student_files) if student_files else "未提交")
-                self.submission_table.setItem(row, 2, file_item)
+                self._set_file_cell(row, submission_index[student_id])
 
                 # 状态和分数
                 if student_id in submissions:
                     file_name, status, score = submissions[student_id]
                     self.submission_table.setItem(row, 3, QTableWidgetItem(status))
-                    self.submission_table.setItem(row, 4, QTableWidgetItem(str(score) if score else ""))
+                    self.submission_table.setItem(row, 4, QTableWidgetItem("" if score is None else str(score)))
                 else:
                     self.submission_table.setItem(row, 3, QTableWidgetItem("未提交"))
                     self.submission_table.setItem(row, 4, QTableWidgetItem(""))
-
-                # 操作按钮
-                grade_btn = QPushButton("批改")
-                grade_btn.clicked.connect(lambda _, s=student_id: self.grade_assignment(s, folder_id))
-                self.submission_table.setCellWidget(row, 5, grade_btn)
         except Exception as e:
             self.logger.error(f"加载作业详情错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载作业详情失败: {str(e)}")
 
-    def grade_assignment(self, student_id, folder_id):
-        """批改作业"""
-        # 这里应该弹出一个对话框让教师输入分数和反馈
-        # 简化示例，使用输入对话框
+    def on_folder_counts_changed(self, folder_id, submitted, total):
+        """更新文件夹列表中的提交人数"""
+        for row, folder in enumerate(self.folders):
+            if folder[0] == folder_id:
+                self.folder_table.setItem(row, 3, QTableWidgetItem(f"已提交 {submitted} / {total}"))
+                break
+
+    def on_folder_files_changed(self, folder_id):
+        """当前显示的文件夹有文件变化时，原地更新文件列"""
+        if not self.current_folder or self.current_folder[0] != folder_id:
+            return
+        monitor = self.folder_service.get_monitor(folder_id)
+        if monitor is None:
+            return
+        self.student_files = monitor.get_submission_index(list(self.student_rows))
+        for student_id, row in self.student_rows.items():
+            self._set_file_cell(row, self.student_files[student_id])
+
+    def check_duplicates(self):
+        """在后台比较当前文件夹中各学生提交的文件，内容相同的列出供老师核查"""
+        if not self.current_folder:
+            return
+        folder_id, _, folder_path, _ = self.current_folder
+        monitor = self.folder_service.get_monitor(folder_id) or AssignmentFolderMonitor(folder_path)
+        self.duplicate_btn.setEnabled(False)
+        self.duplicate_btn.setText("正在检查...")
+        self.duplicate_finder.start(folder_id, monitor, dict(self.student_files))
+
+    def _reset_duplicate_btn(self):
+        self.duplicate_btn.setText("检查重复提交")
+        self.duplicate_btn.setEnabled(self.current_folder is not None)
+
+    def on_duplicate_check_failed(self, folder_id, error):
+        self._reset_duplicate_btn()
+        QMessageBox.critical(self, "错误", f"检查重复提交失败: {error}")
+
+    def on_duplicates_found(self, folder_id, groups):
+        """显示内容相同的提交"""
+        self._reset_duplicate_btn()
+        if not self.current_folder or self.current_folder[0] != folder_id:
+            return
+        if not groups:
+            QMessageBox.information(self, "检查重复提交", "未发现内容相同的提交")
+            return
+
+        lines = []
+        for group in groups:
+            lines.append("\n".join(f"  {self._describe_submission((student_id,))}: {entry}"
+                                   for student_id, entry in group))
+        QMessageBox.warning(
+            self, "检查重复提交",
+            f"发现 {len(groups)} 组内容相同的文件:\n" + "\n\n".join(lines)
+        )
+
+    def _set_file_cell(self, row, student_files):
+        file_item = QTableWidgetItem(self._format_files(student_files) if student_files else "未提交")
+        if student_files:
+            file_item.setToolTip("\n".join(student_files))
+        self.submission_table.setItem(row, 2, file_item)
+
+    def on_submission_row_changed(self, row, *_):
+        """切换学生时显示其提交文件的预览，并预读后续学生的文件"""
+        if row < 0 or not self.current_folder:
+            return
+
+        student_id = self.submission_table.item(row, 0).text()
+        self.preview_file_combo.blockSignals(True)
+        self.preview_file_combo.clear()
+        self.preview_file_combo.addItems(self.student_files.get(student_id, []))
+        self.preview_file_combo.blockSignals(False)
+        self.show_preview()
+
+        folder_path = self.current_folder[2]
+        for next_row in range(row + 1, min(row + 1 + PREFETCH_ROWS, self.submission_table.rowCount())):
+            files = self.student_files.get(self.submission_table.item(next_row, 0).text())
+            if files:
+                self.preview_loader.request(folder_path, files[0], prefetch=True)
+
+    def show_preview(self):
+        """显示当前选中文件的预览"""
+        entry = self.preview_file_combo.currentText()
+        if not entry or not self.current_folder:
+            self.current_preview_key = None
+            self._set_preview_text("未提交")
+            return
+
+        folder_path = self.current_folder[2]
+        self.current_preview_key = preview_key(folder_path, entry)
+        self._set_preview_text("正在加载预览……")
+        self.preview_loader.request(folder_path, entry)
+
+    def on_preview_ready(self, key, preview):
+        """预览生成完成"""
+        if key != self.current_preview_key:
+            return
+        if preview.kind == 'image':
+            self.preview_image.setPixmap(QPixmap.fromImage(preview.image))
+            self.preview_image.setToolTip(preview.text)
+            self.preview_text.hide()
+            self.preview_image.show()
+        else:
+            self._set_preview_text(preview.text)
+
+    def _set_preview_text(self, text):
+        self.preview_image.hide()
+        self.preview_text.setPlainText(text)
+        self.preview_text.show()
+
+    def _format_files(self, files):
+        """提交文件的简要显示：压缩包内的文件合并为数量"""
+        top_level = []
+        member_counts = {}
+        for entry in files:
+            archive_name, member_name = split_member_path(entry)
+            if member_name is None:
+                top_level.append(entry)
+            else:
+                member_counts[archive_name] = member_counts.get(archive_name, 0) + 1
+                if archive_name not in top_level:
+                    top_level.append(archive_name)
+        return ", ".join(
+            f"{name} ({member_counts[name]}个文件)" if name in member_counts else name
+            for name in top_level
+        )
+
+    def grade_current_row(self, step=1):
+        """批改当前选中的学生，完成后移动到下一位(step=1)或上一位(step=-1)"""
+        row = self.submission_table.currentRow()
+        if row < 0 or not self.current_folder:
+            return
+        student_id = self.submission_table.item(row, 0).text()
+        self.grade_assignment(student_id, self.current_folder[0], step)
+
+    def grade_assignment(self, student_id, folder_id, step=1):
+        """批改作业，只刷新该学生所在行"""
+        row = self.student_rows.get(student_id)
+        if row is None:
+            return
+
+        current_score = 0.0
+        score_item = self.submission_table.item(row, 4)
+        if score_item and score_item.text():
+            try:
+                current_score = float(score_item.text())
+            except ValueError:
+                pass
+
         score, ok = QInputDialog.getDouble(
-            self, "批改作业", "请输入分数 (0-100):",
-            min=0, max=100, decimals=1
+            self, "批改作业", f"{student_id} {self.submission_table.item(row, 1).text()}\n请输入分数 (0-100):",
+            value=current_score, min=0, max=100, decimals=1
         )
 
         if ok:
+            key = (student_id, folder_id)
+            base_score, version = self.submission_versions.get(student_id, (None, None))
+            if self.grade_queue.pending(key) is None:
+                self.grade_bases[key] = base_score
+            self.grade_queue.put(key, (student_id, folder_id, score, version))
+            self.logger.info(f"批改作业: 学生 {student_id} 分数 {score}")
+
+            # 原地更新该行
+            self.submission_table.setItem(row, 3, QTableWidgetItem("已批改"))
+            self.submission_table.setItem(row, 4, QTableWidgetItem(str(score)))
+
+            next_row = row + step
+            if 0 <= next_row < self.submission_table.rowCount():
+                self.submission_table.setCurrentCell(next_row, 0)
+            self.submission_table.setFocus()
+
+    def on_grades_flushed(self, count):
+        """批改结果写入后重新读取当前文件夹的分数和版本号，并通知其他窗口
+
+        分数和版本号一起刷新：只更新版本号时，界面上其他人已修改的旧分数会带着新版本号再次写入，覆盖对方的批改。
+        """
+        if not count:
+            return
+        publish_change('assignment_submissions', source=self)
+        if self.current_folder:
             try:
                 cursor = self.db_conn.cursor()
-
-                # 检查是否已有记录
                 cursor.execute("""
-                               SELECT submission_id
+                               SELECT student_id, status, score, row_version
                                FROM assignment_submissions
-                               WHERE student_id = ?
-                                 AND folder_id = ?
-                               """, (student_id, folder_id))
-                exists = cursor.fetchone()
-
-                if exists:
-                    # 更新记录
-                    cursor.execute("""
-                                   UPDATE assignment_submissions
-                                   SET score  = ?,
-                                       status = '已批改'
-                                   WHERE submission_id = ?
-                                   """, (score, exists[0]))
-                else:
-                    # 插入新记录
-                    cursor.execute("""
-                                   INSERT INTO assignment_submissions
-                                       (student_id, folder_id, file_name, status, score)
-                                   VALUES (?, ?, '手动录入', '已批改', ?)
-                                   """, (student_id, folder_id, score))
-
-                self.db_conn.commit()
-                self.logger.info(f"批改作业: 学生 {student_id} 分数 {score}")
-
-                # 刷新显示
-                current_row = self.folder_table.currentRow()
-                if current_row >= 0:
-                    folder = [
-                        self.folder_table.item(current_row, col).text() for col in range(3)
-                    ]
-                    self.show_folder_details(folder)
+                               WHERE folder_id = ?
+                               """, (self.current_folder[0],))
+                rows = cursor.fetchall()
             except Exception as e:
-                self.logger.error(f"批改作业错误: {str(e)}")
-                QMessageBox.critical(self, "错误", f"批改作业失败: {str(e)}")
\ No newline at end of file
+                self.logger.error(f"读取批改记录版本号错误: {str(e)}")
+                return
+
+            self.submission_versions = {row[0]: (row[2], row[3]) for row in rows}
+            for student_id, status, score, _ in rows:
+                row = self.student_rows.get(student_id)
+                # 仍在队列中的批改保留界面上的分数
+                if row is None or self.grade_queue.pending((student_id, self.current_folder[0])) is not None:
+                    continue
+                self.submission_table.setItem(row, 3, QTableWidgetItem(status))
+                self.submission_table.setItem(row, 4, QTableWidgetItem("" if score is None else str(score)))
+
+    def on_grade_conflicts(self, records):
+        """批改结果与其他人的批改冲突：分数相同时忽略，否则由用户选择保留哪一个"""
+        keys = [key for key, _ in records]
+        try:
+            current = read_versions(self.db_conn, 'assignment_submissions',
+                                    ('student_id', 'folder_id'), ('score',), keys)
+        except Exception as e:
+            self.logger.error(f"读取批改记录错误: {str(e)}")
+            QMessageBox.critical(self, "错误", f"读取批改记录失败: {str(e)}")
+            return
+
+        conflicts = []
+        for key, params in records:
+            theirs, version = current.get(tuple(key), (None, None))
+            base = self.grade_bases.pop(key, None)
+            conflict = RowConflict(tuple(key), None if base is None else (base,), (params[2],), theirs, version)
+            if theirs is not None and theirs[0] == params[2]:
+                continue
+            conflicts.append(conflict)
+            if theirs is not None:
+                self.submission_versions[key[0]] = (theirs[0], version)
+        if not conflicts:
+            return
+
+        resolve = conflict_resolver(self, ["分数"], self._describe_submission)
+        resolutions = resolve(conflicts)
+        for conflict in conflicts:
+            student_id, folder_id = conflict.key
+            values = resolutions.get(conflict.key)
+            if values is not None:
+                self.grade_bases[conflict.key] = conflict.theirs[0] if conflict.theirs else None
+                self.grade_queue.put(conflict.key, (student_id, folder_id, values[0], conflict.version))
+                score = values[0]
+            else:
+                score = conflict.theirs[0] if conflict.theirs else None
+            row = self.student_rows.get(student_id)
+            if row is not None and self.current_folder and self.current_folder[0] == folder_id:
+                self.submission_table.setItem(row, 4, QTableWidgetItem("" if score is None else str(score)))
+
+    def on_grades_rejected(self, records):
+        """批改结果违反约束未能保存（如学生或作业文件夹已被删除），告诉用户是哪些记录"""
+        for key, _, _ in records:
+            self.grade_bases.pop(key, None)
+        students = "、".join(self._describe_submission(key) for key, _, _ in records)
+        QMessageBox.warning(
+            self, "提示", f"以下 {len(records)} 条批改结果未能保存（学生或作业文件夹可能已被删除）:\n{students}"
+        )
+
+    def _describe_submission(self, key):
+        row = self.student_rows.get(key[0])
+        name = self.submission_table.item(row, 1).text() if row is not None else ""
+        return f"{key[0]} {name}"
+
+    def closeEvent(self, event):
+        """窗口关闭时写入未保存的批改结果"""
+        self.grade_queue.close()
+        self.preview_loader.shutdown()
+        self.duplicate_finder.shutdown()
+        super().closeEvent(event)
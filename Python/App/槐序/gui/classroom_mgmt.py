@@ -3,11 +3,20 @@ from PyQt5.QtWidgets import (
     QTableWidgetItem, QPushButton, QComboBox, QLabel,
     QMessageBox, QHeaderView, QDateEdit, QLineEdit,
     QDoubleSpinBox, QDialog, QFormLayout, QDialogButtonBox,
-    QSpinBox, QTextEdit
+    QSpinBox, QTextEdit, QListWidget, QListWidgetItem, QCheckBox,
+    QTableView, QAbstractItemView
 )
-from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtCore import Qt, QDate, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor
 import logging
-from datetime import datetime
+from gui.widgets import refill_combo
+from gui.delegates import set_action_column
+from gui.merge_dialog import conflict_resolver
+from database.concurrency import save_versioned
+from utils.event_bus import get_change_bus, publish_change
+from utils.ui_monitor import timed
+from datetime import datetime, timedelta
+from database.roster_service import get_roster_service
 
 
 class ClassroomManagementWindow(QWidget):
@@ -18,12 +27,26 @@ class ClassroomManagementWindow(QWidget):
         self.db_conn = db_conn
         self.logger = logging.getLogger(__name__)
 
+        # 当前活动及评分表格的编辑状态
+        self.current_activity = None
+        self.current_activity_id = None
+        self.score_rows = {}  # 学号 -> 行号
+        self.score_versions = {}  # 学号 -> ((分数, 评语), 版本号)，读取时的值，保存时检查冲突
+        self.dirty_rows = set()  # 修改后尚未保存的行
+
         self.setWindowTitle("课堂管理")
         self.resize(1000, 700)
         self.init_ui()
         self.load_courses()
         self.load_activities()
 
+        # 其他窗口（或本窗口的对话框）修改数据时只刷新受影响的部分
+        bus = get_change_bus()
+        bus.subscribe(self, ('courses',), lambda table, keys: self.load_courses())
+        bus.subscribe(self, ('classroom_activities',), lambda table, keys: self.load_activities())
+        bus.subscribe(self, ('classroom_scores',), self.on_classroom_scores_changed)
+        bus.subscribe(self, ('students', 'classes', 'course_class'), self.on_roster_changed)
+
     def init_ui(self):
         """初始化界面"""
         layout = QVBoxLayout()
@@ -37,32 +60,73 @@ class ClassroomManagementWindow(QWidget):
         add_activity_btn = QPushButton("新建课堂活动")
         add_activity_btn.clicked.connect(self.add_classroom_activity)
 
+        schedule_btn = QPushButton("批量生成活动")
+        schedule_btn.clicked.connect(self.generate_activity_schedule)
+
+        roll_call_btn = QPushButton("课堂点名")
+        roll_call_btn.clicked.connect(self.start_roll_call)
+
         refresh_btn = QPushButton("刷新")
         refresh_btn.clicked.connect(self.load_activities)
 
+        # 日期范围（默认不限，包括已生成的以后的活动；更早的活动滚动时再加载）
+        self.date_from_edit = QDateEdit()
+        self.date_from_edit.setCalendarPopup(True)
+        self.date_from_edit.setMinimumDate(QDate(2000, 1, 1))
+        self.date_from_edit.setSpecialValueText("不限")
+        self.date_from_edit.setDate(self.date_from_edit.minimumDate())
+        self.date_from_edit.dateChanged.connect(self.load_activities)
+
+        self.date_to_edit = QDateEdit()
+        self.date_to_edit.setCalendarPopup(True)
+        self.date_to_edit.setMinimumDate(QDate(2000, 1, 1))
+        self.date_to_edit.setSpecialValueText("不限")
+        self.date_to_edit.setDate(self.date_to_edit.minimumDate())
+        self.date_to_edit.dateChanged.connect(self.load_activities)
+
         toolbar.addWidget(QLabel("课程:"))
         toolbar.addWidget(self.course_combo)
+        toolbar.addWidget(QLabel("日期:"))
+        toolbar.addWidget(self.date_from_edit)
+        toolbar.addWidget(QLabel("至"))
+        toolbar.addWidget(self.date_to_edit)
         toolbar.addWidget(add_activity_btn)
+        toolbar.addWidget(schedule_btn)
+        toolbar.addWidget(roll_call_btn)
         toolbar.addWidget(refresh_btn)
         layout.addLayout(toolbar)
 
         # 课堂活动表格
-        self.activity_table = QTableWidget()
-        self.activity_table.setColumnCount(5)
-        self.activity_table.setHorizontalHeaderLabels(["ID", "课程", "日期", "活动类型", "操作"])
+        self.activity_model = ActivityTableModel(self.db_conn)
+        self.activity_table = QTableView()
+        self.activity_table.setModel(self.activity_model)
         self.activity_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.activity_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.activity_table.cellClicked.connect(self.show_activity_details)
+        self.activity_table.setSelectionBehavior(QTableView.SelectRows)
+        self.activity_table.clicked.connect(
+            lambda index: self.show_activity_details(self.activity_model.rows[index.row()])
+        )
         layout.addWidget(self.activity_table)
 
-        # 学生评分区域
+        # 学生评分区域（分数和评语可直接编辑，统一保存）
+        detail_layout = QHBoxLayout()
         self.detail_label = QLabel("选择课堂活动查看学生评分")
-        layout.addWidget(self.detail_label)
+
+        self.save_scores_btn = QPushButton("保存评分")
+        self.save_scores_btn.setEnabled(False)
+        self.save_scores_btn.clicked.connect(self.save_scores)
+
+        detail_layout.addWidget(self.detail_label)
+        detail_layout.addStretch()
+        detail_layout.addWidget(self.save_scores_btn)
+        layout.addLayout(detail_layout)
 
         self.score_table = QTableWidget()
         self.score_table.setColumnCount(5)
         self.score_table.setHorizontalHeaderLabels(["学号", "姓名", "分数", "评语", "操作"])
         self.score_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.score_table.itemChanged.connect(self.on_score_item_changed)
+        set_action_column(self.score_table, 4, "评分", lambda row: self.grade_student(
+            self.score_table.item(row, 0).text(), self.current_activity_id))
         layout.addWidget(self.score_table)
 
         self.setLayout(layout)
@@ -74,117 +138,400 @@ class ClassroomManagementWindow(QWidget):
             cursor.execute("SELECT course_id, course_name FROM courses ORDER BY course_name")
             courses = cursor.fetchall()
 
-            self.course_combo.clear()
-            self.course_combo.addItem("所有课程", None)
-
-            for course_id, course_name in courses:
-                self.course_combo.addItem(course_name, course_id)
+            refill_combo(self.course_combo, "所有课程", courses)
         except Exception as e:
             self.logger.error(f"加载课程列表错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载课程列表失败: {str(e)}")
 
+    @timed()
     def load_activities(self):
-        """加载课堂活动列表"""
+        """加载课堂活动列表（按日期倒序分页，滚动到底部时加载更早的活动）"""
         course_id = self.course_combo.currentData()
 
-        try:
-            cursor = self.db_conn.cursor()
+        date_from = date_to = None
+        if self.date_from_edit.date() != self.date_from_edit.minimumDate():
+            date_from = self.date_from_edit.date().toString("yyyy-MM-dd")
+        if self.date_to_edit.date() != self.date_to_edit.minimumDate():
+            date_to = self.date_to_edit.date().toString("yyyy-MM-dd")
 
-            query = """
-                    SELECT a.activity_id, \
-                           c.course_name, \
-                           a.activity_date,
-                           a.activity_type
-                    FROM classroom_activities a
-                             JOIN courses c ON a.course_id = c.course_id
-                    WHERE 1 = 1
-                    """
-            params = []
-
-            if course_id:
-                query += " AND a.course_id = ?"
-                params.append(course_id)
-
-            query += " ORDER BY a.activity_date DESC"
-
-            cursor.execute(query, params)
-            activities = cursor.fetchall()
-
-            self.activity_table.setRowCount(len(activities))
-            for row, activity in enumerate(activities):
-                for col in range(4):
-                    self.activity_table.setItem(row, col, QTableWidgetItem(str(activity[col])))
-
-                # 添加评分按钮
-                score_btn = QPushButton("学生评分")
-                score_btn.clicked.connect(lambda _, a=activity: self.show_activity_details(a))
-                self.activity_table.setCellWidget(row, 4, score_btn)
+        try:
+            self.activity_model.set_filter(course_id, date_from, date_to)
         except Exception as e:
             self.logger.error(f"加载课堂活动错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载课堂活动失败: {str(e)}")
+            return
+        self.scroll_to_today()
+
+    def scroll_to_today(self):
+        """列表滚动到今天及以前最近的活动，以后的活动在它上面"""
+        row = self.activity_model.row_on_or_before(QDate.currentDate().toString("yyyy-MM-dd"))
+        if row is not None:
+            self.activity_table.scrollTo(self.activity_model.index(row, 0), QAbstractItemView.PositionAtTop)
+
+    def showEvent(self, event):
+        """每次显示时按当天日期重新定位（窗口关闭后保留，再次打开时可能已过了几天）"""
+        super().showEvent(event)
+        self.scroll_to_today()
 
     def add_classroom_activity(self):
         """新建课堂活动"""
         dialog = ClassroomActivityDialog(self.db_conn)
-        if dialog.exec_() == QDialog.Accepted:  # 只有点击 OK 才会执行到这里
-            self.load_activities()
+        dialog.exec_()  # 新建的活动通过数据变更通知刷新列表
+
+    def generate_activity_schedule(self):
+        """按周期批量生成课堂活动"""
+        dialog = ActivityScheduleDialog(self.db_conn)
+        dialog.exec_()
 
+    def start_roll_call(self):
+        """课堂快速点名"""
+        course_id = self.course_combo.currentData()
+        if not course_id:
+            QMessageBox.warning(self, "提示", "请先选择课程")
+            return
+
+        from gui.roll_call import RollCallDialog
+        dialog = RollCallDialog(self.db_conn, course_id, self.course_combo.currentText())
+        dialog.exec_()
+
+    @timed()
     def show_activity_details(self, activity):
         """显示课堂活动的学生评分"""
-        activity_id, course_name, activity_date, activity_type = activity
+        activity_id, course_name, activity_date, activity_type, course_id = activity
+        if not self.confirm_unsaved_scores():
+            return
         self.detail_label.setText(f"课堂活动: {course_name} - {activity_type} ({activity_date})")
 
         try:
-            # 获取该课程的学生列表
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                           SELECT s.student_id, s.name
-                           FROM students s
-                                    JOIN classes c ON s.class_id = c.class_id
-                                    JOIN course_class cc ON c.class_id = cc.class_id
-                           WHERE cc.course_id = (SELECT course_id
-                                                 FROM classroom_activities
-                                                 WHERE activity_id = ?)
-                           ORDER BY s.student_id
-                           """, (activity_id,))
-            students = cursor.fetchall()
+            # 获取该课程的学生列表（共享缓存）
+            students = get_roster_service(self.db_conn).get_roster(course_id)
 
             # 获取已有评分记录
+            cursor = self.db_conn.cursor()
             cursor.execute("""
-                           SELECT student_id, score, comment
+                           SELECT student_id, score, comment, row_version
                            FROM classroom_scores
                            WHERE activity_id = ?
                            """, (activity_id,))
-            scores = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
-
+            scores = {}
+            self.score_versions = {}
+            for student_id, score, comment, row_version in cursor.fetchall():
+                scores[student_id] = (score, comment)
+                self.score_versions[student_id] = ((score, comment), row_version)
+
+            self.current_activity = activity
+            self.current_activity_id = activity_id
+            self.score_rows = {}
+            self.dirty_rows = set()
+
+            self.score_table.blockSignals(True)
             self.score_table.setRowCount(len(students))
             for row, (student_id, name) in enumerate(students):
-                self.score_table.setItem(row, 0, QTableWidgetItem(student_id))
-                self.score_table.setItem(row, 1, QTableWidgetItem(name))
+                self.score_rows[student_id] = row
+                for col, text in enumerate((student_id, name)):
+                    item = QTableWidgetItem(text)
+                    item.setFlags(item.flags() & ~Qt.ItemIsEditable)
+                    self.score_table.setItem(row, col, item)
 
-                # 分数和评语
+                # 分数和评语（尚无评分记录的学生留空，修改后才会保存）
                 if student_id in scores:
                     score, comment = scores[student_id]
                     self.score_table.setItem(row, 2, QTableWidgetItem(str(score)))
                     self.score_table.setItem(row, 3, QTableWidgetItem(comment or ""))
                 else:
-                    self.score_table.setItem(row, 2, QTableWidgetItem("0"))
+                    self.score_table.setItem(row, 2, QTableWidgetItem(""))
                     self.score_table.setItem(row, 3, QTableWidgetItem(""))
-
-                # 操作按钮
-                grade_btn = QPushButton("评分")
-                grade_btn.clicked.connect(lambda _, s=student_id: self.grade_student(s, activity_id))
-                self.score_table.setCellWidget(row, 4, grade_btn)
+            self.score_table.blockSignals(False)
+            self.update_save_state()
 
         except Exception as e:
             self.logger.error(f"加载课堂活动详情错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载课堂活动详情失败: {str(e)}")
 
+    def on_classroom_scores_changed(self, table, keys):
+        """课堂评分变化时只刷新当前活动中受影响且未在本窗口修改的行"""
+        if self.current_activity_id is None:
+            return
+        if keys is None:
+            student_ids = set(self.score_rows)
+        else:
+            student_ids = {student_id for activity_id, student_id in keys
+                           if activity_id == self.current_activity_id and student_id in self.score_rows}
+        self.refresh_score_rows([sid for sid in student_ids if self.score_rows[sid] not in self.dirty_rows])
+
+    def refresh_score_rows(self, student_ids):
+        """从数据库重新读取当前活动中指定学生的评分和版本号"""
+        student_ids = list(student_ids)
+        if not student_ids:
+            return
+
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.execute(f"""
+                           SELECT student_id, score, comment, row_version
+                           FROM classroom_scores
+                           WHERE activity_id = ?
+                             AND student_id IN ({", ".join("?" * len(student_ids))})
+                           """, [self.current_activity_id] + student_ids)
+            scores = {row[0]: ((row[1], row[2]), row[3]) for row in cursor.fetchall()}
+        except Exception as e:
+            self.logger.error(f"刷新课堂评分错误: {str(e)}")
+            return
+
+        self.score_table.blockSignals(True)
+        for student_id in student_ids:
+            row = self.score_rows[student_id]
+            if student_id in scores:
+                (score, comment), _ = scores[student_id]
+                self.score_table.setItem(row, 2, QTableWidgetItem(str(score)))
+                self.score_table.setItem(row, 3, QTableWidgetItem(comment or ""))
+                self.score_versions[student_id] = scores[student_id]
+            else:
+                self.score_table.setItem(row, 2, QTableWidgetItem(""))
+                self.score_table.setItem(row, 3, QTableWidgetItem(""))
+                self.score_versions.pop(student_id, None)
+            self.dirty_rows.discard(row)
+        self.score_table.blockSignals(False)
+        self.update_save_state()
+
+    def on_roster_changed(self, table, keys):
+        """名单变化时重新显示当前活动（有未保存的修改时保持不动）"""
+        if table == 'course_class' and keys is not None and self.current_activity \
+                and self.current_activity[4] not in keys:
+            return
+        if self.current_activity and not self.dirty_rows:
+            self.show_activity_details(self.current_activity)
+
     def grade_student(self, student_id, activity_id):
-        """为学生评分"""
+        """为学生评分，只刷新该学生所在行"""
         dialog = StudentGradeDialog(self.db_conn, student_id, activity_id)
         if dialog.exec_() == QDialog.Accepted:
-            self.show_activity_details([activity_id, "", "", ""])  # 刷新显示
+            row = self.score_rows.get(student_id)
+            if row is None or activity_id != self.current_activity_id:
+                return
+            self.refresh_score_rows([student_id])
+
+    def on_score_item_changed(self, item):
+        """表格中的分数或评语被修改"""
+        if item.column() in (2, 3):
+            self.dirty_rows.add(item.row())
+            self.update_save_state()
+
+    def update_save_state(self):
+        """更新保存按钮状态"""
+        self.save_scores_btn.setEnabled(self.current_activity_id is not None and bool(self.dirty_rows))
+        self.save_scores_btn.setText(f"保存评分 ({len(self.dirty_rows)} 处修改)" if self.dirty_rows else "保存评分")
+
+    def save_scores(self):
+        """在一个事务中保存表格中修改过的评分
+
+        只写入读取后未被其他人修改的记录；被修改过的按字段合并，双方改了同一处时弹出合并对话框。
+        分数和评语都清空的学生删除评分记录。
+        """
+        if self.current_activity_id is None:
+            return
+
+        rows = []
+        cleared = []  # 清空后本来就没有记录的行
+        for student_id, row in self.score_rows.items():
+            if row not in self.dirty_rows:
+                continue
+            score_text = self.score_table.item(row, 2).text().strip()
+            comment = self.score_table.item(row, 3).text()
+            if not score_text:
+                if comment.strip():
+                    QMessageBox.warning(self, "输入错误",
+                                        f"学生 {student_id} 有评语但没有分数，请填写分数，或同时清空评语以删除评分")
+                    self.score_table.setCurrentCell(row, 2)
+                    return
+                if student_id in self.score_versions:
+                    base, version = self.score_versions[student_id]
+                    rows.append(((self.current_activity_id, student_id), base, None, version))
+                else:
+                    cleared.append(row)
+                continue
+            try:
+                score = float(score_text)
+            except ValueError:
+                QMessageBox.warning(self, "输入错误", f"学生 {student_id} 的分数无效: {score_text}")
+                self.score_table.setCurrentCell(row, 2)
+                return
+            if score < -100 or score > 100:
+                QMessageBox.warning(self, "输入错误", f"学生 {student_id} 的分数应在 -100 到 100 之间")
+                self.score_table.setCurrentCell(row, 2)
+                return
+            if student_id in self.score_versions:
+                base, version = self.score_versions[student_id]
+                if not comment and base[1] is None:
+                    comment = None
+            else:
+                base, version = None, None
+            rows.append(((self.current_activity_id, student_id), base, (score, comment), version))
+
+        self.dirty_rows.difference_update(cleared)
+        self.update_save_state()
+        if not rows:
+            return
+
+        names = {student_id: self.score_table.item(row, 1).text() for student_id, row in self.score_rows.items()}
+        try:
+            written, _ = save_versioned(
+                self.db_conn, 'classroom_scores', ('activity_id', 'student_id'), ('score', 'comment'), rows,
+                resolve=conflict_resolver(self, ["分数", "评语"], lambda key: f"{key[1]} {names.get(key[1], '')}")
+            )
+            student_ids = [key[1] for key, _, _, _ in rows]
+            publish_change('classroom_scores', [key for key, _, _, _ in rows], source=self)
+            self.refresh_score_rows(student_ids)
+            self.logger.info(f"保存课堂评分: 活动 {self.current_activity_id} 共 {written} 名学生")
+        except Exception as e:
+            self.logger.error(f"保存课堂评分错误: {str(e)}")
+            QMessageBox.critical(self, "错误", f"保存评分失败: {str(e)}")
+
+    def confirm_unsaved_scores(self):
+        """有未保存的修改时询问是否保存，返回 False 表示保存失败需停留在当前活动"""
+        if not self.dirty_rows:
+            return True
+        reply = QMessageBox.question(
+            self, "未保存的评分",
+            f"当前活动有 {len(self.dirty_rows)} 处评分修改尚未保存，是否保存？",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.save_scores()
+            return not self.dirty_rows
+        # 放弃修改：从数据库重新读取这些行（窗口关闭后会保留，下次打开时不能再显示放弃的修改）
+        student_ids = [student_id for student_id, row in self.score_rows.items() if row in self.dirty_rows]
+        self.dirty_rows = set()
+        self.refresh_score_rows(student_ids)
+        return True
+
+    def closeEvent(self, event):
+        """窗口关闭时提示保存评分"""
+        if self.confirm_unsaved_scores():
+            event.accept()
+        else:
+            event.ignore()
+
+
+class ActivityTableModel(QAbstractTableModel):
+    """课堂活动分页模型
+
+    按 (活动日期, 活动ID) 倒序做键集分页，每页 PAGE_SIZE 行，
+    视图滚动到底部时通过 fetchMore 加载下一页。
+    """
+    PAGE_SIZE = 100
+    HEADERS = ["ID", "课程", "日期", "活动类型", "操作"]
+
+    def __init__(self, db_conn, parent=None):
+        super().__init__(parent)
+        self.db_conn = db_conn
+        self.logger = logging.getLogger(__name__)
+        self.rows = []  # (活动ID, 课程名, 日期, 活动类型, 课程ID)
+        self.course_id = None
+        self.date_from = None
+        self.date_to = None
+        self._exhausted = True
+
+    def set_filter(self, course_id, date_from=None, date_to=None):
+        """设置筛选条件并重新加载第一页"""
+        self.beginResetModel()
+        self.course_id = course_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.rows = []
+        self._exhausted = False
+        try:
+            self.rows = self._fetch_page()
+        finally:
+            self.endResetModel()
+
+    def _fetch_page(self):
+        query = """
+                SELECT a.activity_id,
+                       c.course_name,
+                       a.activity_date,
+                       a.activity_type,
+                       a.course_id
+                FROM classroom_activities a
+                         JOIN courses c ON a.course_id = c.course_id
+                WHERE 1 = 1
+                """
+        params = []
+
+        if self.course_id:
+            query += " AND a.course_id = ?"
+            params.append(self.course_id)
+        if self.date_from:
+            query += " AND a.activity_date >= ?"
+            params.append(self.date_from)
+        if self.date_to:
+            query += " AND a.activity_date <= ?"
+            params.append(self.date_to)
+        if self.rows:
+            last = self.rows[-1]
+            query += " AND (a.activity_date, a.activity_id) < (?, ?)"
+            params.extend([last[2], last[0]])
+
+        query += " ORDER BY a.activity_date DESC, a.activity_id DESC LIMIT ?"
+        params.append(self.PAGE_SIZE)
+
+        cursor = self.db_conn.cursor()
+        cursor.execute(query, params)
+        page = cursor.fetchall()
+        if len(page) < self.PAGE_SIZE:
+            self._exhausted = True
+        return page
+
+    def row_on_or_before(self, date):
+        """第一条日期不晚于 date 的活动所在行（需要时继续加载下一页），没有则返回 None"""
+        start = 0
+        while True:
+            for row in range(start, len(self.rows)):
+                if self.rows[row][2] <= date:
+                    return row
+            if not self.canFetchMore():
+                return None
+            start = len(self.rows)
+            self.fetchMore()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        try:
+            page = self._fetch_page()
+        except Exception as e:
+            self._exhausted = True
+            self.logger.error(f"加载更多课堂活动错误: {str(e)}")
+            return
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            if index.column() == 4:
+                return "学生评分"
+            return str(self.rows[index.row()][index.column()])
+        if role == Qt.ForegroundRole and index.column() == 4:
+            return QColor("#2196F3")
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
 
 
 class ClassroomActivityDialog(QDialog):
@@ -213,7 +560,7 @@ class ClassroomActivityDialog(QDialog):
 
         # 活动类型
         self.type_combo = QComboBox()
-        self.type_combo.addItems(["回答问题", "小组讨论", "课堂测验", "演示汇报", "其他"])
+        self.type_combo.addItems(["回答问题", "小组讨论", "课堂测验", "演示汇报", "考勤", "其他"])
         layout.addRow("活动类型:", self.type_combo)
 
         # 最大分数
@@ -284,6 +631,7 @@ class ClassroomActivityDialog(QDialog):
                                data['description']
                            ))
             self.db_conn.commit()
+            publish_change('classroom_activities', cursor.lastrowid)
             QMessageBox.information(self, "成功", "课堂活动已成功创建！")
             super().accept()  # 调用父类 accept()，关闭对话框并返回 QDialog.Accepted
 
@@ -291,6 +639,191 @@ class ClassroomActivityDialog(QDialog):
             QMessageBox.critical(self, "数据库错误", f"创建课堂活动失败：{str(e)}")
 
 
+WEEKDAY_NAMES = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+
+
+def expand_schedule(course_ids, start_date, end_date, weekdays, activity_type, max_score, description=""):
+    """展开重复规则，返回活动列表 [(课程ID, 日期, 活动类型, 最大分数, 描述)]
+
+    start_date / end_date 为 datetime.date，weekdays 为 0(周一) ~ 6(周日) 的集合。
+    """
+    dates = []
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in weekdays:
+            dates.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=1)
+
+    return [
+        (course_id, activity_date, activity_type, max_score, description)
+        for course_id in course_ids
+        for activity_date in dates
+    ]
+
+
+class ActivityScheduleDialog(QDialog):
+    """批量生成课堂活动对话框"""
+
+    def __init__(self, db_conn):
+        super().__init__()
+        self.db_conn = db_conn
+        self.logger = logging.getLogger(__name__)
+        self.course_names = {}
+        self.activities = []
+        self.setWindowTitle("批量生成课堂活动")
+        self.resize(700, 700)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        form = QFormLayout()
+
+        # 课程（可多选）
+        self.course_list = QListWidget()
+        self.course_list.setMaximumHeight(120)
+        self.load_courses()
+        form.addRow("课程:", self.course_list)
+
+        # 日期范围
+        date_layout = QHBoxLayout()
+        self.start_date_edit = QDateEdit()
+        self.start_date_edit.setCalendarPopup(True)
+        self.start_date_edit.setDate(QDate.currentDate())
+        self.end_date_edit = QDateEdit()
+        self.end_date_edit.setCalendarPopup(True)
+        self.end_date_edit.setDate(QDate.currentDate().addMonths(4))
+        date_layout.addWidget(self.start_date_edit)
+        date_layout.addWidget(QLabel("至"))
+        date_layout.addWidget(self.end_date_edit)
+        form.addRow("日期范围:", date_layout)
+
+        # 每周重复
+        weekday_layout = QHBoxLayout()
+        self.weekday_checks = []
+        for name in WEEKDAY_NAMES:
+            check = QCheckBox(name)
+            self.weekday_checks.append(check)
+            weekday_layout.addWidget(check)
+        form.addRow("每周:", weekday_layout)
+
+        # 活动类型
+        self.type_combo = QComboBox()
+        self.type_combo.addItems(["回答问题", "小组讨论", "课堂测验", "演示汇报", "考勤", "其他"])
+        form.addRow("活动类型:", self.type_combo)
+
+        # 最大分数
+        self.max_score_spin = QDoubleSpinBox()
+        self.max_score_spin.setRange(0, 100)
+        self.max_score_spin.setValue(10)
+        self.max_score_spin.setSuffix("分")
+        form.addRow("最大分数:", self.max_score_spin)
+
+        # 活动描述
+        self.desc_edit = QLineEdit()
+        form.addRow("活动描述:", self.desc_edit)
+
+        layout.addLayout(form)
+
+        # 预览
+        preview_btn = QPushButton("预览")
+        preview_btn.clicked.connect(self.preview)
+        layout.addWidget(preview_btn)
+
+        self.preview_label = QLabel("设置规则后点击预览")
+        layout.addWidget(self.preview_label)
+
+        self.preview_table = QTableWidget()
+        self.preview_table.setColumnCount(4)
+        self.preview_table.setHorizontalHeaderLabels(["课程", "日期", "活动类型", "最大分数"])
+        self.preview_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.preview_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.preview_table)
+
+        # 按钮
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.setLayout(layout)
+
+    def load_courses(self):
+        """加载课程列表"""
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.execute("SELECT course_id, course_name FROM courses ORDER BY course_name")
+            for course_id, course_name in cursor.fetchall():
+                self.course_names[course_id] = course_name
+                item = QListWidgetItem(course_name)
+                item.setData(Qt.UserRole, course_id)
+                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+                item.setCheckState(Qt.Unchecked)
+                self.course_list.addItem(item)
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"加载课程列表失败: {str(e)}")
+
+    def build_activities(self):
+        """根据当前设置展开活动列表"""
+        course_ids = [
+            self.course_list.item(i).data(Qt.UserRole)
+            for i in range(self.course_list.count())
+            if self.course_list.item(i).checkState() == Qt.Checked
+        ]
+        weekdays = {i for i, check in enumerate(self.weekday_checks) if check.isChecked()}
+        return expand_schedule(
+            course_ids,
+            self.start_date_edit.date().toPyDate(),
+            self.end_date_edit.date().toPyDate(),
+            weekdays,
+            self.type_combo.currentText(),
+            self.max_score_spin.value(),
+            self.desc_edit.text().strip()
+        )
+
+    def preview(self):
+        """预览将要生成的活动"""
+        self.activities = self.build_activities()
+        self.preview_label.setText(f"共将生成 {len(self.activities)} 个课堂活动（已存在的同日同类型活动会跳过）")
+
+        self.preview_table.setRowCount(len(self.activities))
+        for row, (course_id, activity_date, activity_type, max_score, _) in enumerate(self.activities):
+            self.preview_table.setItem(row, 0, QTableWidgetItem(self.course_names[course_id]))
+            self.preview_table.setItem(row, 1, QTableWidgetItem(activity_date))
+            self.preview_table.setItem(row, 2, QTableWidgetItem(activity_type))
+            self.preview_table.setItem(row, 3, QTableWidgetItem(str(max_score)))
+
+    def accept(self):
+        self.preview()
+        if not self.activities:
+            QMessageBox.warning(self, "提示", "请选择课程、日期范围和每周重复的日子")
+            return
+
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.executemany("""
+                               INSERT INTO classroom_activities
+                                   (course_id, activity_date, activity_type, max_score, description)
+                               SELECT ?1, ?2, ?3, ?4, ?5
+                               WHERE NOT EXISTS (SELECT 1
+                                                 FROM classroom_activities
+                                                 WHERE course_id = ?1
+                                                   AND activity_date = ?2
+                                                   AND activity_type = ?3)
+                               """, self.activities)
+            # executemany 的 rowcount 是各条语句插入行数之和，不含触发器写入的行
+            inserted = cursor.rowcount
+            self.db_conn.commit()
+            if inserted:
+                publish_change('classroom_activities')
+            self.logger.info(f"批量生成课堂活动 {inserted} 个")
+            QMessageBox.information(self, "成功", f"已生成 {inserted} 个课堂活动")
+            super().accept()
+        except Exception as e:
+            self.db_conn.rollback()
+            self.logger.error(f"批量生成课堂活动错误: {str(e)}")
+            QMessageBox.critical(self, "数据库错误", f"批量生成课堂活动失败：{str(e)}")
+
+
 class StudentGradeDialog(QDialog):
     """学生评分对话框"""
 
@@ -299,6 +832,8 @@ class StudentGradeDialog(QDialog):
         self.db_conn = db_conn
         self.student_id = student_id
         self.activity_id = activity_id
+        self.base_values = None  # 读取时的 (分数, 评语)，尚无评分时为 None
+        self.row_version = None
         self.setWindowTitle("学生评分")
         self.resize(300, 200)
         self.init_ui()
@@ -355,15 +890,16 @@ class StudentGradeDialog(QDialog):
             activity_type, description, course_name = cursor.fetchone()
             self.activity_label.setText(f"{course_name} - {activity_type}")
 
-            # 加载已有评分
+            # 加载已有评分，记下版本号，保存时检查期间是否被其他人修改
             cursor.execute("""
-                           SELECT score, comment
+                           SELECT score, comment, row_version
                            FROM classroom_scores
                            WHERE activity_id = ?
                              AND student_id = ?
                            """, (self.activity_id, self.student_id))
             existing = cursor.fetchone()
             if existing:
+                self.base_values, self.row_version = (existing[0], existing[1]), existing[2]
                 self.score_spin.setValue(existing[0])
                 self.comment_edit.setPlainText(existing[1] or "")
 
@@ -375,35 +911,15 @@ class StudentGradeDialog(QDialog):
         try:
             score = self.score_spin.value()
             comment = self.comment_edit.toPlainText()
-
-            cursor = self.db_conn.cursor()
-
-            # 检查是否已有记录
-            cursor.execute("""
-                           SELECT score_id
-                           FROM classroom_scores
-                           WHERE activity_id = ?
-                             AND student_id = ?
-                           """, (self.activity_id, self.student_id))
-
-            existing = cursor.fetchone()
-
-            if existing:
-                # 更新记录
-                cursor.execute("""
-                               UPDATE classroom_scores
-                               SET score   = ?,
-                                   comment = ?
-                               WHERE score_id = ?
-                               """, (score, comment, existing[0]))
-            else:
-                # 插入新记录
-                cursor.execute("""
-                               INSERT INTO classroom_scores (activity_id, student_id, score, comment)
-                               VALUES (?, ?, ?, ?)
-                               """, (self.activity_id, self.student_id, score, comment))
-
-            self.db_conn.commit()
+            if not comment and self.base_values is not None and self.base_values[1] is None:
+                comment = None
+
+            save_versioned(
+                self.db_conn, 'classroom_scores', ('activity_id', 'student_id'), ('score', 'comment'),
+                [((self.activity_id, self.student_id), self.base_values, (score, comment), self.row_version)],
+                resolve=conflict_resolver(self, ["分数", "评语"], lambda key: self.student_label.text())
+            )
+            publish_change('classroom_scores', (self.activity_id, self.student_id))
             self.accept()
 
         except Exception as e:
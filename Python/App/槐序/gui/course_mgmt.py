@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt
 import logging
+from utils.ui_monitor import timed
 
 
 class CourseManagementWindow(QWidget):
@@ -57,6 +58,7 @@ class CourseManagementWindow(QWidget):
 
         self.setLayout(layout)
 
+    @timed()
     def load_courses(self):
         """加载课程列表"""
         try:
@@ -5,6 +5,12 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt
 import logging
+from gui.widgets import refill_combo
+from gui.delegates import set_action_column
+from gui.merge_dialog import conflict_resolver
+from database.concurrency import save_versioned
+from utils.event_bus import get_change_bus, publish_change
+from utils.ui_monitor import timed
 
 
 class GradeManagementWindow(QWidget):
@@ -21,6 +27,13 @@ class GradeManagementWindow(QWidget):
         self.load_courses()
         self.load_classes()
 
+        # 其他窗口修改数据时只刷新受影响的下拉框和行
+        bus = get_change_bus()
+        bus.subscribe(self, ('courses',), lambda table, keys: self.load_courses())
+        bus.subscribe(self, ('classes',), lambda table, keys: self.load_classes())
+        bus.subscribe(self, ('students',), lambda table, keys: self.load_grades())
+        bus.subscribe(self, ('scores',), self.on_scores_changed)
+
     def init_ui(self):
         """初始化界面"""
         layout = QVBoxLayout()
@@ -70,6 +83,7 @@ class GradeManagementWindow(QWidget):
         ])
         self.grade_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.grade_table.setSelectionBehavior(QTableWidget.SelectRows)
+        set_action_column(self.grade_table, 3, "编辑", self.edit_grade)
         layout.addWidget(self.grade_table)
 
         # 统计信息区域
@@ -93,6 +107,21 @@ class GradeManagementWindow(QWidget):
             except ValueError:
                 pass
 
+        # 记下打开对话框时各考试类型的成绩和版本号，保存时检查期间是否被其他人修改
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.execute("""
+                           SELECT exam_type, score, row_version
+                           FROM scores
+                           WHERE student_id = ?
+                             AND course_id = ?
+                           """, (student_id, course_id))
+            versions = {exam_type: (score, row_version) for exam_type, score, row_version in cursor.fetchall()}
+        except Exception as e:
+            self.logger.error(f"读取成绩错误: {str(e)}")
+            QMessageBox.critical(self, "错误", f"读取成绩失败: {str(e)}")
+            return
+
         dialog = GradeEditDialog(
             self.db_conn, student_id, student_name, course_id, current_score
         )
@@ -101,36 +130,17 @@ class GradeManagementWindow(QWidget):
             data = dialog.get_data()
             if data:
                 try:
-                    cursor = self.db_conn.cursor()
-
-                    # 检查是否已有成绩记录
-                    cursor.execute("""
-                                   SELECT score_id
-                                   FROM scores
-                                   WHERE student_id = ?
-                                     AND course_id = ?
-                                     AND exam_type = ?
-                                   """, (student_id, course_id, data['exam_type']))
-
-                    existing = cursor.fetchone()
-
-                    if existing:
-                        # 更新成绩
-                        cursor.execute("""
-                                       UPDATE scores
-                                       SET score = ?
-                                       WHERE score_id = ?
-                                       """, (data['score'], existing[0]))
-                    else:
-                        # 插入新成绩
-                        cursor.execute("""
-                                       INSERT INTO scores (student_id, course_id, score, exam_type)
-                                       VALUES (?, ?, ?, ?)
-                                       """, (student_id, course_id, data['score'], data['exam_type']))
-
-                    self.db_conn.commit()
+                    base_score, version = versions.get(data['exam_type'], (None, None))
+                    key = (student_id, course_id, data['exam_type'])
+                    written, _ = save_versioned(
+                        self.db_conn, 'scores', ('student_id', 'course_id', 'exam_type'), ('score',),
+                        [(key, None if version is None else (base_score,), (data['score'],), version)],
+                        resolve=conflict_resolver(self, ["成绩"], lambda k: f"{student_name} {k[2]}")
+                    )
                     self.load_grades()
-                    self.logger.info(f"更新成绩: {student_id} - {data['score']}")
+                    publish_change('scores', [(student_id, course_id)], source=self)
+                    if written:
+                        self.logger.info(f"更新成绩: {student_id} - {data['score']}")
 
                 except Exception as e:
                     self.logger.error(f"更新成绩错误: {str(e)}")
@@ -145,11 +155,7 @@ class GradeManagementWindow(QWidget):
             cursor.execute("SELECT course_id, course_name FROM courses ORDER BY course_name")
             courses = cursor.fetchall()
 
-            self.course_combo.clear()
-            self.course_combo.addItem("所有课程", None)
-
-            for course_id, course_name in courses:
-                self.course_combo.addItem(course_name, course_id)
+            refill_combo(self.course_combo, "所有课程", courses)
         except Exception as e:
             self.logger.error(f"加载课程列表错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载课程列表失败: {str(e)}")
@@ -161,15 +167,12 @@ class GradeManagementWindow(QWidget):
             cursor.execute("SELECT class_id, class_name FROM classes ORDER BY class_name")
             classes = cursor.fetchall()
 
-            self.class_combo.clear()
-            self.class_combo.addItem("所有班级", None)
-
-            for class_id, class_name in classes:
-                self.class_combo.addItem(class_name, class_id)
+            refill_combo(self.class_combo, "所有班级", classes)
         except Exception as e:
             self.logger.error(f"加载班级列表错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载班级列表失败: {str(e)}")
 
+    @timed()
     def load_grades(self):
         """加载成绩数据"""
         course_id = self.course_combo.currentData()
@@ -199,40 +202,84 @@ class GradeManagementWindow(QWidget):
             for row, (student_id, name, score) in enumerate(grades):
                 self.grade_table.setItem(row, 0, QTableWidgetItem(student_id))
                 self.grade_table.setItem(row, 1, QTableWidgetItem(name))
-                self.grade_table.setItem(row, 2, QTableWidgetItem(str(score) if score else ""))
+                self.grade_table.setItem(row, 2, QTableWidgetItem("" if score is None else str(score)))
 
-                # 操作按钮
-                edit_btn = QPushButton("编辑")
-                edit_btn.clicked.connect(lambda _, r=row: self.edit_grade(r))
-                self.grade_table.setCellWidget(row, 3, edit_btn)
-
-            # 计算统计信息
-            cursor.execute("""
-                           SELECT AVG(score),
-                                  MAX(score),
-                                  MIN(score),
-                                  COUNT(CASE WHEN score >= 60 THEN 1 END) * 100.0 / COUNT(*)
-                           FROM scores
-                           WHERE course_id = ?
-                             AND student_id IN (SELECT student_id
-                                                FROM students
-                                                WHERE class_id = ?)
-                           """, (course_id, class_id))
-            stats = cursor.fetchone()
-
-            avg, max_, min_, pass_rate = stats
-            stats_text = (
-                f"统计信息: 平均分 {avg:.1f} | "
-                f"最高分 {max_ or '无'} | "
-                f"最低分 {min_ or '无'} | "
-                f"及格率 {pass_rate or 0:.1f}%"
-            )
-            self.stats_label.setText(stats_text)
+            self.update_stats(cursor, course_id, class_id)
 
         except Exception as e:
             self.logger.error(f"加载成绩错误: {str(e)}")
             QMessageBox.critical(self, "错误", f"加载成绩失败: {str(e)}")
 
+    def on_scores_changed(self, table, keys):
+        """成绩变化时只刷新当前课程中受影响学生的成绩单元格"""
+        course_id = self.course_combo.currentData()
+        class_id = self.class_combo.currentData()
+        if not course_id or not class_id:
+            return
+        if keys is None:
+            self.load_grades()
+            return
+
+        student_ids = {student_id for student_id, key_course_id in keys if key_course_id == course_id}
+        rows = {}
+        for row in range(self.grade_table.rowCount()):
+            item = self.grade_table.item(row, 0)
+            if item and item.text() in student_ids:
+                rows.setdefault(item.text(), []).append(row)
+        if not rows:
+            return
+        if any(len(student_rows) > 1 for student_rows in rows.values()):
+            # 学生有多条考试记录时行数可能变化，重新加载
+            self.load_grades()
+            return
+
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.execute(f"""
+                           SELECT student_id, score
+                           FROM scores
+                           WHERE course_id = ?
+                             AND student_id IN ({", ".join("?" * len(rows))})
+                           """, [course_id] + list(rows))
+            scores = cursor.fetchall()
+            if len(scores) != len({student_id for student_id, _ in scores}):
+                self.load_grades()
+                return
+            scores = dict(scores)
+            for student_id, (row,) in rows.items():
+                score = scores.get(student_id)
+                self.grade_table.setItem(row, 2, QTableWidgetItem("" if score is None else str(score)))
+            self.update_stats(cursor, course_id, class_id)
+        except Exception as e:
+            self.logger.error(f"刷新成绩错误: {str(e)}")
+
+    def update_stats(self, cursor, course_id, class_id):
+        """计算并显示统计信息"""
+        cursor.execute("""
+                       SELECT AVG(score),
+                              MAX(score),
+                              MIN(score),
+                              COUNT(CASE WHEN score >= 60 THEN 1 END) * 100.0 / COUNT(*)
+                       FROM scores
+                       WHERE course_id = ?
+                         AND student_id IN (SELECT student_id
+                                            FROM students
+                                            WHERE class_id = ?)
+                       """, (course_id, class_id))
+        stats = cursor.fetchone()
+
+        avg, max_, min_, pass_rate = stats
+        if avg is None:
+            self.stats_label.setText("统计信息: 暂无成绩")
+            return
+        stats_text = (
+            f"统计信息: 平均分 {avg:.1f} | "
+            f"最高分 {max_ or '无'} | "
+            f"最低分 {min_ or '无'} | "
+            f"及格率 {pass_rate or 0:.1f}%"
+        )
+        self.stats_label.setText(stats_text)
+
     def add_grades(self):
         """批量录入成绩"""
         course_id = self.course_combo.currentData()
@@ -244,17 +291,6 @@ class GradeManagementWindow(QWidget):
 
         QMessageBox.information(self, "提示", "批量录入成绩功能开发中")
 
-    def edit_grade(self, row):
-        """编辑单个成绩"""
-        student_id = self.grade_table.item(row, 0).text()
-        student_name = self.grade_table.item(row, 1).text()
-        current_score = self.grade_table.item(row, 2).text()
-
-        QMessageBox.information(
-            self, "提示",
-            f"编辑 {student_name}({student_id}) 的成绩\n当前成绩: {current_score}\n功能开发中"
-        )
-
     def edit_grades(self):
         """编辑成绩"""
         QMessageBox.information(self, "提示", "编辑成绩功能开发中")
@@ -1,17 +1,29 @@
 from PyQt5.QtWidgets import (
     QMainWindow, QTabWidget, QWidget, QVBoxLayout,
     QLabel, QStatusBar, QMenuBar, QMenu, QAction,
-    QMessageBox, QFrame, QHBoxLayout, QToolButton
+    QMessageBox, QFrame, QHBoxLayout, QToolButton, QShortcut, QFileDialog
 )
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 import logging
-from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
+from datetime import datetime
+from PyQt5.QtGui import QFont, QIcon, QPalette, QColor, QKeySequence
 
 
 class MainWindow(QMainWindow):
     """主窗口"""
     logout_requested = pyqtSignal()
 
+    # 各角色登录后预先创建的常用窗口
+    PREBUILD_WINDOWS = {
+        'admin': ('student', 'grade'),
+        'teacher': ('classroom', 'grade', 'assignment'),
+    }
+    PREBUILD_DELAY_MS = 1500
+    PREBUILD_INTERVAL_MS = 300
+
+    # 登录后多久检查自动备份（毫秒），避开启动和预先创建窗口
+    AUTO_BACKUP_DELAY_MS = 30000
+
     def __init__(self, db_conn, user_id, user_role):
         super().__init__()
         self.db_conn = db_conn
@@ -28,6 +40,49 @@ class MainWindow(QMainWindow):
         self.init_ui()
         self.setup_for_role()
 
+        # 作业文件夹监控服务，随主窗口启动，供各窗口共享
+        from utils.file_monitor import AssignmentFolderService
+        self.folder_service = AssignmentFolderService(self.db_conn, parent=self)
+        self.folder_service.start()
+
+        # 数据库后台备份，登录后空闲时检查是否需要自动备份
+        from database.db_conn import get_database_path
+        from database.backup import BackupService
+        db_path = get_database_path(self.db_conn)
+        self.backup_service = BackupService(db_path, parent=self) if db_path else None
+        if self.backup_service is not None:
+            self.backup_service.backup_finished.connect(
+                lambda path: self.status_bar.showMessage(f"💾 数据库已备份到 {path}", 5000))
+            self.backup_service.backup_failed.connect(
+                lambda error: self.status_bar.showMessage(f"⚠️ 自动备份数据库失败: {error}", 10000))
+            QTimer.singleShot(self.AUTO_BACKUP_DELAY_MS, self.backup_service.start_auto_backup)
+
+        # 数据库例行维护，用户一段时间没有操作时在后台执行
+        from database.maintenance import MaintenanceScheduler
+        self.maintenance = MaintenanceScheduler(self.db_conn, db_path, parent=self) if db_path else None
+        if self.maintenance is not None:
+            self.maintenance.maintenance_finished.connect(self.on_maintenance_finished)
+            self.maintenance.maintenance_failed.connect(
+                lambda error: self.status_bar.showMessage(f"⚠️ 数据库维护失败: {error}", 10000))
+            self.maintenance.start()
+
+        # 全部数据导出，第一次导出时创建
+        self.data_export = None
+
+        # 界面响应监控浮层（开发者用），Ctrl+Shift+M 显示或隐藏
+        self.ui_overlay = None
+        QShortcut(QKeySequence("Ctrl+Shift+M"), self, activated=self.toggle_ui_monitor)
+        from utils.ui_monitor import get_ui_monitor
+        if get_ui_monitor().overlay_requested:
+            QTimer.singleShot(0, self.toggle_ui_monitor)
+
+        # 功能窗口注册表，登录后空闲时预先创建常用窗口
+        from gui.window_registry import WindowRegistry
+        self.windows = WindowRegistry(self.db_conn, parent=self)
+        self.register_windows()
+        self._prebuild_queue = list(self.PREBUILD_WINDOWS.get(user_role, ()))
+        QTimer.singleShot(self.PREBUILD_DELAY_MS, self.prebuild_windows)
+
     def get_role_display(self, role):
         """获取角色显示名称"""
         role_map = {
@@ -308,35 +363,87 @@ class MainWindow(QMainWindow):
             }
         """)
 
-    def show_student_management(self):
-        """显示学生管理界面"""
-        from gui.student_mgmt import StudentManagementWindow
+    def register_windows(self):
+        """注册功能窗口：窗口只创建一次，再次打开时只刷新有变化的数据"""
+
+        def student_window():
+            from gui.student_mgmt import StudentManagementWindow
+            return StudentManagementWindow(self.db_conn)
+
+        def grade_window():
+            from gui.grade_mgmt import GradeManagementWindow
+            return GradeManagementWindow(self.db_conn)
+
+        def assignment_window():
+            from gui.assignment_mgmt import AssignmentManagementWindow
+            return AssignmentManagementWindow(self.db_conn, self.folder_service)
+
+        def classroom_window():
+            from gui.classroom_mgmt import ClassroomManagementWindow
+            return ClassroomManagementWindow(self.db_conn)
+
+        def report_window():
+            from gui.report_gen import ReportGenerationWindow
+            return ReportGenerationWindow(self.db_conn)
+
+        def settings_window():
+            from gui.settings_window import SettingsWindow
+            return SettingsWindow(self.db_conn, self.backup_service)
+
+        self.windows.register('student', student_window, [
+            (('classes',), 'load_classes'),
+            (('students', 'classes'), 'load_students'),
+        ])
+        self.windows.register('grade', grade_window, [
+            (('courses',), 'load_courses'),
+            (('classes',), 'load_classes'),
+            (('students', 'scores'), 'load_grades'),
+        ])
+        self.windows.register('assignment', assignment_window, [
+            (('courses',), 'load_courses'),
+            (('assignment_folders', 'assignment_submissions', 'courses'), 'load_assignments'),
+        ])
+        self.windows.register('classroom', classroom_window, [
+            (('courses',), 'load_courses'),
+            (('classroom_activities', 'courses'), 'load_activities'),
+        ])
+        self.windows.register('report', report_window, [
+            (('courses',), 'load_courses'),
+            (('classes',), 'load_classes'),
+        ])
+        self.windows.register('settings', settings_window, [
+            (('users',), 'load_users'),
+            (('courses',), 'load_courses'),
+            (('classes',), 'load_classes'),
+        ])
+
+    def prebuild_windows(self):
+        """空闲时逐个预先创建常用窗口，每次只创建一个，避免长时间阻塞界面"""
+        if not self._prebuild_queue:
+            return
+        self.windows.prebuild(self._prebuild_queue.pop(0))
+        if self._prebuild_queue:
+            QTimer.singleShot(self.PREBUILD_INTERVAL_MS, self.prebuild_windows)
+
+    def open_window(self, name, title):
+        """打开功能窗口"""
         try:
-            self.student_window = StudentManagementWindow(self.db_conn)
-            self.student_window.show()
+            self.windows.show(name)
         except Exception as e:
-            self.logger.error(f"打开学生管理窗口错误: {str(e)}")
-            QMessageBox.critical(self, "错误", f"无法打开学生管理: {str(e)}")
+            self.logger.error(f"打开{title}窗口错误: {str(e)}")
+            QMessageBox.critical(self, "错误", f"无法打开{title}: {str(e)}")
+
+    def show_student_management(self):
+        """显示学生管理界面"""
+        self.open_window('student', "学生管理")
 
     def show_grade_management(self):
         """显示成绩管理界面"""
-        from gui.grade_mgmt import GradeManagementWindow
-        try:
-            self.grade_window = GradeManagementWindow(self.db_conn)
-            self.grade_window.show()
-        except Exception as e:
-            self.logger.error(f"打开成绩管理窗口错误: {str(e)}")
-            QMessageBox.critical(self, "错误", f"无法打开成绩管理: {str(e)}")
+        self.open_window('grade', "成绩管理")
 
     def show_assignment_management(self):
         """显示作业管理界面"""
-        from gui.assignment_mgmt import AssignmentManagementWindow
-        try:
-            self.assignment_window = AssignmentManagementWindow(self.db_conn)
-            self.assignment_window.show()
-        except Exception as e:
-            self.logger.error(f"打开作业管理窗口错误: {str(e)}")
-            QMessageBox.critical(self, "错误", f"无法打开作业管理: {str(e)}")
+        self.open_window('assignment', "作业管理")
 
     def show_statistics(self):
         """显示统计报表"""
@@ -344,9 +451,48 @@ class MainWindow(QMainWindow):
                                 QMessageBox.Ok, QMessageBox.Ok)
 
     def export_data(self):
-        """导出数据"""
-        QMessageBox.information(self, "提示", "💾 数据导出功能开发中...",
-                                QMessageBox.Ok, QMessageBox.Ok)
+        """在后台导出全部数据（各表和成绩报表）到一个 zip 文件"""
+        from database.db_conn import get_database_path
+        db_path = get_database_path(self.db_conn)
+        if not db_path:
+            QMessageBox.warning(self, "提示", "内存数据库不能导出")
+            return
+        if self.data_export is not None and self.data_export.running:
+            QMessageBox.information(self, "提示", "正在导出数据，请等待导出完成")
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出全部数据", f"数据导出-{datetime.now():%Y%m%d-%H%M%S}.zip", "Zip 文件 (*.zip)")
+        if not file_path:
+            return
+        if not file_path.lower().endswith('.zip'):
+            file_path += '.zip'
+
+        if self.data_export is None:
+            from utils.data_export import DataExportService
+            self.data_export = DataExportService(db_path, parent=self)
+            self.data_export.export_progress.connect(
+                lambda done, total: self.status_bar.showMessage(f"💾 正在导出数据: {done}/{total}"))
+            self.data_export.export_finished.connect(self.on_data_exported)
+            self.data_export.export_failed.connect(
+                lambda error: QMessageBox.critical(self, "错误", f"导出数据失败: {error}"))
+        self.status_bar.showMessage("💾 正在导出数据...")
+        self.data_export.export(file_path)
+
+    def on_data_exported(self, path, manifest):
+        rows = sum(entry['rows'] for entry in manifest['files'])
+        self.status_bar.showMessage(f"💾 已导出 {len(manifest['files'])} 个文件共 {rows} 行到 {path}", 10000)
+        self.logger.info(f"导出全部数据到 {path}")
+
+    def on_maintenance_finished(self, report):
+        from database.maintenance import needs_vacuum
+        message = f"🧹 数据库维护完成（{report['duration_ms'] / 1000:.1f} 秒）"
+        if needs_vacuum(report['stats_after']):
+            # VACUUM 期间其他客户端无法访问数据库，只提示，由用户选择时机手动执行
+            message += "，建议在无人使用时执行 python main.py maintenance --vacuum 整理数据库文件"
+            self.status_bar.showMessage(message, 30000)
+        else:
+            self.status_bar.showMessage(message, 5000)
 
     def logout(self):
         """退出登录"""
@@ -357,34 +503,35 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         """窗口关闭事件"""
         self.logger.info("主窗口关闭")
+        self.windows.close_all()
+        self.folder_service.stop()
+        if self.backup_service is not None:
+            self.backup_service.stop()
+        if self.maintenance is not None:
+            self.maintenance.stop()
+        if self.data_export is not None:
+            self.data_export.wait()
+        if self.ui_overlay is not None:
+            self.ui_overlay.close()
         event.accept()
 
+    def toggle_ui_monitor(self):
+        """显示或隐藏界面响应监控浮层"""
+        from utils.ui_monitor import get_ui_monitor, UiMonitorOverlay
+        if self.ui_overlay is None:
+            monitor = get_ui_monitor()
+            monitor.start()
+            self.ui_overlay = UiMonitorOverlay(monitor, self)
+        self.ui_overlay.setVisible(not self.ui_overlay.isVisible())
+
     def show_settings(self):
         """显示系统设置"""
-        from gui.settings_window import SettingsWindow
-        try:
-            self.settings_window = SettingsWindow(self.db_conn)
-            self.settings_window.show()
-        except Exception as e:
-            self.logger.error(f"打开系统设置错误: {str(e)}")
-            QMessageBox.critical(self, "错误", f"无法打开系统设置: {str(e)}")
+        self.open_window('settings', "系统设置")
 
     def show_reports(self):
         """显示报表生成"""
-        from gui.report_gen import ReportGenerationWindow
-        try:
-            self.report_window = ReportGenerationWindow(self.db_conn)
-            self.report_window.show()
-        except Exception as e:
-            self.logger.error(f"打开报表生成错误: {str(e)}")
-            QMessageBox.critical(self, "错误", f"无法打开报表生成: {str(e)}")
+        self.open_window('report', "报表生成")
 
     def show_classroom_management(self):
         """显示课堂管理界面"""
-        from gui.classroom_mgmt import ClassroomManagementWindow
-        try:
-            self.classroom_window = ClassroomManagementWindow(self.db_conn)
-            self.classroom_window.show()
-        except Exception as e:
-            self.logger.error(f"打开课堂管理窗口错误: {str(e)}")
-            QMessageBox.critical(self, "错误", f"无法打开课堂管理: {str(e)}")
\ No newline at end of file
+        self.open_window('classroom', "课堂管理")
@@ -0,0 +1,124 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QPushButton, QLabel, QComboBox, QHeaderView, QDialogButtonBox
+)
+
+KEEP_MINE = 0
+USE_THEIRS = 1
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+class ConflictMergeDialog(QDialog):
+    """合并与其他客户端冲突的修改
+
+    每个双方都修改过的字段一行，显示原值、我的修改和对方的修改，由用户选择保留哪一个；
+    只有一方修改的字段已自动合并。对方已删除的记录可以选择重新添加或放弃修改；
+    我删除而对方修改过的记录可以选择照常删除或保留对方的修改。
+    """
+
+    def __init__(self, conflicts, field_names, describe_key=None, parent=None):
+        super().__init__(parent)
+        self.conflicts = conflicts
+        self.field_names = field_names
+        self.describe_key = describe_key or (lambda key: " / ".join(str(k) for k in key))
+        self.choices = []  # (冲突下标, 字段下标或 None, 下拉框)
+
+        self.setWindowTitle("修改冲突")
+        self.resize(720, 360)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(
+            f"有 {len(self.conflicts)} 条记录在您编辑期间被其他人修改，请选择每处冲突保留的内容。"
+            "\n只有一方修改的内容已自动合并。"
+        ))
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["记录", "字段", "原值", "我的修改", "对方的修改", "采用"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        for index, conflict in enumerate(self.conflicts):
+            if conflict.mine is None:
+                self._add_row(index, None, "（全部）", "、".join(_text(v) for v in conflict.base or ()),
+                              "（删除）", "、".join(_text(v) for v in conflict.theirs), ("删除", "保留对方的修改"))
+                continue
+            if conflict.theirs is None:
+                self._add_row(index, None, "（全部）", "", "、".join(_text(v) for v in conflict.mine),
+                              "（已被删除）", ("重新添加", "放弃修改"))
+                continue
+            base = conflict.base or (None,) * len(conflict.mine)
+            for field in conflict.conflicting_fields():
+                self._add_row(index, field, self.field_names[field], _text(base[field]),
+                              _text(conflict.mine[field]), _text(conflict.theirs[field]),
+                              ("我的修改", "对方的修改"))
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        mine_btn = QPushButton("全部采用我的修改")
+        mine_btn.clicked.connect(lambda: self.set_all(KEEP_MINE))
+        theirs_btn = QPushButton("全部采用对方的修改")
+        theirs_btn.clicked.connect(lambda: self.set_all(USE_THEIRS))
+        btn_layout.addWidget(mine_btn)
+        btn_layout.addWidget(theirs_btn)
+        btn_layout.addStretch()
+        layout.addLayout(btn_layout)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def _add_row(self, index, field, field_name, base, mine, theirs, options):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        for col, text in enumerate((self.describe_key(self.conflicts[index].key), field_name, base, mine, theirs)):
+            self.table.setItem(row, col, QTableWidgetItem(text))
+        combo = QComboBox()
+        combo.addItems(options)
+        self.table.setCellWidget(row, 5, combo)
+        self.choices.append((index, field, combo))
+
+    def set_all(self, choice):
+        for _, _, combo in self.choices:
+            combo.setCurrentIndex(choice)
+
+    def get_resolutions(self):
+        """{主键: 最终写入的值}，值为 None 表示删除，放弃修改的记录不在结果中"""
+        merged = {}
+        for index, conflict in enumerate(self.conflicts):
+            if conflict.mine is None:
+                merged[index] = None
+                continue
+            if conflict.theirs is None:
+                merged[index] = list(conflict.mine)
+                continue
+            base = conflict.base or (None,) * len(conflict.mine)
+            merged[index] = [m if m != b else t for b, m, t in zip(base, conflict.mine, conflict.theirs)]
+
+        for index, field, combo in self.choices:
+            if field is None:
+                if combo.currentIndex() != KEEP_MINE:
+                    merged.pop(index, None)
+            elif combo.currentIndex() == USE_THEIRS:
+                merged[index][field] = self.conflicts[index].theirs[field]
+        return {self.conflicts[index].key: None if values is None else tuple(values)
+                for index, values in merged.items()}
+
+
+def conflict_resolver(parent, field_names, describe_key=None):
+    """生成 save_versioned 使用的 resolve 回调：弹出合并对话框，取消时放弃全部冲突的修改"""
+
+    def resolve(conflicts):
+        dialog = ConflictMergeDialog(conflicts, field_names, describe_key, parent)
+        if dialog.exec_() == QDialog.Accepted:
+            return dialog.get_resolutions()
+        return {}
+
+    return resolve
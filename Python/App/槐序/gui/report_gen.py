@@ -5,7 +5,9 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt
 import logging
-from utils.excel_utils import export_grades_to_excel
+from gui.widgets import refill_combo
+from utils.event_bus import get_change_bus
+from utils.report_builder import REPORT_HEADERS, build_course_report, report_statistics, format_statistics
 
 
 class ReportGenerationWindow(QWidget):
@@ -22,6 +24,11 @@ class ReportGenerationWindow(QWidget):
         self.load_courses()
         self.load_classes()
 
+        # 其他窗口增删课程或班级时刷新下拉框（保持当前选择）
+        bus = get_change_bus()
+        bus.subscribe(self, ('courses',), lambda table, keys: self.load_courses())
+        bus.subscribe(self, ('classes',), lambda table, keys: self.load_classes())
+
     def init_ui(self):
         layout = QVBoxLayout()
 
@@ -61,11 +68,8 @@ class ReportGenerationWindow(QWidget):
 
         # 报表表格
         self.report_table = QTableWidget()
-        self.report_table.setColumnCount(8)
-        self.report_table.setHorizontalHeaderLabels([
-            "学号", "姓名", "平时成绩", "期中成绩", "期末成绩",
-            "总成绩", "等级", "排名"
-        ])
+        self.report_table.setColumnCount(len(REPORT_HEADERS))
+        self.report_table.setHorizontalHeaderLabels(REPORT_HEADERS)
         self.report_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.report_table)
 
@@ -82,11 +86,7 @@ class ReportGenerationWindow(QWidget):
             cursor.execute("SELECT course_id, course_name FROM courses ORDER BY course_name")
             courses = cursor.fetchall()
 
-            self.course_combo.clear()
-            self.course_combo.addItem("所有课程", None)
-
-            for course_id, course_name in courses:
-                self.course_combo.addItem(course_name, course_id)
+            refill_combo(self.course_combo, "所有课程", courses)
         except Exception as e:
             self.logger.error(f"加载课程列表错误: {str(e)}")
 
@@ -97,11 +97,7 @@ class ReportGenerationWindow(QWidget):
             cursor.execute("SELECT class_id, class_name FROM classes ORDER BY class_name")
             classes = cursor.fetchall()
 
-            self.class_combo.clear()
-            self.class_combo.addItem("所有班级", None)
-
-            for class_id, class_name in classes:
-                self.class_combo.addItem(class_name, class_id)
+            refill_combo(self.class_combo, "所有班级", classes)
         except Exception as e:
             self.logger.error(f"加载班级列表错误: {str(e)}")
 
@@ -117,107 +113,16 @@ class ReportGenerationWindow(QWidget):
             return
 
         try:
-            cursor = self.db_conn.cursor()
-
-            # 获取学生成绩数据
-            query = """
-                    SELECT s.student_id, \
-                           s.name,
-                           MAX(CASE WHEN sc.exam_type = '平时' THEN sc.score END) as daily_score,
-                           MAX(CASE WHEN sc.exam_type = '期中' THEN sc.score END) as midterm_score,
-                           MAX(CASE WHEN sc.exam_type = '期末' THEN sc.score END) as final_score
-                    FROM students s
-                             LEFT JOIN scores sc ON s.student_id = sc.student_id
-                        AND sc.course_id = ? AND sc.term = ?
-                    WHERE s.class_id = ?
-                    GROUP BY s.student_id, s.name
-                    ORDER BY s.student_id \
-                    """
-
-            cursor.execute(query, (course_id, term, class_id))
-            students = cursor.fetchall()
-
-            # 计算总成绩和排名
-            student_scores = []
-            for student in students:
-                daily = student[2] or 0
-                midterm = student[3] or 0
-                final = student[4] or 0
-                classroom = student[5] or 0
-
-                # 计算总成绩 (权重: 平时20% + 期中30% + 期末40% + 课堂10%)
-                total_score = daily * 0.2 + midterm * 0.3 + final * 0.4 + classroom * 0.1
-
-                # 确定等级
-                if total_score >= 90:
-                    grade = "优秀"
-                elif total_score >= 80:
-                    grade = "良好"
-                elif total_score >= 70:
-                    grade = "中等"
-                elif total_score >= 60:
-                    grade = "及格"
-                else:
-                    grade = "不及格"
-
-                student_scores.append((*student, total_score, grade))
-
-            # 按总成绩排序确定排名
-            student_scores.sort(key=lambda x: x[5], reverse=True)
-            ranked_students = []
-            for i, student in enumerate(student_scores):
-                ranked_students.append((*student, i + 1))
-
-                # 在查询中添加课堂成绩
-                query = """
-                        SELECT s.student_id,
-                               s.name,
-                               MAX(CASE WHEN sc.exam_type = '平时' THEN sc.score END) as daily_score,
-                               MAX(CASE WHEN sc.exam_type = '期中' THEN sc.score END) as midterm_score,
-                               MAX(CASE WHEN sc.exam_type = '期末' THEN sc.score END) as final_score,
-                               COALESCE(SUM(cs.score), 0)                             as classroom_score -- 添加课堂成绩
-                        FROM students s
-                                 LEFT JOIN scores sc ON s.student_id = sc.student_id
-                            AND sc.course_id = ? AND sc.term = ?
-                                 LEFT JOIN classroom_scores cs ON s.student_id = cs.student_id
-                            AND cs.activity_id IN (SELECT activity_id \
-                                                   FROM classroom_activities \
-                                                   WHERE course_id = ? \
-                                                     AND term = ?)
-                        WHERE s.class_id = ?
-                        GROUP BY s.student_id, s.name
-                        ORDER BY s.student_id \
-                        """
-
-                cursor.execute(query, (course_id, term, course_id, term, class_id))
-                students = cursor.fetchall()
+            ranked_students = build_course_report(self.db_conn, course_id, class_id)
 
             # 显示报表
             self.report_table.setRowCount(len(ranked_students))
             for row, student in enumerate(ranked_students):
-                for col in range(8):  # 8列数据
-                    value = student[col] if col < 6 else student[col]
+                for col in range(len(REPORT_HEADERS)):
+                    value = student[col]
                     self.report_table.setItem(row, col, QTableWidgetItem(str(value or "")))
 
-            # 计算统计信息
-            total_scores = [s[5] for s in ranked_students if s[5] > 0]
-            if total_scores:
-                avg_score = sum(total_scores) / len(total_scores)
-                max_score = max(total_scores)
-                min_score = min(total_scores)
-                pass_count = sum(1 for s in total_scores if s >= 60)
-                pass_rate = (pass_count / len(total_scores)) * 100
-
-                stats_text = (
-                    f"统计信息: 平均分 {avg_score:.1f} | "
-                    f"最高分 {max_score:.1f} | "
-                    f"最低分 {min_score:.1f} | "
-                    f"及格率 {pass_rate:.1f}% | "
-                    f"学生总数 {len(ranked_students)}"
-                )
-                self.stats_label.setText(stats_text)
-            else:
-                self.stats_label.setText("暂无成绩数据")
+            self.stats_label.setText(format_statistics(report_statistics(ranked_students)))
 
         except Exception as e:
             self.logger.error(f"生成报表错误: {str(e)}")
@@ -250,7 +155,8 @@ class ReportGenerationWindow(QWidget):
                     row_data.append(item.text() if item else "")
                 data.append(row_data)
 
-            # 导出到Excel
+            # 导出到Excel（openpyxl 导入较慢，用到时再导入）
+            from utils.excel_utils import export_grades_to_excel
             filename = f"{course_name}_{class_name}_{term}_成绩报表.xlsx"
             export_grades_to_excel(headers, data, filename)
 
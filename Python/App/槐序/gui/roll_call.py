@@ -0,0 +1,291 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget,
+    QTableWidgetItem, QPushButton, QLabel, QMessageBox,
+    QHeaderView, QAbstractItemView
+)
+from PyQt5.QtCore import Qt, QDate, QEvent, QStandardPaths
+import os
+import glob
+import hashlib
+import logging
+from database.db_conn import get_database_path
+from database.roster_service import get_roster_service
+from database.write_behind import WriteBehindQueue
+from utils.event_bus import publish_change
+from utils.ui_monitor import timed
+
+ATTENDANCE_TYPE = "考勤"
+PARTICIPATION_TYPE = "回答问题"
+
+# 点名结果写入课堂评分（按绝对值 UPSERT，重放日志时结果不变）
+ROLL_CALL_SQL = """
+    INSERT INTO classroom_scores (activity_id, student_id, score, comment)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(activity_id, student_id) DO UPDATE SET score   = excluded.score,
+                                                       comment = excluded.comment
+    """
+
+
+# 正在使用的点名日志，同一场点名不能在两个窗口中同时进行
+_open_journals = set()
+
+
+def roll_call_journal_dir(db_conn):
+    """本机保存点名日志的目录
+
+    日志放在本机的应用数据目录中，按数据库路径分开，
+    共享数据库的其他客户端不会读到（也不会重放或清空）本机的日志。
+    """
+    db_path = get_database_path(db_conn)
+    base_dir = QStandardPaths.writableLocation(QStandardPaths.AppLocalDataLocation)
+    if not db_path or not base_dir:
+        return None
+    db_key = hashlib.sha1(os.path.abspath(db_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(base_dir, 'rollcall', db_key)
+
+
+def roll_call_journal_path(db_conn, activity_id):
+    """一场点名（按考勤活动区分）的日志文件路径"""
+    journal_dir = roll_call_journal_dir(db_conn)
+    if not journal_dir:
+        return None
+    os.makedirs(journal_dir, exist_ok=True)
+    return os.path.join(journal_dir, f"{activity_id}.journal")
+
+
+def recover_roll_call_journal(db_conn):
+    """程序启动时写入本机上次崩溃前未保存的点名记录"""
+    journal_dir = roll_call_journal_dir(db_conn)
+    if not journal_dir:
+        return
+    for journal_path in glob.glob(os.path.join(journal_dir, '*.journal')):
+        if journal_path not in _open_journals:
+            WriteBehindQueue(db_conn, ROLL_CALL_SQL, journal_path=journal_path).close()
+
+
+class RollCallDialog(QDialog):
+    """课堂快速点名
+
+    键盘操作: 空格/1 出勤并跳到下一位，0 缺勤并跳到下一位，
+    +/= 发言加一，- 发言减一，上下方向键切换学生。
+    每次按键只写入内存队列和日志文件，定时批量保存到数据库。
+    """
+
+    def __init__(self, db_conn, course_id, course_name, activity_date=None):
+        super().__init__()
+        self.db_conn = db_conn
+        self.course_id = course_id
+        self.logger = logging.getLogger(__name__)
+        self.activity_date = activity_date or QDate.currentDate().toString("yyyy-MM-dd")
+
+        self.students = []
+        self.attendance = {}  # 学号 -> 1 出勤 / 0 缺勤
+        self.participation = {}  # 学号 -> 发言次数
+        self.attendance_activity_id = None
+        self.participation_activity_id = None
+        self.journal_path = None
+        self.queue = None  # 活动加载成功后创建
+
+        self.setWindowTitle(f"课堂点名 - {course_name} ({self.activity_date})")
+        self.resize(600, 700)
+        self.init_ui()
+        self.load_roll_call()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+
+        layout.addWidget(QLabel("空格/1 出勤  0 缺勤  +/= 发言加一  - 发言减一  ↑↓ 切换学生"))
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(4)
+        self.table.setHorizontalHeaderLabels(["学号", "姓名", "出勤", "发言次数"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.installEventFilter(self)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        self.status_label = QLabel()
+
+        self.all_present_btn = QPushButton("其余全部出勤")
+        self.all_present_btn.clicked.connect(self.mark_rest_present)
+
+        close_btn = QPushButton("完成")
+        close_btn.clicked.connect(self.accept)
+
+        btn_layout.addWidget(self.status_label)
+        btn_layout.addStretch()
+        btn_layout.addWidget(self.all_present_btn)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+    def _get_or_create_activity(self, cursor, activity_type, max_score):
+        cursor.execute("""
+                       SELECT activity_id
+                       FROM classroom_activities
+                       WHERE course_id = ?
+                         AND activity_date = ?
+                         AND activity_type = ?
+                       ORDER BY activity_id
+                       LIMIT 1
+                       """, (self.course_id, self.activity_date, activity_type))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        cursor.execute("""
+                       INSERT INTO classroom_activities
+                           (course_id, activity_date, activity_type, max_score, description)
+                       VALUES (?, ?, ?, ?, '课堂点名')
+                       """, (self.course_id, self.activity_date, activity_type, max_score))
+        return cursor.lastrowid
+
+    def _open_queue(self):
+        """创建本场点名的写入队列，日志按考勤活动区分"""
+        journal_path = roll_call_journal_path(self.db_conn, self.attendance_activity_id)
+        if journal_path in _open_journals:
+            raise RuntimeError("该课程当天的点名已在其他窗口中进行")
+        self.queue = WriteBehindQueue(
+            self.db_conn, ROLL_CALL_SQL, interval_ms=5000, batch_size=100,
+            journal_path=journal_path, parent=self
+        )
+        if journal_path:
+            self.journal_path = journal_path
+            _open_journals.add(journal_path)
+        self.queue.flushed.connect(self.on_flushed)
+        self.queue.rejected.connect(self.on_rejected)
+        self.queue.flush_failed.connect(lambda error: self.status_label.setText(f"保存失败，稍后重试: {error}"))
+
+    @timed()
+    def load_roll_call(self):
+        """加载名单和当天已有的点名记录，失败时禁用点名操作"""
+        try:
+            cursor = self.db_conn.cursor()
+            before = self.db_conn.total_changes
+            attendance_activity_id = self._get_or_create_activity(cursor, ATTENDANCE_TYPE, 1)
+            participation_activity_id = self._get_or_create_activity(cursor, PARTICIPATION_TYPE, 0)
+            created = self.db_conn.total_changes != before
+            self.db_conn.commit()
+            self.attendance_activity_id = attendance_activity_id
+            self.participation_activity_id = participation_activity_id
+            if created:
+                publish_change('classroom_activities', [self.attendance_activity_id, self.participation_activity_id])
+            self._open_queue()
+
+            cursor.execute("""
+                           SELECT activity_id, student_id, score
+                           FROM classroom_scores
+                           WHERE activity_id IN (?, ?)
+                           """, (self.attendance_activity_id, self.participation_activity_id))
+            for activity_id, student_id, score in cursor.fetchall():
+                if activity_id == self.attendance_activity_id:
+                    self.attendance[student_id] = int(score or 0)
+                else:
+                    self.participation[student_id] = int(score or 0)
+
+            self.students = get_roster_service(self.db_conn).get_roster(self.course_id)
+        except Exception as e:
+            self.db_conn.rollback()
+            self.logger.error(f"加载点名信息错误: {str(e)}")
+            QMessageBox.critical(self, "错误", f"加载点名信息失败: {str(e)}")
+            self.table.setEnabled(False)
+            self.all_present_btn.setEnabled(False)
+            self.status_label.setText("点名信息加载失败")
+            return
+
+        self.table.setRowCount(len(self.students))
+        for row, (student_id, name) in enumerate(self.students):
+            self.table.setItem(row, 0, QTableWidgetItem(student_id))
+            self.table.setItem(row, 1, QTableWidgetItem(name))
+            self.update_row(row)
+        if self.students:
+            self.table.setCurrentCell(0, 0)
+        self.update_status()
+
+    def update_row(self, row):
+        student_id = self.students[row][0]
+        status = self.attendance.get(student_id)
+        status_item = QTableWidgetItem({1: "✔ 出勤", 0: "✘ 缺勤"}.get(status, ""))
+        if status == 0:
+            status_item.setForeground(Qt.red)
+        self.table.setItem(row, 2, status_item)
+        self.table.setItem(row, 3, QTableWidgetItem(str(self.participation.get(student_id, 0))))
+
+    def on_flushed(self, count):
+        """点名记录写入数据库后通知其他窗口"""
+        if count:
+            publish_change('classroom_scores')
+        self.update_status()
+
+    def on_rejected(self, records):
+        """点名记录违反约束未能保存（如课堂活动已被删除），告诉用户是哪些学生"""
+        names = dict(self.students)
+        students = "、".join(f"{key[1]} {names.get(key[1], '')}" for key, _, _ in records)
+        QMessageBox.warning(self, "提示", f"以下 {len(records)} 条点名记录未能保存（课堂活动可能已被删除）:\n{students}")
+        self.update_status()
+
+    def update_status(self):
+        if self.queue is None:
+            return
+        marked = len([s for s, _ in self.students if s in self.attendance])
+        self.status_label.setText(
+            f"已点名 {marked} / {len(self.students)} | 待保存 {self.queue.pending_count()} 条"
+        )
+
+    def set_attendance(self, row, present):
+        student_id = self.students[row][0]
+        self.attendance[student_id] = 1 if present else 0
+        self.queue.put(
+            (self.attendance_activity_id, student_id),
+            (self.attendance_activity_id, student_id, self.attendance[student_id], "出勤" if present else "缺勤")
+        )
+        self.update_row(row)
+
+    def add_participation(self, row, delta):
+        student_id = self.students[row][0]
+        count = max(0, self.participation.get(student_id, 0) + delta)
+        self.participation[student_id] = count
+        self.queue.put(
+            (self.participation_activity_id, student_id),
+            (self.participation_activity_id, student_id, count, f"发言 {count} 次")
+        )
+        self.update_row(row)
+
+    def mark_rest_present(self):
+        """尚未点名的学生全部记为出勤"""
+        for row, (student_id, _) in enumerate(self.students):
+            if student_id not in self.attendance:
+                self.set_attendance(row, True)
+        self.update_status()
+
+    def eventFilter(self, obj, event):
+        if obj is self.table and event.type() == QEvent.KeyPress:
+            row = self.table.currentRow()
+            if row < 0 or self.queue is None:
+                return False
+            key = event.key()
+            if key in (Qt.Key_Space, Qt.Key_1, Qt.Key_0):
+                self.set_attendance(row, key != Qt.Key_0)
+                if row + 1 < self.table.rowCount():
+                    self.table.setCurrentCell(row + 1, 0)
+            elif key in (Qt.Key_Plus, Qt.Key_Equal):
+                self.add_participation(row, 1)
+            elif key == Qt.Key_Minus:
+                self.add_participation(row, -1)
+            else:
+                return False
+            self.update_status()
+            return True
+        return super().eventFilter(obj, event)
+
+    def done(self, result):
+        """关闭时写入剩余的点名记录"""
+        if self.queue is not None:
+            self.queue.close()
+            if self.queue.pending_count():
+                QMessageBox.warning(self, "提示", "部分点名记录暂未保存到数据库，已保留在日志中，下次启动时自动写入")
+        _open_journals.discard(self.journal_path)
+        super().done(result)
@@ -5,15 +5,21 @@ from PyQt5.QtWidgets import (
     QInputDialog, QHeaderView
 )
 from PyQt5.QtCore import Qt
+import os
 import logging
+from database.backup import restore_backup
+from gui.delegates import set_action_column
+from utils.event_bus import get_change_bus, publish_change
+from utils.ui_monitor import timed
 
 
 class SettingsWindow(QWidget):
     """系统设置窗口"""
 
-    def __init__(self, db_conn):
+    def __init__(self, db_conn, backup_service=None):
         super().__init__()
         self.db_conn = db_conn
+        self.backup_service = backup_service
         self.logger = logging.getLogger(__name__)
 
         self.setWindowTitle("系统设置")
@@ -22,6 +28,12 @@ class SettingsWindow(QWidget):
         self.load_users()
         self.load_courses()
 
+        # 其他窗口修改用户、课程或班级时刷新对应的表格
+        bus = get_change_bus()
+        bus.subscribe(self, ('users',), lambda table, keys: self.load_users())
+        bus.subscribe(self, ('courses',), lambda table, keys: self.load_courses())
+        bus.subscribe(self, ('classes',), lambda table, keys: self.load_classes())
+
     def init_ui(self):
         layout = QVBoxLayout()
 
@@ -50,6 +62,17 @@ class SettingsWindow(QWidget):
         self.tab_widget.addTab(course_tab, "课程管理")
         self.tab_widget.addTab(class_tab, "班级管理")
 
+        # 数据备份选项卡（数据库文件备份服务可用时）
+        if self.backup_service is not None:
+            backup_tab = QWidget()
+            backup_layout = QVBoxLayout()
+            self.setup_backup_tab(backup_layout)
+            backup_tab.setLayout(backup_layout)
+            self.tab_widget.addTab(backup_tab, "数据备份")
+            self.tab_widget.currentChanged.connect(
+                lambda index: self.load_backups() if self.tab_widget.widget(index) is backup_tab else None
+            )
+
         layout.addWidget(self.tab_widget)
         self.setLayout(layout)
 
@@ -60,6 +83,9 @@ class SettingsWindow(QWidget):
         self.user_table.setColumnCount(5)
         self.user_table.setHorizontalHeaderLabels(["ID", "用户名", "角色", "真实姓名", "操作"])
         self.user_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # 不能删除管理员
+        set_action_column(self.user_table, 4, "删除", lambda row: self.delete_user(self._row_id(self.user_table, row)),
+                          visible=lambda row: self.user_table.item(row, 2).text() != 'admin')
 
         # 操作按钮
         btn_layout = QHBoxLayout()
@@ -83,6 +109,8 @@ class SettingsWindow(QWidget):
         self.course_table.setColumnCount(5)
         self.course_table.setHorizontalHeaderLabels(["ID", "课程名称", "学分", "类型", "操作"])
         self.course_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        set_action_column(self.course_table, 4, "编辑",
+                          lambda row: self.edit_course(self._row_id(self.course_table, row)))
 
         # 操作按钮
         btn_layout = QHBoxLayout()
@@ -102,6 +130,8 @@ class SettingsWindow(QWidget):
         self.class_table.setColumnCount(5)
         self.class_table.setHorizontalHeaderLabels(["ID", "班级名称", "年级", "专业", "操作"])
         self.class_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        set_action_column(self.class_table, 4, "编辑",
+                          lambda row: self.edit_class(self._row_id(self.class_table, row)))
 
         # 操作按钮
         btn_layout = QHBoxLayout()
@@ -114,6 +144,105 @@ class SettingsWindow(QWidget):
         layout.addWidget(self.class_table)
         layout.addLayout(btn_layout)
 
+    def setup_backup_tab(self, layout):
+        """设置数据备份选项卡"""
+        self.backup_label = QLabel(f"备份目录: {self.backup_service.backup_dir}")
+        layout.addWidget(self.backup_label)
+
+        self.backup_table = QTableWidget()
+        self.backup_table.setColumnCount(3)
+        self.backup_table.setHorizontalHeaderLabels(["备份时间", "大小", "文件"])
+        self.backup_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.backup_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.backup_table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        btn_layout = QHBoxLayout()
+        self.backup_btn = QPushButton("立即备份")
+        self.backup_btn.clicked.connect(self.backup_now)
+        restore_btn = QPushButton("恢复所选备份")
+        restore_btn.clicked.connect(self.restore_selected_backup)
+        btn_layout.addWidget(self.backup_btn)
+        btn_layout.addWidget(restore_btn)
+
+        layout.addWidget(self.backup_table)
+        layout.addLayout(btn_layout)
+
+        self.backup_service.backup_started.connect(lambda: self.backup_btn.setEnabled(False))
+        self.backup_service.backup_progress.connect(self.on_backup_progress)
+        self.backup_service.backup_finished.connect(self.on_backup_finished)
+        self.backup_service.backup_failed.connect(self.on_backup_failed)
+
+    @timed()
+    def load_backups(self):
+        """加载备份列表"""
+        try:
+            backups = self.backup_service.list_backups()
+            self.backup_table.setRowCount(len(backups))
+            for row, (path, when, size) in enumerate(backups):
+                self.backup_table.setItem(row, 0, QTableWidgetItem(when.strftime("%Y-%m-%d %H:%M:%S")))
+                self.backup_table.setItem(row, 1, QTableWidgetItem(f"{size / 1024:.0f} KB"))
+                item = QTableWidgetItem(os.path.basename(path))
+                item.setData(Qt.UserRole, path)
+                self.backup_table.setItem(row, 2, item)
+        except Exception as e:
+            self.logger.error(f"加载备份列表错误: {str(e)}")
+            QMessageBox.critical(self, "错误", f"加载备份列表失败: {str(e)}")
+
+    def backup_now(self):
+        """在后台备份数据库"""
+        self.backup_service.backup_now()
+
+    def on_backup_progress(self, remaining, total):
+        if total:
+            self.backup_label.setText(f"正在备份: {(total - remaining) * 100 // total}%")
+
+    def on_backup_finished(self, path):
+        self.backup_btn.setEnabled(True)
+        self.backup_label.setText(f"已备份到 {path}")
+        self.load_backups()
+
+    def on_backup_failed(self, error):
+        self.backup_btn.setEnabled(True)
+        self.backup_label.setText(f"备份目录: {self.backup_service.backup_dir}")
+        QMessageBox.critical(self, "错误", f"备份数据库失败: {error}")
+
+    def restore_selected_backup(self):
+        """用选中的备份恢复数据库"""
+        row = self.backup_table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "警告", "请先选择要恢复的备份")
+            return
+        path = self.backup_table.item(row, 2).data(Qt.UserRole)
+        reply = QMessageBox.question(
+            self, "确认恢复",
+            f"确定要用备份 {os.path.basename(path)} 恢复数据库吗？\n"
+            "当前数据会先自动备份；其他正在使用该数据库的客户端需要重新打开窗口。",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        try:
+            self.backup_service.wait()
+            safety = restore_backup(path, self.backup_service.db_path)
+            # 所有数据表都可能变化，通知各窗口和缓存重新加载
+            cursor = self.db_conn.cursor()
+            cursor.execute("SELECT table_name FROM table_versions")
+            for (table_name,) in cursor.fetchall():
+                publish_change(table_name)
+            self.load_backups()
+            self.logger.info(f"从备份恢复数据库: {path}")
+            QMessageBox.information(self, "成功", f"数据库已恢复\n恢复前的数据已备份到 {safety}")
+        except Exception as e:
+            self.logger.error(f"恢复数据库错误: {str(e)}")
+            QMessageBox.critical(self, "错误", f"恢复数据库失败: {str(e)}")
+
+    @staticmethod
+    def _row_id(table, row):
+        """表格第一列的 ID"""
+        return int(table.item(row, 0).text())
+
+    @timed()
     def load_users(self):
         """加载用户列表"""
         try:
@@ -125,15 +254,10 @@ class SettingsWindow(QWidget):
             for row, user in enumerate(users):
                 for col in range(4):
                     self.user_table.setItem(row, col, QTableWidgetItem(str(user[col])))
-
-                # 操作按钮
-                if user[2] != 'admin':  # 不能删除管理员
-                    delete_btn = QPushButton("删除")
-                    delete_btn.clicked.connect(lambda _, uid=user[0]: self.delete_user(uid))
-                    self.user_table.setCellWidget(row, 4, delete_btn)
         except Exception as e:
             self.logger.error(f"加载用户列表错误: {str(e)}")
 
+    @timed()
     def load_courses(self):
         """加载课程列表"""
         try:
@@ -145,14 +269,10 @@ class SettingsWindow(QWidget):
             for row, course in enumerate(courses):
                 for col in range(4):
                     self.course_table.setItem(row, col, QTableWidgetItem(str(course[col])))
-
-                # 操作按钮
-                edit_btn = QPushButton("编辑")
-                edit_btn.clicked.connect(lambda _, cid=course[0]: self.edit_course(cid))
-                self.course_table.setCellWidget(row, 4, edit_btn)
         except Exception as e:
             self.logger.error(f"加载课程列表错误: {str(e)}")
 
+    @timed()
     def load_classes(self):
         """加载班级列表"""
         try:
@@ -164,11 +284,6 @@ class SettingsWindow(QWidget):
             for row, class_ in enumerate(classes):
                 for col in range(4):
                     self.class_table.setItem(row, col, QTableWidgetItem(str(class_[col])))
-
-                # 操作按钮
-                edit_btn = QPushButton("编辑")
-                edit_btn.clicked.connect(lambda _, cid=class_[0]: self.edit_class(cid))
-                self.class_table.setCellWidget(row, 4, edit_btn)
         except Exception as e:
             self.logger.error(f"加载班级列表错误: {str(e)}")
 
@@ -198,6 +313,7 @@ class SettingsWindow(QWidget):
                            VALUES (?, ?, ?, ?)
                            """, (username, password, role, real_name))
             self.db_conn.commit()
+            publish_change('users', cursor.lastrowid, source=self)
             self.load_users()
             self.logger.info(f"添加用户: {username}")
         except Exception as e:
@@ -217,6 +333,7 @@ class SettingsWindow(QWidget):
                 cursor = self.db_conn.cursor()
                 cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
                 self.db_conn.commit()
+                publish_change('users', user_id, source=self)
                 self.load_users()
                 self.logger.info(f"删除用户: {user_id}")
             except Exception as e:
@@ -245,6 +362,7 @@ class SettingsWindow(QWidget):
                     (new_password, user_id)
                 )
                 self.db_conn.commit()
+                publish_change('users', int(user_id), source=self)
                 QMessageBox.information(self, "成功", "密码重置成功")
                 self.logger.info(f"重置用户密码: {username}")
             except Exception as e:
@@ -273,6 +391,7 @@ class SettingsWindow(QWidget):
                            VALUES (?, ?, ?)
                            """, (name, credit, course_type))
             self.db_conn.commit()
+            publish_change('courses', cursor.lastrowid, source=self)
             self.load_courses()
             self.logger.info(f"添加课程: {name}")
         except Exception as e:
@@ -304,6 +423,7 @@ class SettingsWindow(QWidget):
                            VALUES (?, ?, ?)
                            """, (name, grade, major))
             self.db_conn.commit()
+            publish_change('classes', cursor.lastrowid, source=self)
             self.load_classes()
             self.logger.info(f"添加班级: {name}")
         except Exception as e:
@@ -2,13 +2,19 @@ from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTableWidget,
     QTableWidgetItem, QPushButton, QLineEdit, QComboBox,
     QLabel, QMessageBox, QHeaderView, QInputDialog, QDialog,
-    QFormLayout, QDialogButtonBox, QGridLayout
+    QFormLayout, QDialogButtonBox, QGridLayout, QCheckBox, QRadioButton,
+    QProgressDialog
 )
 from PyQt5.QtCore import Qt
-from openpyxl import load_workbook
 from PyQt5.QtWidgets import QFileDialog
 from PyQt5.QtGui import QIcon
 import logging
+from database.importers import read_table_rows, parse_student_rows, import_students
+from database.search_index import sync_search_index, student_search_filter
+from database.db_conn import get_database_path
+from utils.student_export import EXPORT_COLUMNS, StudentExporter
+from utils.event_bus import get_change_bus, publish_change
+from utils.ui_monitor import timed
 
 
 class ClassManagementDialog(QDialog):
@@ -83,6 +89,7 @@ class ClassManagementDialog(QDialog):
             cursor = self.db_conn.cursor()
             cursor.execute("INSERT INTO classes (class_name) VALUES (?)", (class_name,))
             self.db_conn.commit()
+            publish_change('classes', cursor.lastrowid)
             self.class_name_input.clear()
             self.load_classes()
             self.logger.info("添加班级: %s", class_name)
@@ -127,6 +134,7 @@ class ClassManagementDialog(QDialog):
                 cursor = self.db_conn.cursor()
                 cursor.execute("DELETE FROM classes WHERE class_id = ?", (class_id,))
                 self.db_conn.commit()
+                publish_change('classes', int(class_id))
                 self.load_classes()
                 self.logger.info("删除班级: %s", class_name)
                 QMessageBox.information(self, "成功", f"班级 '{class_name}' 删除成功")
@@ -215,6 +223,42 @@ class StudentEditDialog(QDialog):
         }
 
 
+class ExportStudentsDialog(QDialog):
+    """导出学生选项：导出范围和附加列"""
+
+    def __init__(self, filtered_count, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("导出学生")
+        self.setWindowIcon(QIcon('img/icon.png'))
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("导出范围:"))
+        self.filtered_radio = QRadioButton(f"当前筛选结果（{filtered_count} 名学生）")
+        self.filtered_radio.setChecked(True)
+        self.all_radio = QRadioButton("全校学生")
+        layout.addWidget(self.filtered_radio)
+        layout.addWidget(self.all_radio)
+
+        layout.addWidget(QLabel("导出列（学号、姓名、性别之外）:"))
+        self.column_checks = {}
+        for key, (title, _, _) in EXPORT_COLUMNS.items():
+            check = QCheckBox(title)
+            check.setChecked(key == 'class')
+            self.column_checks[key] = check
+            layout.addWidget(check)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def get_options(self):
+        """(是否只导出筛选结果, 选中的列组)"""
+        columns = [key for key, check in self.column_checks.items() if check.isChecked()]
+        return self.filtered_radio.isChecked(), columns
+
+
 class StudentManagementWindow(QWidget):
     """学生管理窗口（简化版）"""
 
@@ -226,9 +270,16 @@ class StudentManagementWindow(QWidget):
         self.setWindowTitle("学生管理")
         self.setWindowIcon(QIcon('img/icon.png'))
         self.resize(800, 600)
+        self.exporter = None
+        self.export_progress = None
         self.init_ui()
         self.load_students()
 
+        # 其他窗口修改班级或学生时只刷新受影响的下拉框和行
+        bus = get_change_bus()
+        bus.subscribe(self, ('classes',), lambda table, keys: self.load_classes())
+        bus.subscribe(self, ('students',), lambda table, keys: self.refresh_student_rows(keys))
+
     def init_ui(self):
         """初始化界面"""
         layout = QVBoxLayout()
@@ -237,7 +288,7 @@ class StudentManagementWindow(QWidget):
         search_layout = QHBoxLayout()
 
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("搜索学生姓名或学号...")
+        self.search_input.setPlaceholderText("搜索学生姓名、拼音（如 zhangs、zs）或学号...")
         self.search_input.textChanged.connect(self.load_students)
 
         self.class_filter = QComboBox()
@@ -336,34 +387,44 @@ class StudentManagementWindow(QWidget):
             self.logger.error("加载班级列表错误: %s", str(e))
             QMessageBox.critical(self, "错误", f"加载班级列表失败: {str(e)}")
 
+    def _student_filter(self):
+        """当前搜索框和班级筛选对应的条件 (SQL 片段, 参数)，表别名 s"""
+        conditions = ["1 = 1"]
+        params = []
+
+        search_text = self.search_input.text().strip()
+        search = student_search_filter(search_text) if search_text else None
+        if search:
+            # 先为其他客户端新增或改名的学生生成检索键
+            if sync_search_index(self.db_conn):
+                self.db_conn.commit()
+            conditions.append(search[0])
+            params.extend(search[1])
+
+        class_id = self.class_filter.currentData()
+        if class_id:
+            conditions.append("s.class_id = ?")
+            params.append(class_id)
+
+        return " AND ".join(conditions), params
+
+    @timed()
     def load_students(self):
         """加载学生列表"""
         if not self._check_db_connection():
             return
 
-        search_text = self.search_input.text().strip()
-        class_id = self.class_filter.currentData()
-
         try:
             cursor = self.db_conn.cursor()
+            where, params = self._student_filter()
 
-            query = """
+            query = f"""
                     SELECT s.student_id, s.name, c.class_name
                     FROM students s
                              LEFT JOIN classes c ON s.class_id = c.class_id
-                    WHERE 1 = 1 \
+                    WHERE {where}
+                    ORDER BY s.student_id
                     """
-            params = []
-
-            if search_text:
-                query += " AND (s.name LIKE ? OR s.student_id LIKE ?)"
-                params.extend([f"%{search_text}%", f"%{search_text}%"])
-
-            if class_id:
-                query += " AND s.class_id = ?"
-                params.append(class_id)
-
-            query += " ORDER BY s.student_id"
 
             cursor.execute(query, params)
             students = cursor.fetchall()
@@ -378,14 +439,54 @@ class StudentManagementWindow(QWidget):
             self.logger.error("加载学生列表错误: %s", str(e))
             QMessageBox.critical(self, "错误", f"加载学生列表失败: {str(e)}")
 
+    def refresh_student_rows(self, student_ids):
+        """只刷新指定学号所在的行（新增的学生追加到表格末尾），None 时重新加载整个列表"""
+        if student_ids is None:
+            self.load_students()
+            return
+
+        student_ids = list(student_ids)
+
+        try:
+            cursor = self.db_conn.cursor()
+            where, params = self._student_filter()
+            query = f"""
+                    SELECT s.student_id, s.name, c.class_name
+                    FROM students s
+                             LEFT JOIN classes c ON s.class_id = c.class_id
+                    WHERE s.student_id IN ({", ".join("?" * len(student_ids))}) AND {where}
+                    """
+            cursor.execute(query, list(student_ids) + params)
+            students = {row[0]: row for row in cursor.fetchall()}
+        except Exception as e:
+            self.logger.error("刷新学生列表错误: %s", str(e))
+            return
+
+        # 不再符合条件（已删除或调出班级）的行从下往上删除
+        for row in reversed(range(self.student_table.rowCount())):
+            item = self.student_table.item(row, 0)
+            if item and item.text() in student_ids and item.text() not in students:
+                self.student_table.removeRow(row)
+
+        rows = {}
+        for row in range(self.student_table.rowCount()):
+            item = self.student_table.item(row, 0)
+            if item and item.text() in students:
+                rows[item.text()] = row
+
+        for student_id, student in students.items():
+            row = rows.get(student_id)
+            if row is None:
+                row = self.student_table.rowCount()
+                self.student_table.insertRow(row)
+            for col in range(3):
+                value = str(student[col]) if student[col] is not None else ""
+                self.student_table.setItem(row, col, QTableWidgetItem(value))
+
     def manage_classes(self):
-        """班级管理"""
+        """班级管理（班级变更通过数据变更通知刷新下拉框）"""
         dialog = ClassManagementDialog(self.db_conn)
         dialog.exec_()
-        # 刷新班级列表
-        self.load_classes()
-        # 刷新学生列表
-        self.load_students()
 
     def add_student(self):
         """添加学生"""
@@ -407,7 +508,9 @@ class StudentManagementWindow(QWidget):
                                INSERT INTO students (student_id, name, class_id)
                                VALUES (?, ?, ?)
                                """, (data['student_id'], data['name'], data['class_id']))
+                sync_search_index(self.db_conn)
                 self.db_conn.commit()
+                publish_change('students', data['student_id'], source=self)
                 self.load_students()
                 self.logger.info("添加学生: %s", data['student_id'])
                 QMessageBox.information(self, "成功", f"学生 {data['name']} 添加成功")
@@ -450,8 +553,10 @@ class StudentManagementWindow(QWidget):
                                        class_id = ?
                                    WHERE student_id = ?
                                    """, (new_data['name'], new_data['class_id'], student_id))
+                    sync_search_index(self.db_conn)
                     self.db_conn.commit()
-                    self.load_students()
+                    publish_change('students', student_id, source=self)
+                    self.refresh_student_rows([student_id])
                     self.logger.info("更新学生: %s", student_id)
                     QMessageBox.information(self, "成功", f"学生信息更新成功")
 
@@ -480,7 +585,8 @@ class StudentManagementWindow(QWidget):
                 cursor = self.db_conn.cursor()
                 cursor.execute("DELETE FROM students WHERE student_id = ?", (student_id,))
                 self.db_conn.commit()
-                self.load_students()
+                publish_change('students', student_id, source=self)
+                self.refresh_student_rows([student_id])
                 self.logger.info("删除学生: %s", student_id)
                 QMessageBox.information(self, "成功", f"学生 {student_name} 删除成功")
             except Exception as e:
@@ -493,21 +599,15 @@ class StudentManagementWindow(QWidget):
             self,
             "选择Excel文件",
             "",
-            "Excel文件 (*.xlsx *.xls)"
+            "Excel文件 (*.xlsx);;CSV文件 (*.csv)"
         )
 
         if not file_path:
             return  # 用户取消了选择
 
         try:
-            # 加载Excel文件
-            wb = load_workbook(filename=file_path)
-            sheet = wb.active
-
-            students = []
-            for row in sheet.iter_rows(min_row=2, values_only=True):  # 跳过标题行
-                if row and row[0] and row[1]:  # 确保学号和姓名不为空
-                    students.append((str(row[0]).strip(), str(row[1]).strip()))
+            # 加载Excel文件（跳过标题行）
+            students = parse_student_rows(read_table_rows(file_path))
 
             if not students:
                 QMessageBox.warning(self, "提示", "Excel中没有找到有效学生数据")
@@ -572,35 +672,18 @@ class StudentManagementWindow(QWidget):
 
     def _save_imported_students(self, students, class_id):
         """将导入的学生保存到数据库"""
-        cursor = self.db_conn.cursor()
-        success_count = 0
-        duplicate_count = 0
-
         try:
-            for student_id, name in students:
-                # 检查学号是否已存在
-                cursor.execute("SELECT 1 FROM students WHERE student_id = ?", (student_id,))
-                if cursor.fetchone():
-                    duplicate_count += 1
-                    self.logger.warning("学号已存在，跳过: %s", student_id)
-                    continue
-
-                # 插入新学生
-                cursor.execute("""
-                               INSERT INTO students (student_id, name, class_id)
-                               VALUES (?, ?, ?)
-                               """, (student_id, name, class_id))
-                success_count += 1
-
+            imported_ids, duplicate_ids = import_students(self.db_conn, students, class_id)
             self.db_conn.commit()
+            publish_change('students', imported_ids, source=self)
             self.load_students()  # 刷新表格
 
-            message = f"成功导入 {success_count} 名学生"
-            if duplicate_count > 0:
-                message += f"\n跳过 {duplicate_count} 名已存在的学生"
+            message = f"成功导入 {len(imported_ids)} 名学生"
+            if duplicate_ids:
+                message += f"\n跳过 {len(duplicate_ids)} 名已存在的学生"
 
             QMessageBox.information(self, "导入完成", message)
-            self.logger.info("从Excel导入 %d 名学生", success_count)
+            self.logger.info("从Excel导入 %d 名学生", len(imported_ids))
 
         except Exception as e:
             self.db_conn.rollback()
@@ -608,5 +691,82 @@ class StudentManagementWindow(QWidget):
             self.logger.error("保存导入学生错误: %s", str(e))
 
     def export_students(self):
-        """导出学生数据"""
-        QMessageBox.information(self, "提示", "导出学生功能开发中")
\ No newline at end of file
+        """导出当前筛选结果或全校学生到 Excel 或 CSV（在后台线程中导出）"""
+        if not self._check_db_connection():
+            return
+        if self.exporter is not None and self.exporter.running:
+            QMessageBox.warning(self, "提示", "正在导出学生，请等待导出完成")
+            return
+        db_path = get_database_path(self.db_conn)
+        if not db_path:
+            QMessageBox.warning(self, "提示", "内存数据库不能导出")
+            return
+
+        dialog = ExportStudentsDialog(self.student_table.rowCount(), self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        filtered, columns = dialog.get_options()
+
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "导出学生",
+            "学生名单.xlsx",
+            "Excel文件 (*.xlsx);;CSV文件 (*.csv)"
+        )
+        if not file_path:
+            return  # 用户取消了选择
+        if not file_path.lower().endswith(('.xlsx', '.csv')):
+            file_path += '.csv' if selected_filter.startswith("CSV") else '.xlsx'
+
+        try:
+            # 工作线程使用单独的连接，先提交检索键，筛选条件才能在其中生效
+            where, params = self._student_filter() if filtered else (None, [])
+            self.db_conn.commit()
+        except Exception as e:
+            self.logger.error("导出学生错误: %s", str(e))
+            QMessageBox.critical(self, "错误", f"导出学生失败: {str(e)}")
+            return
+
+        if self.exporter is None:
+            self.exporter = StudentExporter(db_path, self)
+            self.exporter.export_progress.connect(self.on_export_progress)
+            self.exporter.export_finished.connect(self.on_export_finished)
+            self.exporter.export_failed.connect(self.on_export_failed)
+            self.exporter.export_cancelled.connect(self.on_export_cancelled)
+
+        self.export_progress = QProgressDialog("正在导出学生...", "取消", 0, 0, self)
+        self.export_progress.setWindowTitle("导出学生")
+        self.export_progress.setMinimumDuration(300)
+        self.export_progress.canceled.connect(self.exporter.cancel)
+        self.exporter.start(file_path, columns, where, params)
+
+    def on_export_progress(self, exported, total):
+        if self.export_progress is not None:
+            self.export_progress.setMaximum(total)
+            self.export_progress.setValue(exported)
+            self.export_progress.setLabelText(f"正在导出学生: {exported}/{total}")
+
+    def _close_export_progress(self):
+        if self.export_progress is not None:
+            self.export_progress.canceled.disconnect()
+            self.export_progress.close()
+            self.export_progress = None
+
+    def on_export_finished(self, path, count):
+        self._close_export_progress()
+        self.logger.info("导出 %d 名学生到 %s", count, path)
+        QMessageBox.information(self, "导出完成", f"已导出 {count} 名学生到\n{path}")
+
+    def on_export_failed(self, error):
+        self._close_export_progress()
+        QMessageBox.critical(self, "错误", f"导出学生失败: {error}")
+
+    def on_export_cancelled(self):
+        self._close_export_progress()
+
+    def closeEvent(self, event):
+        """窗口关闭时取消正在进行的导出"""
+        if self.exporter is not None:
+            self.exporter.cancel()
+            self.exporter.wait()
+        super().closeEvent(event)
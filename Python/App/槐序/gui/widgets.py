@@ -0,0 +1,23 @@
+def refill_combo(combo, first_text, items):
+    """重新填充下拉框并保持原来的选中项
+
+    first_text 为第一项（如"所有课程"，数据为 None），items 为 [(数据, 显示文本)]。
+    填充期间不发出信号；只有首次填充或原选中项已不存在时才发出 currentIndexChanged，
+    避免数据刷新时重复触发依赖下拉框的查询。
+    """
+    was_empty = combo.count() == 0
+    current = combo.currentData()
+
+    combo.blockSignals(True)
+    combo.clear()
+    combo.addItem(first_text, None)
+    index = 0
+    for data, text in items:
+        combo.addItem(text, data)
+        if current is not None and data == current:
+            index = combo.count() - 1
+    combo.setCurrentIndex(index)
+    combo.blockSignals(False)
+
+    if was_empty or combo.currentData() != current:
+        combo.currentIndexChanged.emit(index)
@@ -0,0 +1,116 @@
+import logging
+from PyQt5.QtCore import QObject, QEvent, Qt
+from database.data_version import get_table_versions
+from utils.log_utils import log_timing
+
+
+class WindowRegistry(QObject):
+    """功能窗口注册表
+
+    每个功能窗口只创建一次，关闭（隐藏）后保留实例，再次打开时直接恢复显示。
+    窗口隐藏时记录相关数据表的版本号，再次显示时只调用数据有变化的那部分加载方法。
+    """
+
+    def __init__(self, db_conn, parent=None):
+        super().__init__(parent)
+        self.db_conn = db_conn
+        self.logger = logging.getLogger(__name__)
+        self._specs = {}  # 名称 -> (创建函数, [(依赖的数据表, 加载方法名)])
+        self._windows = {}  # 名称 -> 窗口
+        self._versions = {}  # 名称 -> 窗口隐藏时的数据表版本号
+
+    def register(self, name, factory, refreshers=()):
+        """注册窗口
+
+        factory 无参数，返回新的窗口实例；
+        refreshers 为 [(数据表元组, 加载方法名)]，按顺序调用，其中任意一张表有变化时调用对应方法。
+        """
+        self._specs[name] = (factory, list(refreshers))
+
+    def _tables(self, name):
+        _, refreshers = self._specs[name]
+        return sorted({table for tables, _ in refreshers for table in tables})
+
+    def get(self, name, create=True):
+        """获取窗口实例，未创建时按需创建"""
+        window = self._windows.get(name)
+        if window is None and create:
+            factory, _ = self._specs[name]
+            with log_timing(self.logger, f"创建窗口: {name}", window=name):
+                window = factory()
+            window.installEventFilter(self)
+            window.destroyed.connect(lambda _=None, n=name: self._forget(n))
+            self._windows[name] = window
+            self._versions[name] = self._read_versions(name)
+        return window
+
+    def is_created(self, name):
+        return name in self._windows
+
+    def show(self, name):
+        """显示窗口：已存在的窗口先刷新变化的数据，再恢复到前台"""
+        created = self.is_created(name)
+        window = self.get(name)
+        if created and not window.isVisible():
+            self.refresh(name)
+        if window.isMinimized():
+            window.setWindowState(window.windowState() & ~Qt.WindowMinimized)
+        window.show()
+        window.raise_()
+        window.activateWindow()
+        return window
+
+    def prebuild(self, name):
+        """在空闲时预先创建窗口（不显示）"""
+        if name in self._specs and not self.is_created(name):
+            try:
+                self.get(name)
+                self.logger.info(f"预先创建窗口: {name}")
+            except Exception as e:
+                self.logger.error(f"预先创建窗口 {name} 错误: {str(e)}")
+
+    def refresh(self, name):
+        """按数据表版本号调用有变化部分的加载方法"""
+        window = self._windows.get(name)
+        if window is None:
+            return
+        current = self._read_versions(name)
+        previous = self._versions.get(name) or {}
+        if current:
+            changed = {table for table, version in current.items() if previous.get(table) != version}
+        else:
+            changed = set(self._tables(name))
+        _, refreshers = self._specs[name]
+        for tables, method in refreshers:
+            if changed.intersection(tables):
+                self.logger.info(f"窗口 {name} 数据有变化，重新加载: {method}")
+                getattr(window, method)()
+        self._versions[name] = current
+
+    def _read_versions(self, name):
+        tables = self._tables(name)
+        if not tables:
+            return {}
+        try:
+            return get_table_versions(self.db_conn, tables)
+        except Exception as e:
+            # 读不到版本号时返回空字典，再次显示时全部重新加载
+            self.logger.error(f"读取数据表版本号错误: {str(e)}")
+            return {}
+
+    def _forget(self, name):
+        self._windows.pop(name, None)
+        self._versions.pop(name, None)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Hide:
+            for name, window in self._windows.items():
+                if window is obj:
+                    self._versions[name] = self._read_versions(name)
+                    break
+        return super().eventFilter(obj, event)
+
+    def close_all(self):
+        """关闭全部窗口（退出登录或主窗口关闭时调用）"""
+        for window in list(self._windows.values()):
+            window.close()
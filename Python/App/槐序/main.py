@@ -2,27 +2,29 @@
 这个bug修的我想死
 """
 
+import os
 import sys
 import argparse
 import traceback
 import logging
-from PyQt5.QtWidgets import QApplication, QMessageBox
-from PyQt5.QtGui import QFont, QIcon
-from database.db_conn import create_connection
-from database.db_init import initialize_database
-from gui.login_window import LoginWindow
+from utils import log_utils
+from utils.startup_profiler import startup_profiler, PROFILE_FLAG, REPORT_FLAG
+
+# 启动分析需在导入界面模块之前启用，才能统计到这些模块的导入耗时
+startup_profiler.enable_from_argv()
+
+with startup_profiler.phase("导入模块"):
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    from PyQt5.QtGui import QFont, QIcon
+    from PyQt5.QtCore import QTimer
+    from database.db_conn import create_connection
+    from database.db_init import initialize_database
+    from gui.login_window import LoginWindow
 
 
 def setup_logging():
-    """配置日志系统"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('grade_system.log'),
-            logging.StreamHandler()
-        ]
-    )
+    """配置日志系统（后台线程写入，日志文件按大小轮转）"""
+    log_utils.setup_logging('grade_system.log')
     return logging.getLogger(__name__)
 
 
@@ -54,6 +56,18 @@ def parse_arguments():
                         help='指定样式表文件路径')
     parser.add_argument('--test', action='store_true',
                         help='测试模式，不显示主界面')
+    parser.add_argument(PROFILE_FLAG, action='store_true',
+                        help='记录启动各阶段及模块导入耗时')
+    parser.add_argument(REPORT_FLAG, metavar='PATH',
+                        help='启动分析的 JSON 报告写入该文件（同时启用启动分析）')
+    parser.add_argument('--ui-monitor', action='store_true',
+                        help='显示界面响应监控浮层')
+    parser.add_argument('--ui-monitor-report', metavar='PATH',
+                        help='退出时把界面响应报告写入该文件（.json 或 .txt，同时启用界面响应监控）')
+
+    # 批处理子命令（不创建界面）
+    from utils.batch_jobs import add_batch_arguments
+    add_batch_arguments(parser)
     return parser.parse_args()
 
 
@@ -62,36 +76,46 @@ def main():
     logger = setup_logging()
     logger.info("启动4+X成绩管理系统")
 
-    # 设置全局异常处理
-    sys.excepthook = excepthook
-
     # 解析命令行参数
     args = parse_arguments()
     logger.info(f"命令行参数: {args}")
 
+    # 命令行批处理，不创建 QApplication 和任何窗口
+    if args.command:
+        from utils.batch_jobs import run_batch
+        return run_batch(args)
+
+    # 设置全局异常处理
+    sys.excepthook = excepthook
+
     # 初始化应用程序
-    app = QApplication(sys.argv)
-    app.setWindowIcon(QIcon('img/icon.png'))
+    with startup_profiler.phase("创建应用程序"):
+        app = QApplication(sys.argv)
+        app.setApplicationName("槐序")  # 本机数据目录（如点名日志）以此命名
+        app.setWindowIcon(QIcon('img/icon.png'))
 
-    # 设置默认字体
-    font = QFont("Microsoft YaHei", 15)
-    app.setFont(font)
+        # 设置默认字体
+        font = QFont("Microsoft YaHei", 15)
+        app.setFont(font)
 
     # 加载样式表
-    stylesheet = load_stylesheet(args.style)
-    if stylesheet:
-        app.setStyleSheet(stylesheet)
-        logger.info("样式表加载成功")
+    with startup_profiler.phase("加载样式表"):
+        stylesheet = load_stylesheet(args.style)
+        if stylesheet:
+            app.setStyleSheet(stylesheet)
+            logger.info("样式表加载成功")
 
     # 测试模式直接退出
     if args.test:
         logger.info("测试模式成功启动，退出")
+        startup_profiler.report("测试模式启动完成")
         return 0
 
     # 创建数据库连接
     try:
         logger.info(f"连接数据库: {args.db}")
-        db_conn = create_connection(args.db)
+        with startup_profiler.phase("连接数据库"):
+            db_conn = create_connection(args.db)
         if db_conn is None:
             logger.error("无法连接数据库")
             QMessageBox.critical(None, "错误", "无法连接数据库，程序将退出")
@@ -99,10 +123,17 @@ def main():
 
         # 检查并初始化数据库表
         logger.info("初始化数据库表")
-        if not initialize_database(db_conn):
+        with startup_profiler.phase("初始化数据库"):
+            initialized = initialize_database(db_conn)
+        if not initialized:
             logger.error("数据库初始化失败")
             QMessageBox.critical(None, "错误", "数据库初始化失败，程序将退出")
             return 1
+
+        # 写入上次异常退出前未保存的点名记录
+        with startup_profiler.phase("恢复点名日志"):
+            from gui.roll_call import recover_roll_call_journal
+            recover_roll_call_journal(db_conn)
     except Exception as e:
         logger.exception("数据库初始化异常")
         QMessageBox.critical(None, "错误", f"数据库初始化异常: {str(e)}")
@@ -111,17 +142,35 @@ def main():
     # 显示登录窗口
     try:
         logger.info("显示登录窗口")
-        login_window = LoginWindow(db_conn)
-        login_window.show()
+        with startup_profiler.phase("显示登录窗口"):
+            login_window = LoginWindow(db_conn)
+            login_window.show()
     except Exception as e:
         logger.exception("无法启动登录窗口")
         QMessageBox.critical(None, "错误", f"无法启动登录窗口: {str(e)}")
         return 1
 
+    # 界面响应监控（开发者用），只在命令行或环境变量要求时启动，卡顿记录写入日志
+    from utils.ui_monitor import get_ui_monitor, MONITOR_ENV
+    ui_monitor = get_ui_monitor()
+    if args.ui_monitor or args.ui_monitor_report or os.environ.get(MONITOR_ENV):
+        ui_monitor.overlay_requested = args.ui_monitor
+        ui_monitor.start()
+
     # 执行应用程序
     logger.info("进入应用程序主循环")
-    sys.exit(app.exec_())
+    # 事件循环处理完第一批事件（登录窗口已绘制）后输出启动分析报告
+    QTimer.singleShot(0, lambda: startup_profiler.report("登录窗口已显示"))
+    exit_code = app.exec_()
+
+    ui_monitor.stop()
+    if args.ui_monitor_report:
+        try:
+            ui_monitor.export_report(args.ui_monitor_report)
+        except OSError as e:
+            logger.error(f"写入界面响应报告错误: {str(e)}")
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,49 @@
+"""gui.classroom_mgmt.expand_schedule 按重复规则展开课堂活动"""
+
+import unittest
+from datetime import date
+
+from gui.classroom_mgmt import expand_schedule
+
+
+def dates(activities):
+    return [activity[1] for activity in activities]
+
+
+class ExpandScheduleTest(unittest.TestCase):
+    def test_start_and_end_are_inclusive(self):
+        # 2026-09-07 是周一，2026-09-14 是下周一
+        activities = expand_schedule([1], date(2026, 9, 7), date(2026, 9, 14), {0}, "课堂测验", 10)
+        self.assertEqual(dates(activities), ['2026-09-07', '2026-09-14'])
+
+    def test_only_selected_weekdays(self):
+        activities = expand_schedule([1], date(2026, 9, 7), date(2026, 9, 13), {1, 3}, "课堂测验", 10)
+        self.assertEqual(dates(activities), ['2026-09-08', '2026-09-10'])
+
+    def test_single_day(self):
+        self.assertEqual(dates(expand_schedule([1], date(2026, 9, 7), date(2026, 9, 7), {0}, "测验", 10)),
+                         ['2026-09-07'])
+        self.assertEqual(expand_schedule([1], date(2026, 9, 7), date(2026, 9, 7), {1}, "测验", 10), [])
+
+    def test_end_before_start_is_empty(self):
+        self.assertEqual(expand_schedule([1], date(2026, 9, 14), date(2026, 9, 7), set(range(7)), "测验", 10), [])
+
+    def test_no_weekdays_is_empty(self):
+        self.assertEqual(expand_schedule([1], date(2026, 9, 7), date(2026, 12, 31), set(), "测验", 10), [])
+
+    def test_crosses_month_and_leap_day(self):
+        activities = expand_schedule([1], date(2028, 2, 27), date(2028, 3, 2), set(range(7)), "测验", 10)
+        self.assertEqual(dates(activities), ['2028-02-27', '2028-02-28', '2028-02-29', '2028-03-01', '2028-03-02'])
+
+    def test_every_course_gets_every_date(self):
+        activities = expand_schedule([3, 5], date(2026, 9, 7), date(2026, 9, 9), {0, 2}, "课堂讨论", 5, "第一周")
+        self.assertEqual(activities, [
+            (3, '2026-09-07', "课堂讨论", 5, "第一周"),
+            (3, '2026-09-09', "课堂讨论", 5, "第一周"),
+            (5, '2026-09-07', "课堂讨论", 5, "第一周"),
+            (5, '2026-09-09', "课堂讨论", 5, "第一周"),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
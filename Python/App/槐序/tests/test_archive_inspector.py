@@ -0,0 +1,139 @@
+"""utils.archive_inspector 的压缩包文件列表、缓存和成员读取，以及基于它的重复提交检查"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+import unittest
+import zipfile
+
+from utils.archive_inspector import ArchiveInspector, is_archive, join_member_path, split_member_path
+from utils.file_monitor import AssignmentFolderMonitor
+
+
+class MemberPathTest(unittest.TestCase):
+    def test_is_archive(self):
+        self.assertTrue(is_archive('作业.zip'))
+        self.assertTrue(is_archive('作业.ZIP'))
+        self.assertFalse(is_archive('作业.rar'))
+        self.assertFalse(is_archive('zip'))
+
+    def test_join_and_split(self):
+        path = join_member_path('作业.zip', 'src/main.py')
+        self.assertEqual(path, '作业.zip!/src/main.py')
+        self.assertEqual(split_member_path(path), ('作业.zip', 'src/main.py'))
+
+    def test_split_plain_file(self):
+        self.assertEqual(split_member_path('报告.docx'), ('报告.docx', None))
+
+    def test_split_only_at_first_separator(self):
+        self.assertEqual(split_member_path('a.zip!/b.zip!/c.txt'), ('a.zip', 'b.zip!/c.txt'))
+
+
+class ArchiveInspectorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.inspector = ArchiveInspector()
+        self.archive = self.make_archive('作业.zip', {'src/main.py': b'print(1)\n', 'README.md': b'# hello\n'})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def make_archive(self, name, files):
+        path = os.path.join(self.tmp, name)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('src/', b'')
+            for member, data in files.items():
+                zf.writestr(member, data)
+        return path
+
+    def test_lists_files_without_directories(self):
+        self.assertEqual(sorted(self.inspector.member_names(self.archive)), ['README.md', 'src/main.py'])
+        members = {member.name: member for member in self.inspector.list_members(self.archive)}
+        self.assertEqual(members['src/main.py'].size, len(b'print(1)\n'))
+
+    def test_corrupted_archive_is_empty(self):
+        path = os.path.join(self.tmp, '损坏.zip')
+        with open(path, 'wb') as f:
+            f.write(b'PK\x03\x04 not really a zip')
+        self.assertEqual(self.inspector.list_members(path), [])
+
+    def test_truncated_archive_is_empty(self):
+        with open(self.archive, 'rb') as f:
+            data = f.read()
+        path = os.path.join(self.tmp, '截断.zip')
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        self.assertEqual(self.inspector.list_members(path), [])
+
+    def test_missing_archive_is_empty(self):
+        self.assertEqual(self.inspector.list_members(os.path.join(self.tmp, '不存在.zip')), [])
+
+    def test_listing_is_cached_until_file_changes(self):
+        first = self.inspector.list_members(self.archive)
+        self.assertIs(self.inspector.list_members(self.archive), first)
+
+        self.make_archive('作业.zip', {'new.txt': b'changed content'})
+        stat = os.stat(self.archive)
+        os.utime(self.archive, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(self.inspector.member_names(self.archive), ['new.txt'])
+
+    def test_invalidate(self):
+        first = self.inspector.list_members(self.archive)
+        self.inspector.invalidate(self.archive)
+        self.assertIsNot(self.inspector.list_members(self.archive), first)
+
+    def test_cache_size_is_bounded(self):
+        inspector = ArchiveInspector(max_archives=2)
+        paths = [self.make_archive(f'{i}.zip', {'a.txt': b'a'}) for i in range(3)]
+        for path in paths:
+            inspector.list_members(path)
+        self.assertEqual(len(inspector._listings), 2)
+        self.assertNotIn(os.path.abspath(paths[0]), inspector._listings)
+
+    def test_read_and_hash_member(self):
+        self.assertEqual(self.inspector.read_member_head(self.archive, 'README.md', 3), b'# h')
+        self.assertEqual(self.inspector.hash_member(self.archive, 'src/main.py'),
+                         hashlib.sha256(b'print(1)\n').hexdigest())
+        chunks = list(self.inspector.iter_member_chunks(self.archive, 'src/main.py', chunk_size=4))
+        self.assertEqual(b''.join(chunks), b'print(1)\n')
+        self.assertEqual(len(chunks), 3)
+
+    def test_missing_member_raises(self):
+        with self.assertRaises(KeyError):
+            self.inspector.read_member_head(self.archive, 'nope.txt', 10)
+
+
+class DuplicateSubmissionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, data):
+        with open(os.path.join(self.tmp, name), 'wb') as f:
+            f.write(data)
+
+    def test_finds_identical_files_and_archive_members(self):
+        self.write('2023001_作业.py', b'print(1)\n')
+        self.write('2023002_作业.py', b'print(2)\n')  # 大小相同内容不同
+        self.write('2023003_作业.txt', b'')
+        self.write('2023004_作业.txt', b'')  # 空文件不算重复
+        with zipfile.ZipFile(os.path.join(self.tmp, '2023005.zip'), 'w') as zf:
+            zf.writestr('main.py', b'print(1)\n')
+        monitor = AssignmentFolderMonitor(self.tmp)
+        index = monitor.get_submission_index(['2023001', '2023002', '2023003', '2023004', '2023005'])
+
+        duplicates = monitor.find_duplicate_submissions(index)
+        self.assertEqual(duplicates, [[('2023001', '2023001_作业.py'), ('2023005', '2023005.zip!/main.py')]])
+
+    def test_same_student_is_not_duplicate(self):
+        self.write('2023001_a.txt', b'same')
+        self.write('2023001_b.txt', b'same')
+        monitor = AssignmentFolderMonitor(self.tmp)
+        self.assertEqual(monitor.find_duplicate_submissions(monitor.get_submission_index(['2023001'])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
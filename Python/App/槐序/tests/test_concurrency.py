@@ -0,0 +1,207 @@
+"""database.concurrency 的乐观锁保存与按字段合并"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from database.concurrency import (
+    RowConflict, configure_connection, read_versions, save_versioned, write_transaction
+)
+
+KEY = ('activity_id', 'student_id')
+VALUES = ('score', 'comment')
+
+
+class AutoMergeTest(unittest.TestCase):
+    def test_takes_each_sides_changed_fields(self):
+        conflict = RowConflict((1, 's1'), (60, "原评语"), (80, "原评语"), (60, "新评语"), 2)
+        self.assertEqual(conflict.conflicting_fields(), [])
+        self.assertEqual(conflict.auto_merge(), (80, "新评语"))
+
+    def test_same_field_changed_differently_is_conflict(self):
+        conflict = RowConflict((1, 's1'), (60, None), (80, None), (90, None), 2)
+        self.assertEqual(conflict.conflicting_fields(), [0])
+        self.assertIsNone(conflict.auto_merge())
+
+    def test_same_field_changed_to_same_value_merges(self):
+        conflict = RowConflict((1, 's1'), (60, None), (80, None), (80, None), 2)
+        self.assertEqual(conflict.auto_merge(), (80, None))
+
+    def test_deleted_row_is_conflict(self):
+        conflict = RowConflict((1, 's1'), (60, None), (80, None), None, None)
+        self.assertEqual(conflict.conflicting_fields(), [0, 1])
+        self.assertIsNone(conflict.auto_merge())
+
+    def test_new_row_inserted_by_both(self):
+        # 双方都新增了记录：没有共同的基准，值不同的字段都算冲突
+        conflict = RowConflict((1, 's1'), None, (80, None), (90, None), 0)
+        self.assertEqual(conflict.conflicting_fields(), [0])
+        self.assertIsNone(conflict.auto_merge())
+
+
+class SaveVersionedTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript("""
+            CREATE TABLE classroom_scores
+            (
+                activity_id INTEGER NOT NULL,
+                student_id  TEXT    NOT NULL,
+                score       REAL,
+                comment     TEXT,
+                row_version INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (activity_id, student_id)
+            );
+            CREATE TRIGGER trg_classroom_scores_row_version
+                AFTER UPDATE ON classroom_scores
+                WHEN NEW.row_version = OLD.row_version
+                BEGIN
+                    UPDATE classroom_scores SET row_version = OLD.row_version + 1 WHERE rowid = NEW.rowid;
+                END;
+            INSERT INTO classroom_scores (activity_id, student_id, score, comment) VALUES (1, 's1', 60, '原评语');
+        """)
+        self.conn.commit()
+        # 模拟另一个客户端
+        self.other = sqlite3.connect(self.path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.other.close()
+        os.remove(self.path)
+
+    def current(self, student_id='s1'):
+        return read_versions(self.conn, 'classroom_scores', KEY, VALUES, [(1, student_id)]).get((1, student_id))
+
+    def test_writes_when_version_unchanged(self):
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's1'), (60, "原评语"), (80, "原评语"), 0)])
+        self.assertEqual((written, skipped), (1, []))
+        self.assertEqual(self.current(), ((80, "原评语"), 1))
+
+    def test_inserts_new_row(self):
+        written, _ = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                    [((1, 's2'), None, (90, None), None)])
+        self.assertEqual(written, 1)
+        self.assertEqual(self.current('s2'), ((90, None), 0))
+
+    def test_merges_change_to_other_field(self):
+        self.other.execute("UPDATE classroom_scores SET comment = '新评语' WHERE student_id = 's1'")
+        self.other.commit()
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's1'), (60, "原评语"), (80, "原评语"), 0)])
+        self.assertEqual((written, skipped), (1, []))
+        self.assertEqual(self.current()[0], (80, "新评语"))
+
+    def test_conflict_without_resolver_keeps_their_value(self):
+        self.other.execute("UPDATE classroom_scores SET score = 90 WHERE student_id = 's1'")
+        self.other.commit()
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's1'), (60, "原评语"), (80, "原评语"), 0)])
+        self.assertEqual(written, 0)
+        self.assertEqual([conflict.theirs for conflict in skipped], [(90, "原评语")])
+        self.assertEqual(self.current()[0], (90, "原评语"))
+
+    def test_conflict_resolved_by_user(self):
+        self.other.execute("UPDATE classroom_scores SET score = 90 WHERE student_id = 's1'")
+        self.other.commit()
+        seen = []
+
+        def resolve(conflicts):
+            seen.extend(conflicts)
+            return {conflict.key: conflict.mine for conflict in conflicts}
+
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's1'), (60, "原评语"), (80, "原评语"), 0)], resolve=resolve)
+        self.assertEqual((written, skipped), (1, []))
+        self.assertEqual([(conflict.mine, conflict.theirs) for conflict in seen],
+                         [((80, "原评语"), (90, "原评语"))])
+        self.assertEqual(self.current(), ((80, "原评语"), 2))
+
+    def test_row_inserted_by_other_client(self):
+        self.other.execute("INSERT INTO classroom_scores (activity_id, student_id, score) VALUES (1, 's2', 70)")
+        self.other.commit()
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's2'), None, (90, None), None)])
+        self.assertEqual(written, 0)
+        self.assertEqual(len(skipped), 1)
+        self.assertEqual(self.current('s2')[0], (70, None))
+
+    def test_deletes_when_version_unchanged(self):
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's1'), (60, "原评语"), None, 0)])
+        self.assertEqual((written, skipped), (1, []))
+        self.assertIsNone(self.current())
+
+    def test_delete_conflicts_with_other_clients_change(self):
+        self.other.execute("UPDATE classroom_scores SET score = 90 WHERE student_id = 's1'")
+        self.other.commit()
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's1'), (60, "原评语"), None, 0)])
+        self.assertEqual(written, 0)
+        self.assertEqual([(conflict.mine, conflict.theirs) for conflict in skipped], [(None, (90, "原评语"))])
+        self.assertEqual(self.current()[0], (90, "原评语"))
+
+    def test_delete_confirmed_by_user(self):
+        self.other.execute("UPDATE classroom_scores SET score = 90 WHERE student_id = 's1'")
+        self.other.commit()
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's1'), (60, "原评语"), None, 0)],
+                                          resolve=lambda conflicts: {conflict.key: None for conflict in conflicts})
+        self.assertEqual((written, skipped), (1, []))
+        self.assertIsNone(self.current())
+
+    def test_delete_of_row_already_deleted(self):
+        self.other.execute("DELETE FROM classroom_scores WHERE student_id = 's1'")
+        self.other.commit()
+        written, skipped = save_versioned(self.conn, 'classroom_scores', KEY, VALUES,
+                                          [((1, 's1'), (60, "原评语"), None, 0)])
+        self.assertEqual((written, skipped), (1, []))
+
+
+class WriteTransactionTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE t (v INTEGER)")
+        self.conn.commit()
+        configure_connection(self.conn, 0)
+        self.other = sqlite3.connect(self.path)
+
+    def tearDown(self):
+        self.conn.close()
+        self.other.close()
+        os.remove(self.path)
+
+    def count(self):
+        return self.other.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+    def test_refuses_to_commit_foreign_transaction(self):
+        self.conn.execute("INSERT INTO t VALUES (1)")
+        with self.assertRaises(sqlite3.ProgrammingError):
+            write_transaction(self.conn, lambda cursor: cursor.execute("INSERT INTO t VALUES (2)"))
+        self.assertTrue(self.conn.in_transaction)
+        self.assertEqual(self.count(), 0)
+
+    def test_retries_after_lock_is_released(self):
+        self.other.execute("BEGIN IMMEDIATE")
+        with mock.patch('database.concurrency._wait', side_effect=lambda delay, gui: self.other.rollback()) as wait:
+            write_transaction(self.conn, lambda cursor: cursor.execute("INSERT INTO t VALUES (1)"))
+        self.assertEqual(wait.call_count, 1)
+        self.assertEqual(self.count(), 1)
+
+    def test_gives_up_after_retries(self):
+        self.other.execute("BEGIN IMMEDIATE")
+        with mock.patch('database.concurrency._wait') as wait:
+            with self.assertRaises(sqlite3.OperationalError):
+                write_transaction(self.conn, lambda cursor: cursor.execute("INSERT INTO t VALUES (1)"), retries=2)
+        self.assertEqual(wait.call_count, 2)
+        self.assertFalse(self.conn.in_transaction)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""database.search_index 的拼音检索键和检索词处理"""
+
+import unittest
+
+from database.search_index import (
+    MAX_READINGS, _reading_combinations, name_syllables, normalize_query, search_keys
+)
+
+
+def matches(query, name):
+    """检索词是否能找到该姓名（与 student_search_filter 相同的前缀匹配）"""
+    query = normalize_query(query)
+    return any(key.startswith(query) for key in search_keys(name))
+
+
+class SearchKeysTest(unittest.TestCase):
+    def test_full_pinyin_initials_and_mixed(self):
+        keys = search_keys('张三丰')
+        self.assertLessEqual({'zhangsanfeng', 'zsf', 'zhangsf', 'sanfeng', 'sf'}, keys)
+        for query in ('zhangs', 'zs', 'zhangsanf', 'zsf', 'zhangsf', 'sanf', 'sf'):
+            self.assertTrue(matches(query, '张三丰'), query)
+
+    def test_chinese_fragments(self):
+        keys = search_keys('张三丰')
+        self.assertLessEqual({'张三丰', '三丰', '丰'}, keys)
+        self.assertTrue(matches('三丰', '张三丰'))
+        self.assertTrue(matches('三', '张三丰'))
+
+    def test_non_matching_queries(self):
+        for query in ('zhangf', 'sz', 'fengs', '丰三'):
+            self.assertFalse(matches(query, '张三丰'), query)
+
+    def test_initials_must_follow_syllable_order(self):
+        # 只有后面的音节可以取首字母，zhangsanf 能找到，zsanfeng 不行
+        self.assertFalse(matches('zsanfeng', '张三丰'))
+
+    def test_polyphone_surname_keeps_every_reading(self):
+        keys = search_keys('单田芳')
+        for surname in ('shan', 'dan', 'chan'):
+            self.assertIn(surname + 'tianfang', keys)
+        self.assertIn('stf', keys)
+        self.assertTrue(matches('zengl', '曾乐'))
+        self.assertTrue(matches('cengl', '曾乐'))
+
+    def test_polyphone_given_name(self):
+        self.assertTrue(matches('wangyue', '王乐'))
+        self.assertTrue(matches('wangle', '王乐'))
+
+    def test_given_name_readings_are_capped(self):
+        combinations = _reading_combinations(name_syllables('曾乐乐乐'))
+        # 姓的两个读音都保留，名字部分最多 MAX_READINGS 种
+        self.assertEqual(len(combinations), 2 * MAX_READINGS)
+        self.assertIn(('zeng', 'le', 'le', 'le'), combinations)
+        self.assertIn(('ceng', 'le', 'le', 'le'), combinations)
+
+    def test_u_umlaut_spellings(self):
+        keys = search_keys('吕布')
+        self.assertLessEqual({'lvbu', 'lubu', 'lb'}, keys)
+        self.assertTrue(matches('lüb', '吕布'))
+
+    def test_latin_and_separators(self):
+        keys = search_keys('阿依·Mary')
+        self.assertIn('ayimary', keys)
+        self.assertIn('mary', keys)
+        self.assertIn('aym', keys)
+        self.assertFalse(any('·' in key for key in keys))
+
+    def test_empty_name(self):
+        self.assertEqual(search_keys(''), set())
+        self.assertEqual(search_keys('  ·  '), set())
+
+
+class NormalizeQueryTest(unittest.TestCase):
+    def test_spaces_case_and_apostrophe(self):
+        self.assertEqual(normalize_query(' Zhang San '), 'zhangsan')
+        self.assertEqual(normalize_query("xi'an"), 'xian')
+
+    def test_umlaut(self):
+        self.assertEqual(normalize_query('lü'), 'lv')
+
+    def test_mixed_chinese_and_latin_becomes_pinyin(self):
+        self.assertEqual(normalize_query('张s'), 'zhangs')
+
+    def test_chinese_only_is_kept(self):
+        self.assertEqual(normalize_query('三丰'), '三丰')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,511 @@
+"""
+成绩分析数据的列式导出（供 pandas 等分析工具读取）
+
+    输出目录/
+        manifest.json                       格式、各学期的导出时间和行数、维度表行数
+        dim_students.<ext>                  key, student_id, name, gender, class_id, class_key
+        dim_courses.<ext>                   key, course_id, course_name, credit, course_type
+        dim_classes.<ext>                   key, class_id, class_name
+        scores/<学期>.<ext>                 student_key, class_key, course_key, row_id, exam_type, score
+        classroom_scores/<学期>.<ext>       student_key, class_key, course_key, row_id, activity_id,
+                                            activity_date, activity_type, score, max_score
+        assignment_submissions/<学期>.<ext> student_key, class_key, course_key, row_id, folder_id, status, score
+        <事实表>/.versions-<学期>.<ext>     row_id, row_version（该学期导出时各记录的版本号，保留最近两个学期）
+
+安装了 pyarrow 时写 Parquet（<ext> 为 parquet），否则写压缩的 NumPy .npz（不需要安装 NumPy，numpy.load 可直接读取）。
+学生、课程、班级在事实表中只保存整数键（维度表中的行号，缺失为 -1，与 pandas.Categorical 的编码约定相同），
+整数列的空值同样为 -1，小数列的空值为 NaN；
+考试类型、活动类型等取值很少的文本列在文件内按字典编码：Parquet 中为 dictionary 类型，
+npz 中为 <列>（编码）和 <列>.categories（取值）两个数组。
+
+数据库没有学期字段，导出时指定学期名称，每个学期写一个文件，包含上次导出之后新增和修改过的记录：
+清单中记下各事实表已导出的最大行号，下一个学期从这里开始；之前导出过的记录与上个学期导出时的
+版本号（row_version）对比，被修改过（如重新批改）的按当前的值再写入本学期的文件。
+row_id 为源表主键，合并各学期的文件时同一 row_id 以最后一个学期的为准；删除的记录不会从之前的文件中去掉。
+重新导出最近的学期时沿用它原来的起始行号和对比的学期并替换该文件；更早的学期不能重新导出。
+维度表只追加不修改键，之前导出的学期文件中的键仍然有效。
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import struct
+import sqlite3
+import logging
+import tempfile
+import zipfile
+import importlib.util
+from array import array
+from datetime import datetime
+from utils.data_export import snapshot_database, connect_snapshot
+from utils.log_utils import timing_extra
+
+ANALYTICS_FORMAT_VERSION = 2
+MANIFEST_NAME = 'manifest.json'
+# 各学期导出时记录版本号的文件名前缀（学期名称不含 "."，不会与学期文件重名）
+VERSIONS_PREFIX = '.versions-'
+VERSION_TYPES = [('row_id', 'int'), ('row_version', 'int')]
+FORMATS = ('parquet', 'npz')
+
+# 缺失的键（与 pandas.Categorical 的缺失编码相同）
+MISSING_KEY = -1
+
+# 学期名称只能包含文字、数字、下划线和短横线（用作文件名）
+TERM_PATTERN = re.compile(r'[\w-]+')
+
+# 维度表: 名称 -> (源查询, 业务键列, 列)
+DIMENSIONS = {
+    'students': ("SELECT student_id, name, gender, class_id FROM students ORDER BY student_id",
+                 'student_id', ['student_id', 'name', 'gender', 'class_id']),
+    'courses': ("SELECT course_id, course_name, credit, course_type FROM courses ORDER BY course_id",
+                'course_id', ['course_id', 'course_name', 'credit', 'course_type']),
+    'classes': ("SELECT class_id, class_name FROM classes ORDER BY class_id",
+                'class_id', ['class_id', 'class_name']),
+}
+
+# 事实表: 名称 -> (源查询, 行号列, 列类型)；查询的前三列依次为学号、班级ID、课程ID，导出为维度键
+# 本学期的记录：行号范围 (上次导出的最大行号, 本次导出时的最大行号] 内新增的，以及 temp.changed_rows 中修改过的
+FACTS = {
+    'scores': ("""
+               SELECT sc.student_id, s.class_id, sc.course_id, sc.score_id, sc.exam_type, sc.score
+               FROM scores sc
+                        LEFT JOIN students s ON s.student_id = sc.student_id
+               WHERE sc.score_id > ? AND sc.score_id <= ?
+                  OR sc.score_id IN (SELECT row_id FROM temp.changed_rows)
+               ORDER BY sc.course_id, sc.student_id
+               """, ('scores', 'score_id'), [('row_id', 'int'), ('exam_type', 'category'), ('score', 'float')]),
+    'classroom_scores': ("""
+                         SELECT cs.student_id, s.class_id, ca.course_id, cs.score_id, ca.activity_id,
+                                ca.activity_date, ca.activity_type, cs.score, ca.max_score
+                         FROM classroom_scores cs
+                                  JOIN classroom_activities ca ON ca.activity_id = cs.activity_id
+                                  LEFT JOIN students s ON s.student_id = cs.student_id
+                         WHERE cs.score_id > ? AND cs.score_id <= ?
+                            OR cs.score_id IN (SELECT row_id FROM temp.changed_rows)
+                         ORDER BY ca.course_id, ca.activity_id, cs.student_id
+                         """, ('classroom_scores', 'score_id'),
+                         [('row_id', 'int'), ('activity_id', 'int'), ('activity_date', 'category'),
+                          ('activity_type', 'category'), ('score', 'float'), ('max_score', 'float')]),
+    'assignment_submissions': ("""
+                               SELECT a.student_id, s.class_id, f.course_id, a.submission_id, a.folder_id,
+                                      a.status, a.score
+                               FROM assignment_submissions a
+                                        JOIN assignment_folders f ON f.folder_id = a.folder_id
+                                        LEFT JOIN students s ON s.student_id = a.student_id
+                               WHERE a.submission_id > ? AND a.submission_id <= ?
+                                  OR a.submission_id IN (SELECT row_id FROM temp.changed_rows)
+                               ORDER BY f.course_id, a.folder_id, a.student_id
+                               """, ('assignment_submissions', 'submission_id'),
+                               [('row_id', 'int'), ('folder_id', 'int'), ('status', 'category'), ('score', 'float')]),
+}
+
+DIMENSION_TYPES = {
+    'students': [('key', 'int'), ('student_id', 'text'), ('name', 'text'), ('gender', 'category'),
+                 ('class_id', 'int'), ('class_key', 'int')],
+    'courses': [('key', 'int'), ('course_id', 'int'), ('course_name', 'text'), ('credit', 'float'),
+                ('course_type', 'category')],
+    'classes': [('key', 'int'), ('class_id', 'int'), ('class_name', 'text')],
+}
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsExportError(Exception):
+    """分析数据导出失败（学期名称无效、输出目录格式不一致等）"""
+
+
+def available_format():
+    """当前环境可写的格式：有 pyarrow 时为 parquet，否则为 npz"""
+    return 'parquet' if importlib.util.find_spec('pyarrow') is not None else 'npz'
+
+
+# ---------------------------------------------------------------- 列
+
+class Column:
+    """一列数据：kind 为 int、float、text 或 category（values 为编码，categories 为取值）"""
+
+    def __init__(self, kind, values, categories=None):
+        self.kind = kind
+        self.values = values
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.values)
+
+    def to_list(self):
+        """还原为 Python 列表（缺失值为 None）"""
+        if self.kind == 'category':
+            return [self.categories[code] if code >= 0 else None for code in self.values]
+        if self.kind == 'float':
+            return [None if value != value else value for value in self.values]
+        return list(self.values)
+
+
+def _build_column(kind, values):
+    if kind == 'int':
+        return Column(kind, array('i', (MISSING_KEY if value is None else value for value in values)))
+    if kind == 'float':
+        return Column(kind, array('d', (float('nan') if value is None else value for value in values)))
+    if kind == 'text':
+        return Column(kind, ["" if value is None else str(value) for value in values])
+    codes = {}
+    encoded = array('i', (MISSING_KEY if value is None else codes.setdefault(str(value), len(codes))
+                          for value in values))
+    return Column(kind, encoded, list(codes))
+
+
+# ---------------------------------------------------------------- npz
+
+def _npy(descr, data, length):
+    """.npy 文件内容（1.0 版格式，头部按 64 字节对齐）"""
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr, length)
+    header += ' ' * (-(10 + len(header) + 1) % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1') + data
+
+
+def _npy_numeric(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    descr = {'i': '<i4', 'd': '<f8'}[values.typecode]
+    return _npy(descr, values.tobytes(), len(values))
+
+
+def _npy_text(values):
+    width = max((len(value) for value in values), default=0) or 1
+    data = b''.join(value.encode('utf-32-le').ljust(width * 4, b'\0') for value in values)
+    return _npy(f'<U{width}', data, len(values))
+
+
+def _write_npz(path, columns):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, column in columns.items():
+            if column.kind == 'text':
+                archive.writestr(f"{name}.npy", _npy_text(column.values))
+            else:
+                archive.writestr(f"{name}.npy", _npy_numeric(column.values))
+            if column.kind == 'category':
+                archive.writestr(f"{name}.categories.npy", _npy_text(column.categories))
+
+
+def _read_npy(data):
+    header_len = struct.unpack('<H', data[8:10])[0]
+    header = data[10:10 + header_len].decode('latin1')
+    descr = re.search(r"'descr':\s*'([^']+)'", header).group(1)
+    body = data[10 + header_len:]
+    if descr.startswith('<U'):
+        width = int(descr[2:]) * 4
+        return [body[i:i + width].decode('utf-32-le').rstrip('\0') for i in range(0, len(body), width)]
+    values = array({'<i4': 'i', '<f8': 'd'}[descr])
+    values.frombytes(body)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _read_npz(path, kinds):
+    with zipfile.ZipFile(path) as archive:
+        columns = {}
+        for name, kind in kinds:
+            values = _read_npy(archive.read(f"{name}.npy"))
+            categories = _read_npy(archive.read(f"{name}.categories.npy")) if kind == 'category' else None
+            columns[name] = Column(kind, values, categories)
+    return columns
+
+
+# ---------------------------------------------------------------- parquet
+
+def _write_parquet(path, columns):
+    # pyarrow 导入较慢，用到时再导入
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrays = {}
+    for name, column in columns.items():
+        if column.kind == 'int':
+            arrays[name] = pa.array(column.values, pa.int32())
+        elif column.kind == 'float':
+            arrays[name] = pa.array(column.to_list(), pa.float64())
+        elif column.kind == 'text':
+            arrays[name] = pa.array(column.values, pa.string())
+        else:
+            indices = pa.array([code if code >= 0 else None for code in column.values], pa.int32())
+            arrays[name] = pa.DictionaryArray.from_arrays(indices, pa.array(column.categories, pa.string()))
+    pq.write_table(pa.table(arrays), path, compression='zstd')
+
+
+def _read_parquet(path, kinds):
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    columns = {}
+    for name, kind in kinds:
+        data = table.column(name).combine_chunks()
+        if kind == 'category':
+            categories = data.dictionary.to_pylist()
+            values = array('i', (MISSING_KEY if code is None else code for code in data.indices.to_pylist()))
+            columns[name] = Column(kind, values, categories)
+        else:
+            columns[name] = _build_column(kind, data.to_pylist())
+    return columns
+
+
+_WRITERS = {'parquet': _write_parquet, 'npz': _write_npz}
+_READERS = {'parquet': _read_parquet, 'npz': _read_npz}
+
+
+def _write_file(path, columns, file_format):
+    # 先写入临时文件再改名，读取方不会看到写了一半的文件
+    partial = path + '.partial'
+    try:
+        _WRITERS[file_format](partial, columns)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+def read_columns(path, kinds):
+    """读取导出的文件，kinds 为 [(列名, 类型)]，返回 {列名: Column}"""
+    file_format = 'parquet' if path.endswith('.parquet') else 'npz'
+    return _READERS[file_format](path, kinds)
+
+
+def read_dataset(output_dir, name, term=None):
+    """读取导出的维度表（name 为 students、courses、classes）或某学期的事实表，返回 {列名: 值列表}"""
+    manifest = read_manifest(output_dir)
+    if name in DIMENSIONS:
+        path = os.path.join(output_dir, f"dim_{name}.{manifest['format']}")
+        kinds = DIMENSION_TYPES[name]
+    else:
+        path = os.path.join(output_dir, name, f"{term}.{manifest['format']}")
+        kinds = _fact_types(name)
+    return {column: values.to_list() for column, values in read_columns(path, kinds).items()}
+
+
+def _fact_types(name):
+    return [('student_key', 'int'), ('class_key', 'int'), ('course_key', 'int')] + FACTS[name][2]
+
+
+# ---------------------------------------------------------------- 导出
+
+def read_manifest(output_dir):
+    """读取输出目录中的清单，没有时返回 None"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class _Dimension:
+    """维度表：业务键 -> 整数键，已有的键不变，新出现的追加到末尾"""
+
+    def __init__(self, name, existing=None):
+        self.name = name
+        self.rows = existing or []  # [{列名: 值}]，行号即整数键
+        id_column = DIMENSIONS[name][1]
+        self.keys = {row[id_column]: key for key, row in enumerate(self.rows)}
+
+    def update(self, record):
+        """更新或追加一行，返回整数键"""
+        id_value = record[DIMENSIONS[self.name][1]]
+        key = self.keys.get(id_value)
+        if key is None:
+            key = self.keys[id_value] = len(self.rows)
+            self.rows.append(record)
+        else:
+            self.rows[key] = record
+        return key
+
+    def key(self, id_value):
+        return MISSING_KEY if id_value is None else self.keys.get(id_value, MISSING_KEY)
+
+
+def _load_dimensions(output_dir, file_format, manifest):
+    dimensions = {}
+    for name in DIMENSIONS:
+        rows = []
+        path = os.path.join(output_dir, f"dim_{name}.{file_format}")
+        if manifest is not None and os.path.exists(path):
+            columns = {column: values.to_list()
+                       for column, values in read_columns(path, DIMENSION_TYPES[name]).items()}
+            rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+            for row in rows:
+                del row['key']
+                row.pop('class_key', None)
+        dimensions[name] = _Dimension(name, rows)
+    return dimensions
+
+
+def _dimension_columns(dimension, dimensions):
+    rows = dimension.rows
+    values = {'key': range(len(rows))}
+    for column, _ in DIMENSION_TYPES[dimension.name][1:]:
+        if column == 'class_key':
+            values[column] = [dimensions['classes'].key(row['class_id']) for row in rows]
+        else:
+            values[column] = [row[column] for row in rows]
+    return {column: _build_column(kind, values[column]) for column, kind in DIMENSION_TYPES[dimension.name]}
+
+
+def _term_low_marks(manifest, term):
+    """本学期各事实表的起始行号（不含）：新学期从上次导出的最大行号开始，重新导出最近的学期时沿用它原来的起点"""
+    if manifest is None:
+        return {}
+    terms = manifest['terms']
+    if term in terms:
+        latest = list(terms)[-1]
+        if term != latest:
+            raise AnalyticsExportError(f"学期 {term} 之后已导出学期 {latest}，只能重新导出最近的学期")
+        return {name: bounds[0] for name, bounds in terms[term].get('row_ranges', {}).items()}
+    return dict(manifest.get('high_water', {}))
+
+
+def _versions_path(output_dir, name, term, file_format):
+    return os.path.join(output_dir, name, f"{VERSIONS_PREFIX}{term}.{file_format}")
+
+
+def _baseline_versions(output_dir, file_format, manifest, term):
+    """对比用的记录版本号 {事实表: {row_id: row_version}}
+
+    新学期与最近导出的学期对比，重新导出最近的学期时与它之前的学期对比；
+    没有可对比的学期（或版本号文件缺失）的事实表不在结果中，之前导出过的记录都不再导出。
+    """
+    if manifest is None:
+        return {}
+    earlier = [name for name in manifest['terms'] if name != term]
+    if not earlier:
+        return {}
+    baselines = {}
+    for name in FACTS:
+        path = _versions_path(output_dir, name, earlier[-1], file_format)
+        if not os.path.exists(path):
+            logger.warning(f"缺少学期 {earlier[-1]} 的记录版本号，{name} 中修改过的旧记录本次不会导出: {path}")
+            continue
+        columns = read_columns(path, VERSION_TYPES)
+        baselines[name] = dict(zip(columns['row_id'].values, columns['row_version'].values))
+    return baselines
+
+
+def _prune_versions(output_dir, file_format, manifest):
+    """只保留最近两个学期的记录版本号（重新导出最近的学期时需要它之前那个学期的）"""
+    keep = {f"{VERSIONS_PREFIX}{term}.{file_format}" for term in list(manifest['terms'])[-2:]}
+    for name in FACTS:
+        for file_name in os.listdir(os.path.join(output_dir, name)):
+            if file_name.startswith(VERSIONS_PREFIX) and file_name not in keep:
+                try:
+                    os.remove(os.path.join(output_dir, name, file_name))
+                except OSError as e:
+                    logger.warning(f"删除旧的记录版本号文件错误: {str(e)}")
+
+
+def export_analytics(db_path, output_dir, term, file_format=None):
+    """导出一个学期的分析数据到 output_dir，返回更新后的清单
+
+    file_format 为 None 时沿用输出目录已有的格式，新目录按 available_format() 选择。
+    """
+    if not TERM_PATTERN.fullmatch(term or ""):
+        raise AnalyticsExportError(f"学期名称只能包含文字、数字、下划线和短横线: {term!r}")
+    manifest = read_manifest(output_dir)
+    if manifest is not None:
+        if manifest.get('format_version') != ANALYTICS_FORMAT_VERSION:
+            raise AnalyticsExportError(
+                f"输出目录是旧版本（{manifest.get('format_version')}）的导出，事实表没有 row_id 列，请导出到新的目录"
+            )
+        if file_format and file_format != manifest['format']:
+            raise AnalyticsExportError(f"输出目录中已是 {manifest['format']} 格式，不能追加 {file_format} 格式的数据")
+        file_format = manifest['format']
+    file_format = file_format or available_format()
+    if file_format not in FORMATS:
+        raise AnalyticsExportError(f"不支持的格式: {file_format}")
+    if file_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise AnalyticsExportError("写入 Parquet 需要安装 pyarrow")
+
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    low_marks = _term_low_marks(manifest, term)
+    baselines = _baseline_versions(output_dir, file_format, manifest, term)
+    dimensions = _load_dimensions(output_dir, file_format, manifest)
+
+    # 从同一份快照读取全部数据，各表一致；读取期间不占用数据库的锁
+    with tempfile.TemporaryDirectory(prefix='analytics-') as tmp:
+        snapshot_path = os.path.join(tmp, 'snapshot.db')
+        try:
+            snapshot_database(db_path, snapshot_path)
+            conn = connect_snapshot(snapshot_path)
+        except sqlite3.Error as e:
+            raise AnalyticsExportError(f"读取数据库失败: {str(e)}")
+        try:
+            for name, (sql, id_column, columns) in DIMENSIONS.items():
+                for row in conn.execute(sql):
+                    dimensions[name].update(dict(zip(columns, row)))
+
+            facts = {}
+            high_marks = {}
+            versions = {}
+            updated = {}
+            conn.execute("CREATE TEMP TABLE changed_rows (row_id INTEGER PRIMARY KEY)")
+            for name, (sql, (table, id_column), value_types) in FACTS.items():
+                high_marks[name] = conn.execute(f"SELECT COALESCE(MAX({id_column}), 0) FROM {table}").fetchone()[0]
+                low = low_marks.get(name, 0)
+                versions[name] = conn.execute(
+                    f"SELECT {id_column}, row_version FROM {table} WHERE {id_column} <= ? ORDER BY {id_column}",
+                    (high_marks[name],)
+                ).fetchall()
+                # 之前导出过、之后版本号变了的记录（对比的学期中没有的也算）
+                baseline = baselines.get(name)
+                changed = [] if baseline is None else [
+                    (row_id,) for row_id, version in versions[name] if row_id <= low and baseline.get(row_id) != version
+                ]
+                updated[name] = len(changed)
+                conn.execute("DELETE FROM temp.changed_rows")
+                conn.executemany("INSERT INTO temp.changed_rows VALUES (?)", changed)
+                rows = conn.execute(sql, (low, high_marks[name])).fetchall()
+                students, classes, courses = dimensions['students'], dimensions['classes'], dimensions['courses']
+                columns = {
+                    'student_key': Column('int', array('i', (students.key(row[0]) for row in rows))),
+                    'class_key': Column('int', array('i', (classes.key(row[1]) for row in rows))),
+                    'course_key': Column('int', array('i', (courses.key(row[2]) for row in rows))),
+                }
+                for index, (column, kind) in enumerate(value_types, 3):
+                    columns[column] = _build_column(kind, (row[index] for row in rows))
+                facts[name] = columns
+        finally:
+            conn.close()
+
+    # 先写事实表，最后写维度表和清单：中途失败时已有的学期文件仍能与旧的维度表对应
+    rows = {}
+    for name, columns in facts.items():
+        os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+        _write_file(os.path.join(output_dir, name, f"{term}.{file_format}"), columns, file_format)
+        rows[name] = len(columns['student_key'])
+        _write_file(_versions_path(output_dir, name, term, file_format), {
+            'row_id': Column('int', array('i', (row[0] for row in versions[name]))),
+            'row_version': Column('int', array('i', (row[1] for row in versions[name]))),
+        }, file_format)
+    for name, dimension in dimensions.items():
+        _write_file(os.path.join(output_dir, f"dim_{name}.{file_format}"),
+                    _dimension_columns(dimension, dimensions), file_format)
+
+    manifest = manifest or {'format_version': ANALYTICS_FORMAT_VERSION, 'format': file_format, 'terms': {}}
+    manifest['terms'][term] = {
+        'exported_at': datetime.now().isoformat(timespec='seconds'),
+        'rows': rows,
+        'updated_rows': updated,
+        'row_ranges': {name: [low_marks.get(name, 0), high_marks[name]] for name in FACTS},
+    }
+    manifest['high_water'] = high_marks
+    manifest['dimensions'] = {name: len(dimension.rows) for name, dimension in dimensions.items()}
+    partial = os.path.join(output_dir, MANIFEST_NAME + '.partial')
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(partial, os.path.join(output_dir, MANIFEST_NAME))
+    _prune_versions(output_dir, file_format, manifest)
+
+    logger.info(f"已导出学期 {term} 的分析数据到 {output_dir}（{file_format}）",
+                **timing_extra("导出分析数据", time.perf_counter() - start, rows=sum(rows.values()),
+                               format=file_format))
+    return manifest
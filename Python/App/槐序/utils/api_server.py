@@ -0,0 +1,333 @@
+"""
+本地只读 JSON 接口（供其他系统读取学生、名单、成绩和报表）
+
+    python main.py [--db 数据库] serve --host 127.0.0.1 --port 8765
+
+    GET /api/classes
+    GET /api/courses
+    GET /api/students?class_id=&after=&limit=
+    GET /api/rosters?course_id=&class_id=&after=&limit=
+    GET /api/scores?course_id=&student_id=&exam_type=&after=&limit=
+    GET /api/reports?course_id=&class_id=
+
+列表按主键分页: 响应中的 next 非空时，作为下一次请求的 after 参数。
+ETag 由相关数据表的版本号和请求参数计算，数据未变化时带 If-None-Match 请求返回 304。
+"""
+
+import os
+import json
+import gzip
+import queue
+import hashlib
+import logging
+import sqlite3
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+from database.data_version import get_table_versions
+from utils.report_builder import REPORT_HEADERS, build_course_report, report_statistics
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 响应体超过该字节数且客户端支持时使用 gzip 压缩
+GZIP_MIN_SIZE = 1024
+
+REPORT_FIELDS = ['student_id', 'name', 'daily_score', 'midterm_score', 'final_score',
+                 'total_score', 'level', 'rank']
+
+# 资源名 -> (依赖的数据表, 处理函数)，由 resource 装饰器注册
+RESOURCES = {}
+
+
+class ApiError(Exception):
+    """请求参数错误或资源不存在"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def resource(name, tables):
+    """注册接口资源；处理函数 (conn, params) 返回可序列化为 JSON 的对象"""
+
+    def decorator(func):
+        RESOURCES[name] = (tuple(tables), func)
+        return func
+
+    return decorator
+
+
+def _int_param(params, name, required=False):
+    value = params.get(name)
+    if value is None or value == "":
+        if required:
+            raise ApiError(f"缺少参数: {name}")
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(f"参数 {name} 应为整数: {value}")
+
+
+def _page_size(params):
+    limit = _int_param(params, 'limit')
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    if limit <= 0:
+        raise ApiError("参数 limit 应大于 0")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _page(cursor, sql, args, limit, fields, key_field):
+    """执行按主键排序的查询，多取一行判断是否还有下一页"""
+    cursor.execute(f"{sql} LIMIT ?", (*args, limit + 1))
+    rows = cursor.fetchall()
+    items = [dict(zip(fields, row)) for row in rows[:limit]]
+    next_key = items[-1][key_field] if len(rows) > limit else None
+    return {'items': items, 'next': next_key}
+
+
+@resource('classes', ('classes',))
+def get_classes(conn, params):
+    cursor = conn.cursor()
+    cursor.execute("SELECT class_id, class_name, grade, major FROM classes ORDER BY class_id")
+    return {'items': [dict(zip(('class_id', 'class_name', 'grade', 'major'), row))
+                      for row in cursor.fetchall()], 'next': None}
+
+
+@resource('courses', ('courses', 'course_class'))
+def get_courses(conn, params):
+    cursor = conn.cursor()
+    cursor.execute("""
+                   SELECT c.course_id, c.course_name, c.credit, c.course_type, GROUP_CONCAT(cc.class_id)
+                   FROM courses c
+                            LEFT JOIN course_class cc ON cc.course_id = c.course_id
+                   GROUP BY c.course_id
+                   ORDER BY c.course_id
+                   """)
+    items = []
+    for course_id, course_name, credit, course_type, class_ids in cursor.fetchall():
+        items.append({
+            'course_id': course_id, 'course_name': course_name, 'credit': credit,
+            'course_type': course_type,
+            'class_ids': sorted(int(class_id) for class_id in class_ids.split(',')) if class_ids else [],
+        })
+    return {'items': items, 'next': None}
+
+
+STUDENT_FIELDS = ('student_id', 'name', 'gender', 'class_id', 'class_name', 'admission_date')
+
+
+@resource('students', ('students', 'classes'))
+def get_students(conn, params):
+    class_id = _int_param(params, 'class_id')
+    conditions, args = ["s.student_id > ?"], [params.get('after') or ""]
+    if class_id is not None:
+        conditions.append("s.class_id = ?")
+        args.append(class_id)
+    sql = f"""
+        SELECT s.student_id, s.name, s.gender, s.class_id, c.class_name, s.admission_date
+        FROM students s
+                 LEFT JOIN classes c ON s.class_id = c.class_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY s.student_id
+        """
+    return _page(conn.cursor(), sql, args, _page_size(params), STUDENT_FIELDS, 'student_id')
+
+
+@resource('rosters', ('students', 'classes', 'course_class'))
+def get_roster(conn, params):
+    """选修课程的学生名单（课程关联的各班级学生）"""
+    course_id = _int_param(params, 'course_id', required=True)
+    class_id = _int_param(params, 'class_id')
+    conditions, args = ["cc.course_id = ?", "s.student_id > ?"], [course_id, params.get('after') or ""]
+    if class_id is not None:
+        conditions.append("s.class_id = ?")
+        args.append(class_id)
+    sql = f"""
+        SELECT s.student_id, s.name, s.gender, s.class_id, c.class_name, s.admission_date
+        FROM course_class cc
+                 JOIN students s ON s.class_id = cc.class_id
+                 JOIN classes c ON c.class_id = cc.class_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY s.student_id
+        """
+    result = _page(conn.cursor(), sql, args, _page_size(params), STUDENT_FIELDS, 'student_id')
+    result['course_id'] = course_id
+    return result
+
+
+@resource('scores', ('scores',))
+def get_scores(conn, params):
+    conditions, args = ["score_id > ?"], [_int_param(params, 'after') or 0]
+    course_id = _int_param(params, 'course_id')
+    if course_id is not None:
+        conditions.append("course_id = ?")
+        args.append(course_id)
+    for name in ('student_id', 'exam_type'):
+        if params.get(name):
+            conditions.append(f"{name} = ?")
+            args.append(params[name])
+    sql = f"""
+        SELECT score_id, student_id, course_id, exam_type, score
+        FROM scores
+        WHERE {' AND '.join(conditions)}
+        ORDER BY score_id
+        """
+    return _page(conn.cursor(), sql, args, _page_size(params),
+                 ('score_id', 'student_id', 'course_id', 'exam_type', 'score'), 'score_id')
+
+
+@resource('reports', ('students', 'scores', 'course_class', 'classroom_activities', 'classroom_scores'))
+def get_report(conn, params):
+    """课程、班级的成绩报表（与界面和命令行导出的报表相同）"""
+    course_id = _int_param(params, 'course_id', required=True)
+    class_id = _int_param(params, 'class_id', required=True)
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM course_class WHERE course_id = ? AND class_id = ?", (course_id, class_id))
+    if cursor.fetchone() is None:
+        raise ApiError(f"班级 {class_id} 没有课程 {course_id}", 404)
+    rows = build_course_report(conn, course_id, class_id)
+    return {
+        'course_id': course_id,
+        'class_id': class_id,
+        'headers': REPORT_HEADERS,
+        'items': [dict(zip(REPORT_FIELDS, row)) for row in rows],
+        'statistics': report_statistics(rows),
+        'next': None,
+    }
+
+
+class _ConnectionPool:
+    """只读连接池，请求线程之间复用连接"""
+
+    def __init__(self, db_path, size=8):
+        self.uri = f"{Path(os.path.abspath(db_path)).as_uri()}?mode=ro"
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout = 5000")
+            return conn
+
+    def release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def make_etag(name, params, versions):
+    """由资源名、请求参数和数据表版本号计算强 ETag"""
+    key = json.dumps([name, sorted(params.items()), sorted(versions.items())], ensure_ascii=False)
+    return '"' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:24] + '"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class _ApiRequestHandler(BaseHTTPRequestHandler):
+    server_version = "HuaixuAPI/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if len(parts) != 2 or parts[0] != 'api' or parts[1] not in RESOURCES:
+            self._send_json(404, {'error': f"未知的接口: {url.path}"})
+            return
+
+        name = parts[1]
+        tables, handler = RESOURCES[name]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        pool = self.server.pool
+        conn = pool.acquire()
+        try:
+            # 在同一个读事务中读取版本号和数据，保证 ETag 与返回的数据一致
+            conn.execute("BEGIN")
+            etag = make_etag(name, params, get_table_versions(conn, tables))
+            if _etag_matches(self.headers.get('If-None-Match'), etag):
+                self._send_not_modified(etag)
+                return
+            self._send_json(200, handler(conn, params), etag)
+        except ApiError as e:
+            self._send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            self.server.logger.error(f"处理接口请求 {self.path} 错误: {str(e)}")
+            self._send_json(500, {'error': "服务器内部错误"})
+        finally:
+            conn.rollback()
+            pool.release(conn)
+
+    def _send_not_modified(self, etag):
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+    def _send_json(self, status, data, etag=None):
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Vary', 'Accept-Encoding')
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if len(body) >= GZIP_MIN_SIZE and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(f"{self.address_string()} {format % args}")
+
+
+class GradeApiServer(ThreadingHTTPServer):
+    """只读 JSON 接口服务，每个请求在单独的线程中处理
+
+    可以在命令行中 serve_forever 运行，也可以 start 在后台线程中运行。
+    """
+    daemon_threads = True
+
+    def __init__(self, db_path, host='127.0.0.1', port=8765):
+        self.logger = logging.getLogger(__name__)
+        self.pool = _ConnectionPool(db_path)
+        self._thread = None
+        super().__init__((host, port), _ApiRequestHandler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程中运行"""
+        self._thread = threading.Thread(target=self.serve_forever, name="GradeApiServer", daemon=True)
+        self._thread.start()
+        self.logger.info(f"接口服务已启动: {self.url}")
+
+    def stop(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+        self.pool.close()
@@ -0,0 +1,122 @@
+import os
+import hashlib
+import threading
+import zipfile
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+# 压缩包内文件的路径写法: "作业.zip!/src/main.py"
+MEMBER_SEPARATOR = "!/"
+ARCHIVE_EXTENSIONS = ('.zip',)
+
+ArchiveMember = namedtuple('ArchiveMember', ['name', 'size', 'compress_size', 'date_time'])
+
+
+def is_archive(file_name):
+    """判断文件是否为支持检查的压缩包"""
+    return file_name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def join_member_path(archive_name, member_name):
+    """拼接压缩包内文件的显示路径"""
+    return f"{archive_name}{MEMBER_SEPARATOR}{member_name}"
+
+
+def split_member_path(path):
+    """拆分压缩包内文件路径，返回 (压缩包路径, 成员名)；普通文件成员名为 None"""
+    if MEMBER_SEPARATOR in path:
+        archive_path, member_name = path.split(MEMBER_SEPARATOR, 1)
+        return archive_path, member_name
+    return path, None
+
+
+class ArchiveInspector:
+    """压缩包检查工具
+
+    只读取 zip 的中央目录获取文件列表，成员内容以流的方式读取，
+    不解压到磁盘。文件列表按 (大小, 修改时间) 缓存，大压缩包只读一次。
+    """
+
+    def __init__(self, max_archives=256):
+        self.max_archives = max_archives
+        self._listings = OrderedDict()  # 路径 -> ((大小, 修改时间), 成员列表)
+        self._lock = threading.Lock()
+
+    def _stat_key(self, archive_path):
+        stat = os.stat(archive_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def list_members(self, archive_path):
+        """获取压缩包内的文件列表（不含目录），损坏的压缩包返回空列表"""
+        archive_path = os.path.abspath(archive_path)
+        try:
+            key = self._stat_key(archive_path)
+        except OSError:
+            self.invalidate(archive_path)
+            return []
+
+        with self._lock:
+            cached = self._listings.get(archive_path)
+            if cached and cached[0] == key:
+                self._listings.move_to_end(archive_path)
+                return cached[1]
+
+        try:
+            with zipfile.ZipFile(archive_path) as zf:
+                members = [
+                    ArchiveMember(info.filename, info.file_size, info.compress_size, info.date_time)
+                    for info in zf.infolist() if not info.is_dir()
+                ]
+        except (zipfile.BadZipFile, OSError):
+            members = []
+
+        with self._lock:
+            self._listings[archive_path] = (key, members)
+            self._listings.move_to_end(archive_path)
+            while len(self._listings) > self.max_archives:
+                self._listings.popitem(last=False)
+        return members
+
+    def member_names(self, archive_path):
+        """获取压缩包内的文件名列表"""
+        return [member.name for member in self.list_members(archive_path)]
+
+    @contextmanager
+    def open_member(self, archive_path, member_name):
+        """以流的方式打开压缩包内的文件"""
+        with zipfile.ZipFile(archive_path) as zf:
+            with zf.open(member_name) as f:
+                yield f
+
+    def iter_member_chunks(self, archive_path, member_name, chunk_size=64 * 1024):
+        """分块读取压缩包内的文件"""
+        with self.open_member(archive_path, member_name) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def read_member_head(self, archive_path, member_name, max_bytes):
+        """读取压缩包内文件的开头部分（用于预览）"""
+        with self.open_member(archive_path, member_name) as f:
+            return f.read(max_bytes)
+
+    def hash_member(self, archive_path, member_name, algorithm='sha256'):
+        """计算压缩包内文件的摘要"""
+        digest = hashlib.new(algorithm)
+        for chunk in self.iter_member_chunks(archive_path, member_name):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def invalidate(self, archive_path=None):
+        """清除缓存的文件列表，不指定路径时全部清除"""
+        with self._lock:
+            if archive_path is None:
+                self._listings.clear()
+            else:
+                self._listings.pop(os.path.abspath(archive_path), None)
+
+
+# 全局共享实例
+archive_inspector = ArchiveInspector()
@@ -0,0 +1,329 @@
+"""
+命令行批处理（不创建任何窗口）
+
+    python main.py [--db 数据库] import-students 学生.xlsx --class-name 一班
+    python main.py [--db 数据库] import-grades 成绩.csv
+    python main.py [--db 数据库] export-reports --output reports --format xlsx
+    python main.py [--db 数据库] stats
+    python main.py [--db 数据库] backup [--output backups/] [--compress]
+    python main.py [--db 数据库] restore [备份文件]
+    python main.py [--db 数据库] list-backups
+    python main.py [--db 数据库] export-data [--output 导出.zip]
+    python main.py [--db 数据库] export-analytics --term 2026秋 [--output analytics/]
+    python main.py [--db 数据库] maintenance [--vacuum]
+    python main.py [--db 数据库] serve --port 8765
+"""
+
+import os
+import csv
+import time
+import logging
+from datetime import datetime
+from database.db_conn import create_connection, close_connection, get_database_path
+from database.db_init import initialize_database
+from database.maintenance import (
+    MAINTENANCE_TASKS, MaintenanceError, run_maintenance, format_report, needs_vacuum
+)
+from database.backup import (
+    KEEP_BACKUPS, RESTORE_LABEL, BackupError, backup_to_file, create_backup, list_backups, restore_backup
+)
+from database.importers import (
+    read_table_rows, parse_student_rows, import_students, parse_grade_rows, import_grades
+)
+from utils.analytics_export import FORMATS, AnalyticsExportError, export_analytics
+from utils.data_export import DataExportError, export_database, verify_export
+from utils.log_utils import timing_extra
+from utils.report_builder import (
+    REPORT_HEADERS, build_course_report, report_statistics, format_statistics, list_course_classes
+)
+
+logger = logging.getLogger(__name__)
+
+# 子命令名 -> 处理函数，由 add_batch_arguments 注册
+BATCH_COMMANDS = {}
+
+
+class BatchError(Exception):
+    """批处理参数或数据错误（输出错误信息并以非零状态退出）"""
+
+
+def _resolve_class_id(conn, args):
+    if args.class_id is not None:
+        return args.class_id
+    if args.class_name:
+        cursor = conn.cursor()
+        cursor.execute("SELECT class_id FROM classes WHERE class_name = ?", (args.class_name,))
+        row = cursor.fetchone()
+        if row is None:
+            raise BatchError(f"班级不存在: {args.class_name}")
+        return row[0]
+    return None
+
+
+def cmd_import_students(conn, args):
+    """批量导入学生"""
+    students = parse_student_rows(read_table_rows(args.file))
+    if not students:
+        raise BatchError("文件中没有找到有效学生数据")
+    class_id = _resolve_class_id(conn, args)
+    try:
+        imported, duplicates = import_students(conn, students, class_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"成功导入 {len(imported)} 名学生，跳过 {len(duplicates)} 名已存在的学生")
+
+
+def cmd_import_grades(conn, args):
+    """批量导入成绩"""
+    grades, errors = parse_grade_rows(conn, read_table_rows(args.file), args.exam_type)
+    for error in errors:
+        print(error)
+    if errors and not args.skip_errors:
+        raise BatchError(f"有 {len(errors)} 行数据无效，未导入（可加 --skip-errors 跳过无效行）")
+    try:
+        count = import_grades(conn, grades)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"成功导入 {count} 条成绩")
+
+
+def _write_report(path, rows, file_format):
+    if file_format == 'csv':
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(REPORT_HEADERS)
+            writer.writerows(rows)
+    else:
+        # openpyxl 导入较慢，用到时再导入
+        from utils.excel_utils import export_grades_to_excel
+        export_grades_to_excel(REPORT_HEADERS, [[value if value is not None else "" for value in row]
+                                                for row in rows], path)
+
+
+def _selected_course_classes(conn, args):
+    pairs = list_course_classes(conn)
+    if args.course_id is not None:
+        pairs = [p for p in pairs if p[0] == args.course_id]
+    if args.class_id is not None:
+        pairs = [p for p in pairs if p[2] == args.class_id]
+    return pairs
+
+
+def cmd_export_reports(conn, args):
+    """导出全部（或指定）课程、班级的成绩报表"""
+    os.makedirs(args.output, exist_ok=True)
+    pairs = _selected_course_classes(conn, args)
+    for course_id, course_name, class_id, class_name in pairs:
+        rows = build_course_report(conn, course_id, class_id)
+        path = os.path.join(args.output, f"{course_name}_{class_name}_成绩报表.{args.format}")
+        _write_report(path, rows, args.format)
+        print(f"{path}: {len(rows)} 名学生")
+    print(f"共导出 {len(pairs)} 份报表")
+
+
+def cmd_stats(conn, args):
+    """输出各课程、班级的成绩统计"""
+    for course_id, course_name, class_id, class_name in _selected_course_classes(conn, args):
+        stats = report_statistics(build_course_report(conn, course_id, class_id))
+        print(f"{course_name} / {class_name}: {format_statistics(stats)}")
+
+
+def cmd_backup(conn, args):
+    """在线备份数据库（备份期间其他程序可以继续读写）"""
+    db_path = get_database_path(conn)
+    if not db_path:
+        raise BatchError("内存数据库不能备份")
+    target = args.output
+    try:
+        if target and not os.path.isdir(target) and not target.endswith(os.sep):
+            path = backup_to_file(db_path, target, compress=args.compress or target.endswith('.gz'))
+        else:
+            path = create_backup(db_path, target, keep=args.keep, compress=args.compress)
+    except BackupError as e:
+        raise BatchError(str(e))
+    print(f"已备份到 {path}")
+
+
+def cmd_restore(conn, args):
+    """从快照恢复数据库（恢复前自动备份当前数据库）"""
+    db_path = get_database_path(conn)
+    if not db_path:
+        raise BatchError("内存数据库不能恢复")
+    snapshot = args.snapshot
+    if snapshot is None:
+        # 恢复前自动生成的备份不作为默认选择，避免再次执行时撤销上一次恢复
+        backups = [path for path, _, _ in list_backups(db_path, args.backup_dir)
+                   if RESTORE_LABEL not in os.path.basename(path)]
+        if not backups:
+            raise BatchError("没有找到备份")
+        snapshot = backups[0]
+    close_connection(conn)
+    try:
+        safety = restore_backup(snapshot, db_path, keep_current=not args.no_safety_backup)
+    except BackupError as e:
+        raise BatchError(str(e))
+    print(f"已从 {snapshot} 恢复数据库")
+    if safety:
+        print(f"恢复前的数据库已备份到 {safety}")
+
+
+def cmd_list_backups(conn, args):
+    """列出数据库的快照"""
+    backups = list_backups(get_database_path(conn), args.backup_dir)
+    for path, when, size in backups:
+        print(f"{when:%Y-%m-%d %H:%M:%S}  {size / 1024:10.0f} KB  {path}")
+    print(f"共 {len(backups)} 份备份")
+
+
+def cmd_export_data(conn, args):
+    """导出全部数据（各表和成绩报表）到一个带清单的 zip 文件"""
+    db_path = get_database_path(conn)
+    if not db_path:
+        raise BatchError("内存数据库不能导出")
+    output = args.output or f"数据导出-{datetime.now():%Y%m%d-%H%M%S}.zip"
+    try:
+        manifest = export_database(db_path, output)
+        verify_export(output)
+    except DataExportError as e:
+        raise BatchError(str(e))
+    for entry in manifest['files']:
+        print(f"{entry['file']:<40} {entry['rows']:8d} 行")
+    print(f"已导出 {len(manifest['files'])} 个文件到 {output}")
+
+
+def cmd_export_analytics(conn, args):
+    """按学期导出成绩、课堂评分和作业的列式分析数据（Parquet 或 npz），可多次导出不同学期"""
+    db_path = get_database_path(conn)
+    if not db_path:
+        raise BatchError("内存数据库不能导出")
+    try:
+        manifest = export_analytics(db_path, args.output, args.term, args.format)
+    except AnalyticsExportError as e:
+        raise BatchError(str(e))
+    exported = manifest['terms'][args.term]
+    for name, count in exported['rows'].items():
+        print(f"{name:<24} {count:8d} 行（其中修改过的旧记录 {exported['updated_rows'][name]} 行）")
+    print(f"已导出学期 {args.term} 到 {args.output}（{manifest['format']}，共 {len(manifest['terms'])} 个学期）")
+
+
+def cmd_maintenance(conn, args):
+    """数据库维护：完整性检查、重建汇总表、更新统计信息、回收空闲页，可选 VACUUM
+
+    输出维护前后的数据库页统计和常用查询耗时，维护记录写入 maintenance_log 表。
+    """
+    try:
+        report = run_maintenance(conn, MAINTENANCE_TASKS, vacuum=args.vacuum)
+    except MaintenanceError as e:
+        raise BatchError(str(e))
+    print(format_report(report))
+    if not args.vacuum and needs_vacuum(report['stats_after']):
+        print("提示: 使用 --vacuum 整理数据库文件并切换到增量 auto_vacuum")
+
+
+def cmd_serve(conn, args):
+    """启动本地只读 JSON 接口，按 Ctrl+C 停止"""
+    from utils.api_server import GradeApiServer
+
+    db_path = get_database_path(conn)
+    if not db_path:
+        raise BatchError("内存数据库不能提供接口服务")
+    try:
+        server = GradeApiServer(db_path, args.host, args.port)
+    except OSError as e:
+        raise BatchError(f"无法监听 {args.host}:{args.port}: {str(e)}")
+    print(f"接口服务已启动: {server.url}/api/ （按 Ctrl+C 停止）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    print("接口服务已停止")
+
+
+def add_batch_arguments(parser):
+    """在主程序参数中添加批处理子命令"""
+    subparsers = parser.add_subparsers(dest='command', metavar='命令',
+                                       help='以命令行方式执行批处理任务，不显示界面')
+
+    def add(name, func, help_text):
+        sub = subparsers.add_parser(name, help=help_text, description=help_text)
+        BATCH_COMMANDS[name] = func
+        return sub
+
+    sub = add('import-students', cmd_import_students, '从 Excel/CSV 批量导入学生（第一列学号，第二列姓名）')
+    sub.add_argument('file')
+    group = sub.add_mutually_exclusive_group()
+    group.add_argument('--class-id', type=int)
+    group.add_argument('--class-name')
+
+    sub = add('import-grades', cmd_import_grades, '从 Excel/CSV 批量导入成绩（学号、课程ID或名称、成绩、考试类型）')
+    sub.add_argument('file')
+    sub.add_argument('--exam-type', default='期末', help='文件中未写考试类型时使用')
+    sub.add_argument('--skip-errors', action='store_true', help='跳过无效行，导入其余成绩')
+
+    for name, func, help_text in (
+            ('export-reports', cmd_export_reports, '导出各课程、班级的成绩报表'),
+            ('stats', cmd_stats, '输出各课程、班级的成绩统计')):
+        sub = add(name, func, help_text)
+        sub.add_argument('--course-id', type=int)
+        sub.add_argument('--class-id', type=int)
+        if name == 'export-reports':
+            sub.add_argument('--output', default='reports', help='输出目录')
+            sub.add_argument('--format', choices=('xlsx', 'csv'), default='xlsx')
+
+    sub = add('backup', cmd_backup, '在线备份数据库')
+    sub.add_argument('--output', help='备份文件路径或目录（默认数据库所在目录下的 backups/）')
+    sub.add_argument('--compress', action='store_true', help='用 gzip 压缩备份文件')
+    sub.add_argument('--keep', type=int, default=KEEP_BACKUPS, help='备份目录中保留的备份份数')
+
+    sub = add('restore', cmd_restore, '从备份恢复数据库')
+    sub.add_argument('snapshot', nargs='?', help='备份文件（默认最新的备份）')
+    sub.add_argument('--backup-dir', help='备份目录（默认数据库所在目录下的 backups/）')
+    sub.add_argument('--no-safety-backup', action='store_true', help='恢复前不备份当前数据库')
+
+    sub = add('list-backups', cmd_list_backups, '列出数据库的备份')
+    sub.add_argument('--backup-dir', help='备份目录（默认数据库所在目录下的 backups/）')
+
+    sub = add('export-data', cmd_export_data, '导出全部数据（各表和成绩报表，带清单和校验和）')
+    sub.add_argument('--output', help='导出文件路径（默认当前目录下的 数据导出-时间.zip）')
+
+    sub = add('export-analytics', cmd_export_analytics, '按学期导出列式分析数据（有 pyarrow 时为 Parquet，否则为 npz）')
+    sub.add_argument('--term', required=True, help='学期名称，如 2026秋；只导出上次导出之后新增的记录，再次导出最近的学期时替换')
+    sub.add_argument('--output', default='analytics', help='输出目录（可多次导出不同学期到同一目录）')
+    sub.add_argument('--format', choices=FORMATS, help='默认沿用输出目录已有的格式')
+
+    sub = add('maintenance', cmd_maintenance, '数据库完整性检查和优化')
+    sub.add_argument('--vacuum', action='store_true', help='同时整理数据库文件（耗时较长）')
+
+    sub = add('serve', cmd_serve, '启动本地只读 JSON 接口（学生、名单、成绩和报表）')
+    sub.add_argument('--host', default='127.0.0.1', help='监听地址（默认只允许本机访问）')
+    sub.add_argument('--port', type=int, default=8765)
+
+
+def run_batch(args):
+    """执行批处理子命令，返回退出码"""
+    conn = create_connection(args.db)
+    if conn is None:
+        return 1
+    try:
+        if not initialize_database(conn):
+            return 1
+        start = time.perf_counter()
+        BATCH_COMMANDS[args.command](conn, args)
+        logger.info(f"批处理 {args.command} 完成",
+                    **timing_extra(f"批处理 {args.command}", time.perf_counter() - start))
+        return 0
+    except BatchError as e:
+        print(f"错误: {str(e)}")
+        return 2
+    except Exception as e:
+        logger.exception(f"批处理 {args.command} 失败")
+        print(f"错误: {str(e)}")
+        return 1
+    finally:
+        close_connection(conn)
@@ -0,0 +1,474 @@
+"""
+性能基准测试
+
+在程序目录下运行: python -m utils.benchmark [名称 ...]
+每项测试有耗时预算，超出预算或检查失败时返回非零退出码，用于发现性能退化。
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import subprocess
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 名称 -> (测试函数, 预算毫秒, 说明)
+BENCHMARKS = {}
+
+# 启动期间和打开各窗口模块时都不应加载的重量级依赖，需在使用相应功能时再导入
+HEAVY_MODULES = ('openpyxl', 'numpy', 'pandas', 'pyarrow')
+
+# 主窗口按需导入的界面模块
+WINDOW_MODULES = (
+    'gui.main_window', 'gui.student_mgmt', 'gui.grade_mgmt', 'gui.assignment_mgmt',
+    'gui.classroom_mgmt', 'gui.report_gen', 'gui.settings_window', 'gui.course_mgmt',
+)
+
+
+def benchmark(name, budget_ms, description=""):
+    """注册基准测试；测试函数返回耗时（毫秒），检查失败时抛出 AssertionError"""
+
+    def decorator(func):
+        BENCHMARKS[name] = (func, budget_ms, description)
+        return func
+
+    return decorator
+
+
+def _run_python(code, *args):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    result = subprocess.run(
+        [sys.executable, *args] + (['-c', code] if code else []),
+        cwd=APP_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise AssertionError(f"子进程执行失败:\n{result.stderr[-2000:]}")
+    return result.stdout
+
+
+@benchmark('startup', 3000, "main.py --test 启动耗时（导入、创建应用程序、加载样式表）")
+def bench_startup():
+    with tempfile.TemporaryDirectory() as tmp:
+        report_path = os.path.join(tmp, 'startup.json')
+        _run_python(None, 'main.py', '--test', '--profile-report', report_path)
+        with open(report_path, encoding='utf-8') as f:
+            report = json.load(f)
+
+    loaded = [name for name in HEAVY_MODULES if name in report['modules_loaded']]
+    assert not loaded, f"启动时加载了重量级模块: {', '.join(loaded)}"
+    return report['total_ms']
+
+
+@benchmark('window_imports', 1500, "导入全部窗口模块的耗时，且不应加载重量级依赖")
+def bench_window_imports():
+    code = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        f"for name in {WINDOW_MODULES!r}:\n"
+        "    __import__(name)\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        f"print(json.dumps({{'ms': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    result = json.loads(_run_python(code).strip().splitlines()[-1])
+    assert not result['heavy'], f"窗口模块导入了重量级模块: {', '.join(result['heavy'])}"
+    return result['ms']
+
+
+def _make_sample_database(path, classes=10, students_per_class=50, courses=8):
+    """生成基准测试用的数据库（班级、学生、课程及各类成绩）"""
+    sys.path.insert(0, APP_DIR)
+    from database.db_conn import create_connection
+    from database.db_init import initialize_database
+
+    conn = create_connection(path)
+    initialize_database(conn)
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO classes (class_name) VALUES (?)",
+                       [(f"班级{i}",) for i in range(classes)])
+    cursor.executemany("INSERT INTO courses (course_name, credit) VALUES (?, 2)",
+                       [(f"课程{i}",) for i in range(courses)])
+    cursor.execute("SELECT class_id FROM classes")
+    class_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT course_id FROM courses")
+    course_ids = [row[0] for row in cursor.fetchall()]
+    cursor.executemany("INSERT OR IGNORE INTO course_class (course_id, class_id) VALUES (?, ?)",
+                       [(course_id, class_id) for course_id in course_ids for class_id in class_ids])
+    students = [(f"B{class_id:03d}{i:04d}", f"学生{i}", class_id)
+                for class_id in class_ids for i in range(students_per_class)]
+    cursor.executemany("INSERT INTO students (student_id, name, class_id) VALUES (?, ?, ?)", students)
+    cursor.executemany(
+        "INSERT INTO scores (student_id, course_id, score, exam_type) VALUES (?, ?, ?, ?)",
+        [(student_id, course_id, (hash((student_id, course_id, exam)) % 60) + 40, exam)
+         for student_id, _, _ in students for course_id in course_ids for exam in ('平时', '期中', '期末')]
+    )
+    conn.commit()
+    cursor.execute("SELECT COUNT(*) FROM course_class")
+    pair_count = cursor.fetchone()[0]
+    conn.close()
+    return pair_count
+
+
+@benchmark('batch_reports', 5000, "命令行导出全部成绩报表（CSV，10 个班级、500 名学生，每个班级约 10 门课程）")
+def bench_batch_reports():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        pair_count = _make_sample_database(db_path)
+        main_path = os.path.join(APP_DIR, 'main.py')
+        start = time.perf_counter()
+        # 在临时目录中运行，日志和输出不写入程序目录
+        result = subprocess.run(
+            [sys.executable, main_path, '--db', db_path, 'export-reports',
+             '--output', os.path.join(tmp, 'reports'), '--format', 'csv'],
+            cwd=tmp, capture_output=True, text=True, timeout=300
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        if result.returncode != 0:
+            raise AssertionError(f"批处理执行失败:\n{result.stderr[-2000:]}")
+        exported = len(os.listdir(os.path.join(tmp, 'reports')))
+        assert exported == pair_count, f"应导出 {pair_count} 份报表，实际 {exported} 份"
+    return elapsed
+
+
+@benchmark('student_export', 15000, "导出 5 万名学生（含班级、课程和成绩汇总列）到 xlsx 和 CSV，内存峰值不应随人数增长")
+def bench_student_export():
+    import tracemalloc
+    sys.path.insert(0, APP_DIR)
+    from utils.student_export import EXPORT_COLUMNS, export_students
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        _make_sample_database(db_path, classes=100, students_per_class=500, courses=2)
+        conn = sqlite3.connect(db_path)
+        elapsed = 0.0
+        for extension in ('xlsx', 'csv'):
+            start = time.perf_counter()
+            count = export_students(conn, os.path.join(tmp, f"students.{extension}"), tuple(EXPORT_COLUMNS))
+            elapsed += (time.perf_counter() - start) * 1000
+            assert count == 50000, f"应导出 50000 名学生，实际 {count} 名"
+
+        # 内存峰值（tracemalloc 会明显拖慢导出，另用 5 个和 50 个班级比较）
+        peaks = {}
+        for classes in (5, 50):
+            for extension in ('xlsx', 'csv'):
+                tracemalloc.start()
+                export_students(conn, os.path.join(tmp, f"part.{extension}"), tuple(EXPORT_COLUMNS),
+                                "s.class_id <= ?", (classes,))
+                peaks[(classes, extension)] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        conn.close()
+
+    # CSV 内存与人数无关；xlsx 的共享字符串表（学号、姓名）仍在内存中，每名学生不应超过 0.5 KB
+    for extension, per_student in (('csv', 0), ('xlsx', 512)):
+        small, large = peaks[(5, extension)], peaks[(50, extension)]
+        assert large - small < 22500 * per_student + 1024 * 1024, \
+            f"{extension} 导出内存随人数增长: 2500 人 {small / 1024:.0f} KB，25000 人 {large / 1024:.0f} KB"
+    return elapsed
+
+
+@benchmark('data_export', 20000, "导出全部数据（5 万名学生、75 万条成绩及成绩报表），导出期间另一连接持续写入不应被长时间阻塞")
+def bench_data_export():
+    import threading
+    sys.path.insert(0, APP_DIR)
+    from utils.data_export import export_database, verify_export
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        _make_sample_database(db_path, classes=100, students_per_class=500, courses=2)
+
+        # 导出期间模拟教师持续录入成绩，记录每次提交的耗时
+        stop = threading.Event()
+        commit_ms = []
+
+        def write_scores():
+            conn = sqlite3.connect(db_path)
+            conn.execute("PRAGMA busy_timeout = 3000")
+            i = 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                conn.execute("UPDATE scores SET score = ? WHERE score_id = 1", (60 + i % 40,))
+                conn.commit()
+                commit_ms.append((time.perf_counter() - start) * 1000)
+                i += 1
+                time.sleep(0.01)
+            conn.close()
+
+        writer = threading.Thread(target=write_scores)
+        writer.start()
+        try:
+            start = time.perf_counter()
+            archive_path = os.path.join(tmp, 'export.zip')
+            manifest = export_database(db_path, archive_path)
+            elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            stop.set()
+            writer.join()
+
+        verify_export(archive_path)
+        conn = sqlite3.connect(db_path)
+        for entry in manifest['files']:
+            table = entry.get('table')
+            if table:
+                count = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                assert entry['rows'] == count, f"{table} 应导出 {count} 行，实际 {entry['rows']} 行"
+        conn.close()
+
+    assert commit_ms and max(commit_ms) < 1000, f"导出期间写入被阻塞 {max(commit_ms):.0f} ms"
+    return elapsed
+
+
+@benchmark('analytics_export', 3000, "列式导出 5000 名学生的 7.5 万条成绩并读回，与用 excel_utils 导出、openpyxl 读取同样数据的 xlsx 对比")
+def bench_analytics_export():
+    sys.path.insert(0, APP_DIR)
+    from utils.analytics_export import export_analytics, read_dataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        _make_sample_database(db_path, classes=50, students_per_class=100, courses=2)
+
+        start = time.perf_counter()
+        manifest = export_analytics(db_path, os.path.join(tmp, 'analytics'), 'bench')
+        scores = read_dataset(os.path.join(tmp, 'analytics'), 'scores', 'bench')
+        columnar_ms = (time.perf_counter() - start) * 1000
+        rows = manifest['terms']['bench']['rows']['scores']
+        assert len(scores['score']) == rows, f"读回 {len(scores['score'])} 行，应为 {rows} 行"
+
+        # 对比：同样的成绩行用 excel_utils 写 xlsx，再用 openpyxl 读回
+        from openpyxl import load_workbook
+        from utils.excel_utils import export_grades_to_excel
+        conn = sqlite3.connect(db_path)
+        data = conn.execute("""
+                            SELECT sc.student_id, s.class_id, sc.course_id, sc.exam_type, sc.score
+                            FROM scores sc
+                                     LEFT JOIN students s ON s.student_id = sc.student_id
+                            """).fetchall()
+        conn.close()
+        start = time.perf_counter()
+        xlsx_path = os.path.join(tmp, 'scores.xlsx')
+        export_grades_to_excel(["学号", "班级", "课程", "考试类型", "成绩"], data, xlsx_path)
+        workbook = load_workbook(xlsx_path, read_only=True)
+        xlsx_rows = sum(1 for _ in workbook.active.iter_rows(values_only=True)) - 1
+        workbook.close()
+        xlsx_ms = (time.perf_counter() - start) * 1000
+        assert xlsx_rows == rows, f"xlsx 读回 {xlsx_rows} 行，应为 {rows} 行"
+
+    assert columnar_ms * 5 < xlsx_ms, f"列式导出 {columnar_ms:.0f} ms，xlsx {xlsx_ms:.0f} ms，应至少快 5 倍"
+    return columnar_ms
+
+
+_TABLE_FILL_CODE = """
+import sys, json, time
+from PyQt5.QtWidgets import QApplication, QPushButton
+from database.db_conn import create_connection
+from gui.grade_mgmt import GradeManagementWindow
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * 4
+    except OSError:
+        return None
+
+
+app = QApplication(sys.argv)
+window = GradeManagementWindow(create_connection({db_path!r}))
+window.show()
+window.course_combo.setCurrentIndex(1)
+window.class_combo.setCurrentIndex(1)
+table = window.grade_table
+app.processEvents()
+table.setRowCount(0)
+app.processEvents()
+
+before = rss_kb()
+start = time.perf_counter()
+window.load_grades()
+if {cell_widgets!r}:
+    # 改用代理之前的做法: 每行一个按钮控件和闭包
+    for row in range(table.rowCount()):
+        edit_btn = QPushButton("编辑")
+        edit_btn.clicked.connect(lambda _, r=row: window.edit_grade(r))
+        table.setCellWidget(row, 3, edit_btn)
+table.viewport().repaint()
+app.processEvents()
+elapsed = (time.perf_counter() - start) * 1000
+after = rss_kb()
+print(json.dumps({{'rows': table.rowCount(), 'ms': elapsed,
+                  'kb': after - before if before is not None else None}}))
+"""
+
+
+@benchmark('table_fill', 1500, "成绩表格填充 2000 名学生共 6000 行并重绘（操作列由代理绘制，对比每行一个按钮控件的耗时和内存）")
+def bench_table_fill():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        _make_sample_database(db_path, classes=1, students_per_class=2000, courses=1)
+        delegate, widgets = [
+            json.loads(_run_python(_TABLE_FILL_CODE.format(db_path=db_path, cell_widgets=cell_widgets))
+                       .strip().splitlines()[-1])
+            for cell_widgets in (False, True)
+        ]
+    # 每名学生平时、期中、期末各一行
+    assert delegate['rows'] == 6000, f"应显示 6000 行，实际 {delegate['rows']} 行"
+    summary = (f"代理 {delegate['ms']:.0f} ms / {delegate['kb']} KB，"
+               f"按钮控件 {widgets['ms']:.0f} ms / {widgets['kb']} KB")
+    assert delegate['ms'] < widgets['ms'], f"代理绘制应比按钮控件快: {summary}"
+    print(summary)
+    return delegate['ms']
+
+
+_SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤单欧阳"
+_GIVEN_CHARS = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华玉萍红娥玲芬建国志明海燕雪梅晓东文博宇轩子涵欣怡浩然思远嘉怡雨萱俊杰天佑梓睿一诺诗涵"
+# 检索词及应找到的学生
+_SEARCH_QUERIES = ('zhangs', 'zs', 'zhangsanfeng', 'zsf', 'zhangsf', 'sanf', '三丰', '张s', 'Zhang San', 'B099999')
+
+
+@benchmark('student_search', 50, "10 万名学生中按拼音、首字母、混合输入、汉字和学号检索（每个检索词耗时的最大值）")
+def bench_student_search():
+    sys.path.insert(0, APP_DIR)
+    from database.db_conn import create_connection
+    from database.db_init import initialize_database
+    from database.search_index import student_search_filter
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_connection(os.path.join(tmp, 'bench.db'))
+        initialize_database(conn)
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO classes (class_name) VALUES ('班级')")
+        class_id = cursor.lastrowid
+        students = [
+            (f"B{i:06d}",
+             _SURNAMES[i % len(_SURNAMES)] + _GIVEN_CHARS[i * 7 % len(_GIVEN_CHARS)]
+             + (_GIVEN_CHARS[i * 13 % len(_GIVEN_CHARS)] if i % 3 else ""),
+             class_id)
+            for i in range(99999)
+        ] + [("B099999", "张三丰", class_id)]
+        cursor.executemany("INSERT INTO students (student_id, name, class_id) VALUES (?, ?, ?)", students)
+        conn.commit()
+        # 重新初始化时为新增的学生生成检索键（与程序启动时相同）
+        initialize_database(conn)
+
+        slowest = 0.0
+        for text in _SEARCH_QUERIES:
+            sql, params = student_search_filter(text)
+            samples = []
+            for _ in range(5):
+                start = time.perf_counter()
+                cursor.execute(f"SELECT s.student_id FROM students s WHERE {sql} ORDER BY s.student_id", params)
+                found = [row[0] for row in cursor.fetchall()]
+                samples.append((time.perf_counter() - start) * 1000)
+            assert "B099999" in found, f"检索 {text!r} 未找到张三丰"
+            slowest = max(slowest, sorted(samples)[len(samples) // 2])
+        conn.close()
+    return slowest
+
+
+def _fetch_all_pages(base_url, path, etags):
+    """分页读取接口的全部数据；etags 中有上次的 ETag 时带 If-None-Match，返回 (记录数, 304 次数)"""
+    import gzip
+    import http.client
+    from urllib.parse import urlsplit, urlencode
+
+    address = urlsplit(base_url)
+    client = http.client.HTTPConnection(address.hostname, address.port, timeout=30)
+    count, not_modified, after = 0, 0, None
+    try:
+        while True:
+            url = path + ('&' if '?' in path else '?') + urlencode({'after': after}) if after is not None else path
+            headers = {'Accept-Encoding': 'gzip'}
+            if url in etags:
+                headers['If-None-Match'] = etags[url]
+            client.request('GET', url, headers=headers)
+            response = client.getresponse()
+            body = response.read()
+            if response.status == 304:
+                not_modified += 1
+                count += etags[url + '#count']
+                after = etags[url + '#next']
+            else:
+                assert response.status == 200, f"{url} 返回 {response.status}: {body[:200]!r}"
+                if response.getheader('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                data = json.loads(body)
+                etags[url] = response.getheader('ETag')
+                etags[url + '#count'] = len(data['items'])
+                etags[url + '#next'] = after = data['next']
+                count += len(data['items'])
+            if after is None:
+                return count, not_modified
+    finally:
+        client.close()
+
+
+@benchmark('api_concurrent', 3000, "8 个并发客户端分页读取接口全部学生和成绩两遍（第二遍应全部返回 304）")
+def bench_api_concurrent():
+    from concurrent.futures import ThreadPoolExecutor
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        _make_sample_database(db_path)
+        from utils.api_server import GradeApiServer
+
+        server = GradeApiServer(db_path, '127.0.0.1', 0)
+        server.start()
+        paths = ['/api/students?limit=200', '/api/scores?limit=1000',
+                 '/api/rosters?course_id=1', '/api/reports?course_id=1&class_id=1'] * 2
+        try:
+            start = time.perf_counter()
+            etag_maps = [{} for _ in paths]
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                first = list(executor.map(lambda i: _fetch_all_pages(server.url, paths[i], etag_maps[i]),
+                                          range(len(paths))))
+                second = list(executor.map(lambda i: _fetch_all_pages(server.url, paths[i], etag_maps[i]),
+                                           range(len(paths))))
+            elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            server.stop()
+
+    assert first[0][0] == 500, f"应读取 500 名学生，实际 {first[0][0]} 名"
+    assert [c for c, _ in first] == [c for c, _ in second], "两遍读取的记录数不一致"
+    assert all(not_modified == 0 for _, not_modified in first), "第一遍不应返回 304"
+    unchanged = [paths[i] for i, (_, not_modified) in enumerate(second) if not_modified == 0]
+    assert not unchanged, f"数据未变化，第二遍应返回 304: {', '.join(unchanged)}"
+    return elapsed
+
+
+def run(names=None):
+    """运行基准测试，返回 [(名称, 耗时毫秒, 预算毫秒, 错误信息)]"""
+    results = []
+    for name, (func, budget_ms, _) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        try:
+            start = time.perf_counter()
+            elapsed = func()
+            if elapsed is None:
+                elapsed = (time.perf_counter() - start) * 1000
+            error = None if elapsed <= budget_ms else f"超出预算 {budget_ms} ms"
+        except AssertionError as e:
+            elapsed, error = None, str(e)
+        results.append((name, elapsed, budget_ms, error))
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    unknown = [name for name in argv if name not in BENCHMARKS]
+    if unknown:
+        print(f"未知的基准测试: {', '.join(unknown)}；可用: {', '.join(BENCHMARKS)}")
+        return 2
+
+    failed = 0
+    for name, elapsed, budget_ms, error in run(argv):
+        elapsed_text = f"{elapsed:8.1f} ms" if elapsed is not None else "       - ms"
+        status = "通过" if error is None else f"失败: {error}"
+        print(f"{name:<20} {elapsed_text}  预算 {budget_ms:6d} ms  {status}")
+        failed += error is not None
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
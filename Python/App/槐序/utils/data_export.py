@@ -0,0 +1,303 @@
+"""
+全部数据导出
+
+    导出文件.zip
+        manifest.json               格式版本、导出时间、数据库版本，以及每个文件的表名、列名、行数、大小和 SHA-256
+        tables/<表名>.csv.gz        数据库中的每张表（拼音检索表可由学生表重新生成，不导出）
+        reports/<报表>.csv.gz       由数据计算的报表：各课程、班级的成绩报表和统计
+
+先用 SQLite 备份接口一次性复制数据库：只在复制期间持有一个读事务，其他客户端的写入只需等待这一小段时间。
+之后多个线程并行读取这份快照、写成压缩的 CSV，所有文件都来自同一时刻的数据。
+"""
+
+import io
+import os
+import csv
+import gzip
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from utils.log_utils import timing_extra
+from utils.report_builder import REPORT_HEADERS, list_course_classes, build_course_report, report_statistics
+
+EXPORT_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# 并行写出的线程数（gzip 压缩时释放 GIL，多个线程能同时压缩）
+EXPORT_WORKERS = 4
+
+# 每次从游标读取的行数
+EXPORT_CHUNK = 1000
+
+# 不导出的表：拼音检索表可由学生表重新生成
+SKIP_TABLES = ('student_search', 'student_search_pending')
+
+# 报表: 名称 -> 列名
+REPORT_COLUMNS = {
+    'course_grades': ["课程ID", "课程", "班级ID", "班级"] + REPORT_HEADERS,
+    'course_statistics': ["课程ID", "课程", "班级ID", "班级", "学生数", "平均分", "最高分", "最低分", "及格率"],
+}
+
+logger = logging.getLogger(__name__)
+
+
+class DataExportError(Exception):
+    """导出失败，或导出文件与清单不符"""
+
+
+def list_export_tables(conn):
+    """需要导出的表（按表名排序）"""
+    cursor = conn.cursor()
+    cursor.execute("""
+                   SELECT name
+                   FROM sqlite_master
+                   WHERE type = 'table'
+                     AND name NOT LIKE 'sqlite_%'
+                   ORDER BY name
+                   """)
+    return [row[0] for row in cursor.fetchall() if row[0] not in SKIP_TABLES]
+
+
+def snapshot_database(db_path, snapshot_path):
+    """一次性复制数据库到 snapshot_path（整个复制在同一个读事务中完成），之后的读取不再占用源数据库的锁"""
+    source = sqlite3.connect(db_path)
+    try:
+        source.execute("PRAGMA busy_timeout = 3000")
+        dest = sqlite3.connect(snapshot_path)
+        try:
+            source.backup(dest)
+            # 报表按班级查询学生，快照中补一个班级索引，不必每个课程、班级都扫描整个学生表
+            dest.execute("CREATE INDEX IF NOT EXISTS idx_export_students_class ON students (class_id, student_id)")
+            dest.commit()
+        finally:
+            dest.close()
+    finally:
+        source.close()
+
+
+def connect_snapshot(snapshot_path):
+    """以只读方式打开快照"""
+    return sqlite3.connect(f"{Path(os.path.abspath(snapshot_path)).as_uri()}?mode=ro", uri=True)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_member(out_dir, member, columns, chunks):
+    """把行块写成压缩的 CSV 文件，返回清单条目"""
+    path = os.path.join(out_dir, member)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    count = 0
+    # mtime 固定为 0：相同的数据得到相同的文件和校验和
+    with gzip.GzipFile(path, 'wb', compresslevel=6, mtime=0) as raw, \
+            io.TextIOWrapper(raw, encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return {'file': member, 'columns': list(columns), 'rows': count,
+            'size': os.path.getsize(path), 'sha256': _sha256(path)}
+
+
+def _export_table(snapshot_path, out_dir, table):
+    conn = connect_snapshot(snapshot_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT * FROM "{table}" ORDER BY rowid' if _has_rowid(conn, table)
+                       else f'SELECT * FROM "{table}"')
+        columns = [description[0] for description in cursor.description]
+        entry = _write_member(out_dir, f"tables/{table}.csv.gz", columns,
+                              iter(lambda: cursor.fetchmany(EXPORT_CHUNK), []))
+    finally:
+        conn.close()
+    entry['table'] = table
+    return entry
+
+
+def _has_rowid(conn, table):
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    return 'WITHOUT ROWID' not in sql.upper()
+
+
+def _export_reports(snapshot_path, out_dir):
+    """各课程、班级的成绩报表和统计（与报表窗口的计算相同）"""
+    conn = connect_snapshot(snapshot_path)
+    try:
+        grades, statistics = [], []
+        for course_id, course_name, class_id, class_name in list_course_classes(conn):
+            prefix = (course_id, course_name, class_id, class_name)
+            rows = build_course_report(conn, course_id, class_id)
+            grades.append([prefix + tuple(row) for row in rows])
+            stats = report_statistics(rows)
+            if stats is not None:
+                statistics.append(prefix + (stats['student_count'], round(stats['average'], 1), stats['max'],
+                                            stats['min'], round(stats['pass_rate'], 1)))
+    finally:
+        conn.close()
+    entries = []
+    for name, chunks in (('course_grades', grades), ('course_statistics', [statistics])):
+        entry = _write_member(out_dir, f"reports/{name}.csv.gz", REPORT_COLUMNS[name], chunks)
+        entry['report'] = name
+        entries.append(entry)
+    return entries
+
+
+def export_database(db_path, archive_path, workers=EXPORT_WORKERS, progress=None):
+    """导出全部数据到 archive_path（zip），返回清单；progress(已完成, 总数) 在每个文件写完后调用"""
+    start = time.perf_counter()
+    archive_dir = os.path.dirname(os.path.abspath(archive_path))
+    os.makedirs(archive_dir, exist_ok=True)
+    partial = os.path.join(archive_dir, f".{os.path.basename(archive_path)}.partial")
+
+    with tempfile.TemporaryDirectory(prefix='export-') as tmp:
+        snapshot_path = os.path.join(tmp, 'snapshot.db')
+        try:
+            snapshot_database(db_path, snapshot_path)
+            conn = connect_snapshot(snapshot_path)
+            try:
+                tables = list_export_tables(conn)
+                user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            raise DataExportError(f"读取数据库失败: {str(e)}")
+        snapshot_ms = (time.perf_counter() - start) * 1000
+
+        out_dir = os.path.join(tmp, 'files')
+        entries = []
+        total = len(tables) + 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_export_table, snapshot_path, out_dir, table) for table in tables]
+            futures.append(executor.submit(_export_reports, snapshot_path, out_dir))
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                entries.extend(result if isinstance(result, list) else [result])
+                if progress is not None:
+                    progress(done, total)
+        entries.sort(key=lambda entry: entry['file'])
+
+        manifest = {
+            'format_version': EXPORT_FORMAT_VERSION,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'database': os.path.basename(db_path),
+            'user_version': user_version,
+            'files': entries,
+        }
+        # 各文件已压缩，直接存入；清单最后写入，只有完整的导出文件才有清单
+        try:
+            with zipfile.ZipFile(partial, 'w', zipfile.ZIP_STORED) as archive:
+                for entry in entries:
+                    archive.write(os.path.join(out_dir, entry['file']), entry['file'])
+                archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2),
+                                 zipfile.ZIP_DEFLATED)
+            os.replace(partial, archive_path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    rows = sum(entry['rows'] for entry in entries)
+    logger.info(f"已导出 {len(entries)} 个文件共 {rows} 行到 {archive_path}",
+                **timing_extra("导出全部数据", time.perf_counter() - start, files=len(entries), rows=rows,
+                               snapshot_ms=round(snapshot_ms, 1)))
+    return manifest
+
+
+def read_manifest(archive_path):
+    with zipfile.ZipFile(archive_path) as archive:
+        try:
+            return json.loads(archive.read(MANIFEST_NAME).decode('utf-8'))
+        except KeyError:
+            raise DataExportError(f"导出文件中没有清单: {archive_path}")
+
+
+def verify_export(archive_path):
+    """按清单检查导出文件中每个文件的校验和与行数，不符时抛出 DataExportError，返回清单"""
+    manifest = read_manifest(archive_path)
+    with zipfile.ZipFile(archive_path) as archive:
+        for entry in manifest['files']:
+            digest = hashlib.sha256()
+            with archive.open(entry['file']) as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            if digest.hexdigest() != entry['sha256']:
+                raise DataExportError(f"{entry['file']} 校验和不符")
+            with archive.open(entry['file']) as f, \
+                    io.TextIOWrapper(gzip.GzipFile(fileobj=f), encoding='utf-8', newline='') as text:
+                rows = sum(1 for _ in csv.reader(text)) - 1
+            if rows != entry['rows']:
+                raise DataExportError(f"{entry['file']} 应有 {entry['rows']} 行，实际 {rows} 行")
+    return manifest
+
+
+class _ExportSignals(QObject):
+    progress = pyqtSignal(int, int)  # 已完成的文件数, 总数
+    finished = pyqtSignal(str, object)  # 导出文件路径, 清单
+    failed = pyqtSignal(str)  # 错误信息
+
+
+class _ExportTask(QRunnable):
+    def __init__(self, db_path, archive_path, signals):
+        super().__init__()
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self.signals = signals
+
+    def run(self):
+        try:
+            manifest = export_database(self.db_path, self.archive_path, progress=self.signals.progress.emit)
+            self.signals.finished.emit(self.archive_path, manifest)
+        except Exception as e:
+            logger.error(f"导出全部数据错误: {str(e)}")
+            self.signals.failed.emit(str(e))
+
+
+class DataExportService(QObject):
+    """在后台线程中导出全部数据，同一时间只执行一个导出任务"""
+    export_progress = pyqtSignal(int, int)
+    export_finished = pyqtSignal(str, object)
+    export_failed = pyqtSignal(str)
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.running = False
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._signals = _ExportSignals()
+        self._signals.progress.connect(self.export_progress)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+
+    def export(self, archive_path):
+        """开始导出，已有导出在进行时返回 False"""
+        if self.running:
+            return False
+        self.running = True
+        self._pool.start(_ExportTask(self.db_path, archive_path, self._signals))
+        return True
+
+    def wait(self):
+        """等待正在进行的导出结束"""
+        self._pool.waitForDone()
+
+    def _on_finished(self, path, manifest):
+        self.running = False
+        self.export_finished.emit(path, manifest)
+
+    def _on_failed(self, error):
+        self.running = False
+        self.export_failed.emit(error)
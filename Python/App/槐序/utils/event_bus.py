@@ -0,0 +1,108 @@
+import logging
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QWidget
+
+# 各数据表变更事件的键:
+#   students: 学号                      classes: 班级ID
+#   courses: 课程ID                     users: 用户ID
+#   course_class: 课程ID
+#   scores: (学号, 课程ID)              classroom_activities: 活动ID
+#   classroom_scores: (活动ID, 学号)    assignment_folders: 文件夹ID
+#   assignment_submissions: (学号, 文件夹ID)
+# 键为 None 表示整张表都可能有变化
+
+
+class DataChangeBus(QObject):
+    """数据变更通知
+
+    写入数据库并提交后调用 publish 发布变更（表名和变化的主键），
+    订阅者只刷新受影响的行或下拉框。同一轮事件循环内的多次发布会合并后统一通知。
+    隐藏的窗口不接收通知，再次显示时由窗口注册表按数据表版本号刷新。
+    """
+    changed = pyqtSignal(str, object)  # 表名, frozenset(键) 或 None
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self._pending = {}  # 表名 -> set(键) 或 None
+        self._sources = {}  # 表名 -> set(发布者)
+        self._subscribers = []  # (订阅者, 表名集合, 处理函数)
+        self._timer = None
+
+    def publish(self, table, keys=None, source=None):
+        """发布数据变更
+
+        keys 为变化记录的主键（单个或可迭代），None 表示整张表；
+        source 为发布者，发布者自己已刷新界面，不再通知它。
+        """
+        if keys is not None and (isinstance(keys, (str, bytes, tuple)) or not hasattr(keys, '__iter__')):
+            keys = [keys]
+
+        if table in self._pending:
+            if self._pending[table] is not None:
+                if keys is None:
+                    self._pending[table] = None
+                else:
+                    self._pending[table].update(keys)
+            self._sources[table].add(source)
+        else:
+            self._pending[table] = None if keys is None else set(keys)
+            self._sources[table] = {source}
+
+        if self._timer is None:
+            self._timer = QTimer(self)
+            self._timer.setSingleShot(True)
+            self._timer.timeout.connect(self.dispatch)
+        if not self._timer.isActive():
+            self._timer.start(0)
+
+    def subscribe(self, subscriber, tables, handler):
+        """订阅数据表变更，handler(表名, frozenset(键) 或 None)
+
+        subscriber 为订阅的 QObject，销毁时自动取消订阅；为 None 时一直有效（用于全局缓存）。
+        """
+        self._subscribers.append((subscriber, frozenset(tables), handler))
+        if isinstance(subscriber, QObject):
+            subscriber.destroyed.connect(lambda _=None, s=subscriber: self.unsubscribe(s))
+
+    def unsubscribe(self, subscriber):
+        self._subscribers = [entry for entry in self._subscribers if entry[0] is not subscriber]
+
+    def dispatch(self):
+        """立即通知所有待发送的变更"""
+        if self._timer is not None:
+            self._timer.stop()
+        pending, sources = self._pending, self._sources
+        self._pending, self._sources = {}, {}
+
+        for table, keys in pending.items():
+            keys = None if keys is None else frozenset(keys)
+            self.changed.emit(table, keys)
+            for subscriber, tables, handler in list(self._subscribers):
+                if table not in tables:
+                    continue
+                # 只有发布者自己时跳过；其他来源也有变化时仍需通知
+                if subscriber is not None and sources[table] == {subscriber}:
+                    continue
+                if isinstance(subscriber, QWidget) and not subscriber.isVisible():
+                    continue
+                try:
+                    handler(table, keys)
+                except Exception as e:
+                    self.logger.error(f"处理数据变更 {table} 错误: {str(e)}")
+
+
+_bus = None
+
+
+def get_change_bus():
+    """获取全局数据变更通知"""
+    global _bus
+    if _bus is None:
+        _bus = DataChangeBus()
+    return _bus
+
+
+def publish_change(table, keys=None, source=None):
+    """发布数据变更（get_change_bus().publish 的简写）"""
+    get_change_bus().publish(table, keys, source)
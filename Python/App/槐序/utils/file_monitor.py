@@ -1,25 +1,68 @@
 import os
-from PyQt5.QtCore import QObject, pyqtSignal
+import hashlib
+import logging
+from collections import defaultdict
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QRunnable, QThreadPool, QTimer, pyqtSignal
+from database.roster_service import ROSTER_TABLES, get_roster_service
+from utils.event_bus import get_change_bus
+from utils.archive_inspector import (
+    archive_inspector, is_archive, join_member_path, split_member_path
+)
+
+
+def list_folder(folder_path):
+    """获取文件夹中的文件列表，文件夹不存在时为空"""
+    if not os.path.exists(folder_path):
+        return set()
+    return set(os.listdir(folder_path))
+
+
+def build_submission_index(folder_path, files, student_ids):
+    """建立 学号 -> 提交文件 的索引
+
+    文件名包含学号的文件归属该学生；压缩包按名称归属学生后，其内部文件
+    作为提交内容一并列出。名称不含学号的压缩包（如整班打包）按内部文件名匹配。
+    """
+    index = {student_id: [] for student_id in student_ids}
+    for file in sorted(files):
+        owners = [s for s in student_ids if s in file]
+        if is_archive(file):
+            members = archive_inspector.member_names(os.path.join(folder_path, file))
+            if owners:
+                for student_id in owners:
+                    index[student_id].append(file)
+                    index[student_id].extend(join_member_path(file, m) for m in members)
+            else:
+                for member in members:
+                    for student_id in student_ids:
+                        if student_id in member:
+                            index[student_id].append(join_member_path(file, member))
+        else:
+            for student_id in owners:
+                index[student_id].append(file)
+    return index
 
 
 class AssignmentFolderMonitor(QObject):
     """监控作业文件夹变化的工具类"""
     files_changed = pyqtSignal(str)  # 信号，当文件变化时触发
 
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, known_files=None):
         super().__init__()
         self.folder_path = folder_path
-        self.known_files = self._get_current_files()
+        # 已在其他线程读取过目录时直接传入文件列表，避免再次读取
+        self.known_files = self._get_current_files() if known_files is None else set(known_files)
 
     def _get_current_files(self):
         """获取当前文件夹中的文件列表"""
-        if not os.path.exists(self.folder_path):
-            return set()
-        return set(os.listdir(self.folder_path))
+        return list_folder(self.folder_path)
 
     def check_for_changes(self):
         """检查文件夹是否有变化"""
-        current_files = self._get_current_files()
+        return self.apply_file_list(self._get_current_files())
+
+    def apply_file_list(self, current_files):
+        """用新读取的文件列表更新监控状态，返回是否有变化"""
         added = current_files - self.known_files
         removed = self.known_files - current_files
 
@@ -35,4 +78,297 @@ class AssignmentFolderMonitor(QObject):
         for file in self.known_files:
             if student_id in file:  # 假设文件名包含学号
                 files.append(file)
-        return files
\ No newline at end of file
+        return files
+
+    def get_submission_index(self, student_ids):
+        """建立 学号 -> 提交文件 的索引（规则见 build_submission_index）"""
+        return build_submission_index(self.folder_path, self.known_files, student_ids)
+
+    def file_digest(self, entry, algorithm='sha256'):
+        """计算提交文件的摘要，支持压缩包内文件（流式读取，不解压）"""
+        file_name, member_name = split_member_path(entry)
+        file_path = os.path.join(self.folder_path, file_name)
+        if member_name is not None:
+            return archive_inspector.hash_member(file_path, member_name, algorithm)
+
+        digest = hashlib.new(algorithm)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def file_size(self, entry):
+        """提交文件的大小（压缩包内文件取目录中记录的原始大小）"""
+        file_name, member_name = split_member_path(entry)
+        file_path = os.path.join(self.folder_path, file_name)
+        if member_name is None:
+            return os.path.getsize(file_path)
+        return next((m.size for m in archive_inspector.list_members(file_path) if m.name == member_name), 0)
+
+    def find_duplicate_submissions(self, index):
+        """查找不同学生提交的内容相同的文件，返回 [[(学号, 文件), ...], ...]
+
+        index 为 get_submission_index 的结果。先按大小分组，只有大小相同的文件才计算摘要；
+        压缩包本身不参与比较（打包时间不同内容也会不同），只比较其中的文件，空文件忽略。
+        """
+        by_size = defaultdict(list)
+        for student_id, entries in index.items():
+            for entry in entries:
+                if split_member_path(entry)[1] is None and is_archive(entry):
+                    continue
+                try:
+                    size = self.file_size(entry)
+                except OSError:
+                    continue
+                if size:
+                    by_size[size].append((student_id, entry))
+
+        duplicates = []
+        for candidates in by_size.values():
+            if len({student_id for student_id, _ in candidates}) < 2:
+                continue
+            by_digest = defaultdict(list)
+            for student_id, entry in candidates:
+                try:
+                    by_digest[self.file_digest(entry)].append((student_id, entry))
+                except (OSError, KeyError, ValueError) as e:
+                    logging.getLogger(__name__).warning(f"计算文件摘要错误 {entry}: {str(e)}")
+            duplicates.extend(group for group in by_digest.values()
+                              if len({student_id for student_id, _ in group}) > 1)
+        return duplicates
+
+
+class _DuplicateSignals(QObject):
+    finished = pyqtSignal(int, list)  # 文件夹ID, 重复的提交
+    failed = pyqtSignal(int, str)  # 文件夹ID, 错误信息
+
+
+class _DuplicateTask(QRunnable):
+    def __init__(self, folder_id, monitor, index, signals):
+        super().__init__()
+        self.folder_id = folder_id
+        self.monitor = monitor
+        self.index = index
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.folder_id, self.monitor.find_duplicate_submissions(self.index))
+        except Exception as e:
+            logging.getLogger(__name__).error(f"检查重复提交错误: {str(e)}")
+            self.signals.failed.emit(self.folder_id, str(e))
+
+
+class DuplicateFinder(QObject):
+    """在后台线程中查找内容相同的提交（需要读取文件内容计算摘要）"""
+    finished = pyqtSignal(int, list)  # 文件夹ID, [[(学号, 文件), ...], ...]
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._signals = _DuplicateSignals()
+        self._signals.finished.connect(self.finished)
+        self._signals.failed.connect(self.failed)
+
+    def start(self, folder_id, monitor, index):
+        self._pool.start(_DuplicateTask(folder_id, monitor, index, self._signals))
+
+    def shutdown(self):
+        """清除排队中的任务并等待正在执行的任务结束"""
+        self._pool.clear()
+        self._pool.waitForDone()
+
+
+class _ScanSignals(QObject):
+    finished = pyqtSignal(list)  # [(文件夹ID, 路径, 文件列表, 是否存在, (已提交, 应提交) 或 None), ...]
+
+
+class _ScanTask(QRunnable):
+    """在工作线程中读取文件夹和压缩包目录，统计提交人数"""
+
+    def __init__(self, jobs, signals):
+        super().__init__()
+        self.jobs = jobs  # [(文件夹ID, 路径, 上次的文件列表, 学号列表, 是否强制重新统计), ...]
+        self.signals = signals
+
+    def run(self):
+        results = []
+        for folder_id, folder_path, known_files, roster, force in self.jobs:
+            try:
+                files = list_folder(folder_path)
+                exists = os.path.isdir(folder_path)
+                counts = None
+                if force or files != known_files:
+                    index = build_submission_index(folder_path, files, roster)
+                    counts = (sum(1 for entries in index.values() if entries), len(roster))
+                results.append((folder_id, folder_path, files, exists, counts))
+            except Exception as e:
+                logging.getLogger(__name__).error(f"扫描作业文件夹错误 {folder_path}: {str(e)}")
+        self.signals.finished.emit(results)
+
+
+class AssignmentFolderService(QObject):
+    """作业文件夹监控服务
+
+    随主窗口启动，长期监控所有已登记的作业文件夹，在内存中维护
+    每个文件夹的提交人数，变化时通知界面。网络共享目录可能收不到
+    文件系统通知，因此另有低频轮询兜底。读取目录和压缩包在工作线程中
+    进行，同一时间只有一次扫描，期间的新请求合并到下一次。
+    """
+    counts_changed = pyqtSignal(int, int, int)  # 文件夹ID, 已提交人数, 应提交人数
+    files_changed = pyqtSignal(int)  # 文件夹ID
+
+    def __init__(self, db_conn, parent=None, debounce_ms=500, poll_interval_ms=30000):
+        super().__init__(parent)
+        self.db_conn = db_conn
+        self.logger = logging.getLogger(__name__)
+
+        self.monitors = {}  # 文件夹ID -> AssignmentFolderMonitor
+        self.rosters = {}  # 文件夹ID -> 学号列表
+        self.counts = {}  # 文件夹ID -> (已提交人数, 应提交人数)
+        self._path_to_folder = {}
+        self._dirty_paths = set()
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+
+        # 复制文件时会连续触发多次通知，合并后再统计
+        self._debounce_timer = QTimer(self)
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(debounce_ms)
+        self._debounce_timer.timeout.connect(self._process_dirty_paths)
+
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(poll_interval_ms)
+        self._poll_timer.timeout.connect(self.poll)
+
+        # 扫描在工作线程中进行
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._scan_signals = _ScanSignals()
+        self._scan_signals.finished.connect(self._on_scan_finished)
+        self._scanning = False
+        self._pending_scan = {}  # 文件夹ID -> 是否强制重新统计
+
+        # 作业文件夹或学生名单变化时重新统计
+        get_change_bus().subscribe(self, ('assignment_folders',) + ROSTER_TABLES,
+                                   lambda table, keys: self.reload_folders())
+
+    def start(self):
+        """加载作业文件夹并开始监控"""
+        self.reload_folders()
+        self._poll_timer.start()
+
+    def stop(self):
+        """停止监控，等待正在进行的扫描结束"""
+        self._poll_timer.stop()
+        self._debounce_timer.stop()
+        self._pending_scan = {}
+        self._pool.clear()
+        self._pool.waitForDone()
+        watched = self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+
+    def reload_folders(self):
+        """重新读取已登记的作业文件夹和对应课程的学生名单，并在后台重新统计"""
+        try:
+            cursor = self.db_conn.cursor()
+            cursor.execute("SELECT folder_id, folder_path, course_id FROM assignment_folders")
+            folders = cursor.fetchall()
+
+            roster_service = get_roster_service(self.db_conn)
+            course_students = {
+                course_id: roster_service.get_student_ids(course_id)
+                for course_id in {folder[2] for folder in folders}
+            }
+        except Exception as e:
+            self.logger.error(f"加载作业文件夹错误: {str(e)}")
+            return
+
+        for folder_id, folder_path, course_id in folders:
+            if folder_id not in self.monitors or self.monitors[folder_id].folder_path != folder_path:
+                # 文件列表由后台扫描填入
+                self.monitors[folder_id] = AssignmentFolderMonitor(folder_path, known_files=())
+            self.rosters[folder_id] = course_students.get(course_id, [])
+
+        current_ids = {folder[0] for folder in folders}
+        for folder_id in list(self.monitors):
+            if folder_id not in current_ids:
+                del self.monitors[folder_id]
+                self.rosters.pop(folder_id, None)
+                self.counts.pop(folder_id, None)
+
+        self._path_to_folder = {}
+        for folder_id, monitor in self.monitors.items():
+            self._path_to_folder.setdefault(os.path.normpath(monitor.folder_path), []).append(folder_id)
+
+        # 不再登记的目录停止监控，新目录在扫描确认存在后加入
+        removed = [path for path in self._watcher.directories() if path not in self._path_to_folder]
+        if removed:
+            self._watcher.removePaths(removed)
+
+        self._request_scan(self.monitors, force=True)
+
+    def get_monitor(self, folder_id):
+        """获取文件夹的监控对象（文件列表为最近一次扫描的结果）"""
+        return self.monitors.get(folder_id)
+
+    def get_counts(self, folder_id):
+        """获取文件夹的 (已提交人数, 应提交人数)"""
+        return self.counts.get(folder_id, (0, len(self.rosters.get(folder_id, []))))
+
+    def poll(self):
+        """轮询全部文件夹（兜底收不到通知的情况）"""
+        self._request_scan(self.monitors)
+
+    def _on_directory_changed(self, path):
+        self._dirty_paths.add(os.path.normpath(path))
+        self._debounce_timer.start()
+
+    def _process_dirty_paths(self):
+        dirty, self._dirty_paths = self._dirty_paths, set()
+        self._request_scan([folder_id for path in dirty for folder_id in self._path_to_folder.get(path, [])])
+
+    def _request_scan(self, folder_ids, force=False):
+        """请求在后台扫描这些文件夹；force 为 True 时即使文件列表未变也重新统计人数"""
+        for folder_id in folder_ids:
+            self._pending_scan[folder_id] = self._pending_scan.get(folder_id, False) or force
+        self._start_scan()
+
+    def _start_scan(self):
+        if self._scanning or not self._pending_scan:
+            return
+        pending, self._pending_scan = self._pending_scan, {}
+        jobs = [
+            (folder_id, self.monitors[folder_id].folder_path, set(self.monitors[folder_id].known_files),
+             list(self.rosters.get(folder_id, [])), force)
+            for folder_id, force in pending.items() if folder_id in self.monitors
+        ]
+        if jobs:
+            self._scanning = True
+            self._pool.start(_ScanTask(jobs, self._scan_signals))
+
+    def _on_scan_finished(self, results):
+        self._scanning = False
+        for folder_id, folder_path, files, exists, counts in results:
+            monitor = self.monitors.get(folder_id)
+            if monitor is None or monitor.folder_path != folder_path:
+                continue  # 扫描期间文件夹已被删除或修改
+
+            path = os.path.normpath(folder_path)
+            watched = path in self._watcher.directories()
+            if exists and not watched:
+                self._watcher.addPath(path)
+            elif not exists and watched:
+                self._watcher.removePath(path)
+
+            changed = monitor.apply_file_list(files)
+            if counts is not None and self.counts.get(folder_id) != counts:
+                self.counts[folder_id] = counts
+                self.counts_changed.emit(folder_id, *counts)
+            if changed:
+                self.files_changed.emit(folder_id)
+        self._start_scan()
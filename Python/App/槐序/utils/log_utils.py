@@ -0,0 +1,150 @@
+"""
+日志系统：队列异步写入、按大小轮转、重复消息限流、结构化耗时字段
+
+耗时日志: logger.info("...", **timing_extra("名称", 秒数)) 或 with log_timing(logger, "名称"): ...
+"""
+
+import time
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class RepeatSuppressionFilter(logging.Filter):
+    """重复日志限流
+
+    同一位置（如逐行导入时的警告）在 interval 秒内最多输出 burst 条，
+    其余丢弃；时间窗口结束后的下一条消息会附带被省略的条数。
+    按 logger、级别和调用位置（文件、行号）区分：消息多用 f-string 生成，内容各不相同，
+    同一行代码输出的日志算作重复。ERROR 及以上级别的日志是真正的故障，全部输出。
+    """
+
+    def __init__(self, interval=10.0, burst=5, min_level=logging.DEBUG, max_level=logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.min_level = min_level
+        self.max_level = max_level
+        self._lock = threading.Lock()
+        self._windows = {}  # 键 -> [窗口开始时间, 已输出条数, 已省略条数]
+
+    def filter(self, record):
+        if record.levelno < self.min_level or record.levelno > self.max_level:
+            return True
+        key = (record.name, record.levelno, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > 1000:
+                    self._expire(now)
+                if suppressed:
+                    record.msg = f"{record.msg}（前 {self.interval:g} 秒内另有 {suppressed} 条同一位置的消息已省略）"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+    def _expire(self, now):
+        for key in [k for k, w in self._windows.items() if now - w[0] >= self.interval and not w[2]]:
+            del self._windows[key]
+
+
+class TimingFormatter(logging.Formatter):
+    """在带耗时字段的日志后追加耗时"""
+
+    def format(self, record):
+        text = super().format(record)
+        duration_ms = getattr(record, 'duration_ms', None)
+        if duration_ms is not None:
+            text += f" [耗时 {duration_ms:.1f} ms]"
+        return text
+
+
+def timing_extra(name, seconds, **fields):
+    """耗时日志的结构化字段: timing（名称）、duration_ms 及其他自定义字段"""
+    extra = {'timing': name, 'duration_ms': seconds * 1000}
+    extra.update(fields)
+    return {'extra': extra}
+
+
+@contextmanager
+def log_timing(logger, name, level=logging.INFO, **fields):
+    """记录代码块耗时，日志记录带 timing、duration_ms 字段"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        logger.log(level, name, **timing_extra(name, time.perf_counter() - start, **fields))
+
+
+class TimingRecorder(logging.Handler):
+    """收集带耗时字段的日志记录（供启动分析等汇总使用）"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.timings = []  # (名称, 毫秒, logger 名称)
+
+    def emit(self, record):
+        duration_ms = getattr(record, 'duration_ms', None)
+        if duration_ms is not None:
+            self.timings.append((getattr(record, 'timing', record.getMessage()), duration_ms, record.name))
+
+
+_listener = None
+
+
+def setup_logging(log_file='grade_system.log', level=logging.INFO, max_bytes=5 * 1024 * 1024, backup_count=5):
+    """配置日志系统
+
+    根 logger 只挂一个 QueueHandler，调用日志的线程（通常是界面线程）只把记录放进队列；
+    写文件和控制台由 QueueListener 的后台线程完成。日志文件按大小轮转。
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = TimingFormatter(LOG_FORMAT)
+    handlers = []
+    try:
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding='utf-8', delay=True)
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+    except OSError as e:
+        print(f"无法打开日志文件 {log_file}: {str(e)}")
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    handlers.append(stream_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RepeatSuppressionFilter())
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,192 @@
+import os
+from collections import OrderedDict, namedtuple
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtGui import QImage
+from utils.archive_inspector import archive_inspector, is_archive, split_member_path
+
+TEXT_EXTENSIONS = (
+    '.txt', '.md', '.csv', '.log', '.json', '.xml', '.yaml', '.yml', '.ini',
+    '.py', '.java', '.c', '.h', '.cpp', '.hpp', '.cs', '.js', '.ts', '.html',
+    '.htm', '.css', '.sql', '.php', '.go', '.rs', '.sh', '.bat'
+)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp')
+
+MAX_TEXT_BYTES = 64 * 1024  # 文本预览最多读取的字节数
+MAX_IMAGE_BYTES = 20 * 1024 * 1024  # 超过此大小的图片不生成缩略图
+THUMBNAIL_SIZE = 480
+
+# kind: 'text' / 'image' / 'info'
+Preview = namedtuple('Preview', ['kind', 'text', 'image', 'size_bytes'])
+
+
+def preview_key(folder_path, entry):
+    """预览缓存键，包含文件修改时间，文件变化后自动失效"""
+    file_name, _ = split_member_path(entry)
+    try:
+        stat = os.stat(os.path.join(folder_path, file_name))
+        version = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        version = None
+    return folder_path, entry, version
+
+
+def _decode_text(data):
+    for encoding in ('utf-8', 'gbk'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+def _text_preview(data, truncated):
+    text = _decode_text(data)
+    if truncated:
+        text += "\n\n……（仅显示开头部分）"
+    return Preview('text', text, None, len(data) * 2)
+
+
+def _image_preview(data):
+    image = QImage()
+    if not image.loadFromData(data):
+        return Preview('info', "无法识别的图片", None, 64)
+    if image.width() > THUMBNAIL_SIZE or image.height() > THUMBNAIL_SIZE:
+        image = image.scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return Preview('image', f"{image.width()} x {image.height()}", image, image.sizeInBytes())
+
+
+def extract_preview(folder_path, entry):
+    """生成提交文件的预览（在工作线程中调用）"""
+    file_name, member_name = split_member_path(entry)
+    file_path = os.path.join(folder_path, file_name)
+    name = (member_name or file_name).lower()
+
+    try:
+        if member_name is None and is_archive(file_name):
+            members = archive_inspector.list_members(file_path)
+            lines = [f"{m.name}    {m.size} 字节" for m in members]
+            return Preview('text', f"压缩包内共 {len(members)} 个文件:\n" + "\n".join(lines), None,
+                           sum(len(line) for line in lines) * 2)
+
+        if member_name is not None:
+            size = next((m.size for m in archive_inspector.list_members(file_path) if m.name == member_name), 0)
+
+            def read_head(limit):
+                return archive_inspector.read_member_head(file_path, member_name, limit)
+        else:
+            size = os.path.getsize(file_path)
+
+            def read_head(limit):
+                with open(file_path, 'rb') as f:
+                    return f.read(limit)
+
+        if name.endswith(TEXT_EXTENSIONS):
+            return _text_preview(read_head(MAX_TEXT_BYTES), size > MAX_TEXT_BYTES)
+        if name.endswith(IMAGE_EXTENSIONS) and size <= MAX_IMAGE_BYTES:
+            return _image_preview(read_head(MAX_IMAGE_BYTES))
+        return Preview('info', f"该文件类型暂不支持预览\n文件大小: {size} 字节", None, 128)
+    except Exception as e:
+        return Preview('info', f"预览失败: {str(e)}", None, 128)
+
+
+class PreviewCache:
+    """按字节预算淘汰的 LRU 预览缓存"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._items = OrderedDict()
+
+    def get(self, key):
+        preview = self._items.get(key)
+        if preview is not None:
+            self._items.move_to_end(key)
+        return preview
+
+    def put(self, key, preview):
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old.size_bytes
+        if preview.size_bytes > self.max_bytes:
+            return
+
+        self._items[key] = preview
+        self.total_bytes += preview.size_bytes
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.total_bytes -= evicted.size_bytes
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        self._items.clear()
+        self.total_bytes = 0
+
+
+# 全局共享的预览缓存
+preview_cache = PreviewCache()
+
+
+class _PreviewSignals(QObject):
+    finished = pyqtSignal(object, object)  # 缓存键, Preview
+
+
+class _PreviewTask(QRunnable):
+    def __init__(self, key, signals):
+        super().__init__()
+        self.key = key
+        self.signals = signals
+
+    def run(self):
+        folder_path, entry, _ = self.key
+        self.signals.finished.emit(self.key, extract_preview(folder_path, entry))
+
+
+class PreviewLoader(QObject):
+    """在工作线程中生成预览，结果写入共享缓存后通知界面"""
+    preview_ready = pyqtSignal(object, object)  # 缓存键, Preview
+
+    PRIORITY_CURRENT = 10
+    PRIORITY_PREFETCH = 0
+
+    def __init__(self, cache=None, max_threads=2, parent=None):
+        super().__init__(parent)
+        self.cache = cache if cache is not None else preview_cache
+        self._in_flight = set()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max_threads)
+        self._signals = _PreviewSignals()
+        self._signals.finished.connect(self._on_finished)
+
+    def request(self, folder_path, entry, prefetch=False):
+        """请求预览，已缓存时立即通知并返回缓存键"""
+        key = preview_key(folder_path, entry)
+        preview = self.cache.get(key)
+        if preview is not None:
+            if not prefetch:
+                self.preview_ready.emit(key, preview)
+            return key
+
+        if key not in self._in_flight:
+            self._in_flight.add(key)
+            priority = self.PRIORITY_PREFETCH if prefetch else self.PRIORITY_CURRENT
+            self._pool.start(_PreviewTask(key, self._signals), priority)
+        return key
+
+    def _on_finished(self, key, preview):
+        self._in_flight.discard(key)
+        self.cache.put(key, preview)
+        self.preview_ready.emit(key, preview)
+
+    def shutdown(self):
+        """清除排队中的任务并等待正在执行的任务结束
+
+        被清除的任务不会再有结果，清空进行中的记录，窗口再次显示时重新请求这些预览。
+        """
+        self._pool.clear()
+        self._pool.waitForDone()
+        self._in_flight.clear()
@@ -0,0 +1,110 @@
+"""成绩报表计算（界面和命令行共用，不依赖 Qt）"""
+
+REPORT_HEADERS = ["学号", "姓名", "平时成绩", "期中成绩", "期末成绩", "总成绩", "等级", "排名"]
+
+# 总成绩权重: 平时20% + 期中30% + 期末40% + 课堂10%
+WEIGHTS = {'daily': 0.2, 'midterm': 0.3, 'final': 0.4, 'classroom': 0.1}
+
+REPORT_SQL = """
+    SELECT s.student_id,
+           s.name,
+           MAX(CASE WHEN sc.exam_type = '平时' THEN sc.score END) as daily_score,
+           MAX(CASE WHEN sc.exam_type = '期中' THEN sc.score END) as midterm_score,
+           MAX(CASE WHEN sc.exam_type = '期末' THEN sc.score END) as final_score,
+           cp.total_score                                         as classroom_total,
+           cp.bonus_score                                         as classroom_bonus,
+           -- 课程已评分活动的满分合计：学生缺评的活动按 0 分计，满分为 0 的活动只计加分
+           (SELECT SUM(a.max_score)
+            FROM classroom_activities a
+            WHERE a.course_id = ?
+              AND a.max_score > 0
+              AND EXISTS (SELECT 1 FROM classroom_scores x WHERE x.activity_id = a.activity_id)) as classroom_max
+    FROM students s
+             LEFT JOIN scores sc ON s.student_id = sc.student_id
+        AND sc.course_id = ?
+             LEFT JOIN classroom_participation cp ON cp.student_id = s.student_id
+        AND cp.course_id = ?
+    WHERE s.class_id = ?
+    GROUP BY s.student_id, s.name
+    ORDER BY s.student_id
+    """
+
+
+def grade_level(total_score):
+    """总成绩对应的等级"""
+    if total_score >= 90:
+        return "优秀"
+    if total_score >= 80:
+        return "良好"
+    if total_score >= 70:
+        return "中等"
+    if total_score >= 60:
+        return "及格"
+    return "不及格"
+
+
+def build_course_report(conn, course_id, class_id):
+    """计算课程、班级的成绩报表
+
+    返回按总成绩排序的行 (学号, 姓名, 平时, 期中, 期末, 总成绩, 等级, 排名)，列与 REPORT_HEADERS 对应。
+    """
+    cursor = conn.cursor()
+    # 课堂表现直接读取汇总表
+    cursor.execute(REPORT_SQL, (course_id, course_id, course_id, class_id))
+
+    student_scores = []
+    for student_id, name, daily, midterm, final, classroom_total, classroom_bonus, classroom_max in cursor.fetchall():
+        # 课堂成绩按课程全部已评分活动的满分折算为百分制，发言等加分按分值直接加上
+        classroom = classroom_bonus or 0
+        if classroom_max:
+            classroom += (classroom_total or 0) * 100 / classroom_max
+        classroom = max(0, min(100, classroom))
+
+        total_score = ((daily or 0) * WEIGHTS['daily'] + (midterm or 0) * WEIGHTS['midterm']
+                       + (final or 0) * WEIGHTS['final'] + classroom * WEIGHTS['classroom'])
+        total_score = round(total_score, 1)
+        student_scores.append((student_id, name, daily, midterm, final, total_score, grade_level(total_score)))
+
+    # 按总成绩排序确定排名
+    student_scores.sort(key=lambda x: x[5], reverse=True)
+    return [(*student, i + 1) for i, student in enumerate(student_scores)]
+
+
+def report_statistics(report_rows):
+    """报表统计信息，没有成绩时返回 None"""
+    total_scores = [row[5] for row in report_rows if row[5] > 0]
+    if not total_scores:
+        return None
+    return {
+        'average': sum(total_scores) / len(total_scores),
+        'max': max(total_scores),
+        'min': min(total_scores),
+        'pass_rate': sum(1 for s in total_scores if s >= 60) * 100 / len(total_scores),
+        'student_count': len(report_rows),
+    }
+
+
+def format_statistics(stats):
+    """统计信息的显示文本"""
+    if stats is None:
+        return "暂无成绩数据"
+    return (
+        f"统计信息: 平均分 {stats['average']:.1f} | "
+        f"最高分 {stats['max']:.1f} | "
+        f"最低分 {stats['min']:.1f} | "
+        f"及格率 {stats['pass_rate']:.1f}% | "
+        f"学生总数 {stats['student_count']}"
+    )
+
+
+def list_course_classes(conn):
+    """全部 (课程ID, 课程名, 班级ID, 班级名) 组合，用于批量导出"""
+    cursor = conn.cursor()
+    cursor.execute("""
+                   SELECT c.course_id, c.course_name, cl.class_id, cl.class_name
+                   FROM course_class cc
+                            JOIN courses c ON cc.course_id = c.course_id
+                            JOIN classes cl ON cc.class_id = cl.class_id
+                   ORDER BY c.course_name, cl.class_name
+                   """)
+    return cursor.fetchall()
@@ -0,0 +1,167 @@
+import sys
+import json
+import time
+import logging
+from contextlib import contextmanager
+from utils.log_utils import TimingRecorder, timing_extra
+
+# 启用启动分析的命令行参数，需在导入界面模块之前检查，才能统计到这些模块的导入耗时
+PROFILE_FLAG = '--profile-startup'
+# 写入 JSON 报告的路径参数（同时启用启动分析）；与上面的开关分开，避免把子命令误当作报告路径
+REPORT_FLAG = '--profile-report'
+
+
+class _ImportTimingFinder:
+    """记录每个模块导入耗时的 meta path 钩子
+
+    包装真正 loader 的 exec_module，按调用栈区分自身耗时和包含子模块的总耗时。
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self._stack = []
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+
+class _TimedLoader:
+    def __init__(self, loader, finder):
+        self._loader = loader
+        self._finder = finder
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        stack = self._finder._stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += total
+            self._finder.profiler.record_import(module.__name__, total - children, total)
+
+
+class StartupProfiler:
+    """启动耗时分析
+
+    按阶段记录启动耗时（phase），并统计启动期间每个模块的导入耗时。
+    未启用时各方法不做任何事情，可以放心留在启动流程中。
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.output_path = None
+        self.logger = logging.getLogger(__name__)
+        self._start = None
+        self._phases = []  # (阶段名, 耗时秒)
+        self._imports = {}  # 模块名 -> (自身耗时, 总耗时)
+        self._finder = None
+        self._recorder = None
+        self._reported = False
+
+    def enable_from_argv(self, argv=None):
+        """命令行中带有 --profile-startup 或 --profile-report PATH 时开始记录"""
+        argv = sys.argv if argv is None else argv
+        for i, arg in enumerate(argv):
+            if arg == PROFILE_FLAG:
+                self.enable()
+            elif arg == REPORT_FLAG and i + 1 < len(argv):
+                self.enable(argv[i + 1])
+            elif arg.startswith(REPORT_FLAG + '='):
+                self.enable(arg.split('=', 1)[1] or None)
+        return self.enabled
+
+    def enable(self, output_path=None):
+        if output_path:
+            self.output_path = output_path
+        if self.enabled:
+            return
+        self.enabled = True
+        self._start = time.perf_counter()
+        self._finder = _ImportTimingFinder(self)
+        sys.meta_path.insert(0, self._finder)
+        # 启动期间其他模块带耗时字段的日志（数据库迁移、窗口创建等）一并汇总到报告中
+        self._recorder = TimingRecorder()
+        logging.getLogger().addHandler(self._recorder)
+
+    def record_import(self, name, self_time, total_time):
+        self._imports[name] = (self_time, total_time)
+
+    @contextmanager
+    def phase(self, name):
+        """记录一个启动阶段的耗时"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases.append((name, time.perf_counter() - start))
+
+    def elapsed(self):
+        """从启用到现在经过的秒数"""
+        return time.perf_counter() - self._start if self.enabled else 0.0
+
+    def report(self, title="启动完成", top=20):
+        """停止统计导入并输出报告，只输出一次"""
+        if not self.enabled or self._reported:
+            return None
+        self._reported = True
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+        logging.getLogger().removeHandler(self._recorder)
+        timings = self._recorder.timings
+
+        total = self.elapsed()
+        imports = sorted(self._imports.items(), key=lambda item: item[1][0], reverse=True)
+        lines = [f"{title}，总耗时 {total * 1000:.1f} ms", "阶段耗时:"]
+        lines += [f"  {name:<20} {seconds * 1000:8.1f} ms" for name, seconds in self._phases]
+        if timings:
+            lines.append("其他耗时:")
+            lines += [f"  {name:<20} {ms:8.1f} ms  ({source})" for name, ms, source in timings]
+        lines.append(f"模块导入耗时（共 {len(imports)} 个，按自身耗时排序前 {top} 个）:")
+        lines += [
+            f"  {name:<40} 自身 {self_time * 1000:7.1f} ms  合计 {total_time * 1000:7.1f} ms"
+            for name, (self_time, total_time) in imports[:top]
+        ]
+        self.logger.info("\n".join(lines), **timing_extra(title, total))
+
+        result = {
+            'total_ms': total * 1000,
+            'phases': [{'name': name, 'ms': seconds * 1000} for name, seconds in self._phases],
+            'timings': [{'name': name, 'ms': ms, 'logger': source} for name, ms, source in timings],
+            'imports': [
+                {'module': name, 'self_ms': self_time * 1000, 'total_ms': total_time * 1000}
+                for name, (self_time, total_time) in imports
+            ],
+            'modules_loaded': sorted(sys.modules),
+        }
+        if self.output_path:
+            try:
+                with open(self.output_path, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False, indent=2)
+            except OSError as e:
+                self.logger.error(f"写入启动分析报告错误: {str(e)}")
+        return result
+
+
+# 全局实例
+startup_profiler = StartupProfiler()
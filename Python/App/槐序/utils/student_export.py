@@ -0,0 +1,234 @@
+"""
+学生数据导出
+
+按块读取查询结果并直接写入文件（CSV 或只写模式的 xlsx 工作簿），导出几万名学生时不在内存中保存整个结果；
+只有 xlsx 的共享字符串表（学号、姓名等）随人数增长。
+可选列：班级、所在班级的课程、成绩汇总（成绩条数、平均分、最高分、最低分）。
+导出在工作线程中进行，使用单独的数据库连接；先写入临时文件，完成后再替换目标文件，取消或出错时不留下半个文件。
+"""
+
+import os
+import csv
+import time
+import sqlite3
+import logging
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from utils.log_utils import timing_extra
+
+# 每次从游标读取的行数
+EXPORT_CHUNK = 1000
+
+# 可选列组: 键 -> (名称, [(表头, SQL 表达式)], 连接子句)
+# 课程列表按班级预先汇总（只有班级数那么多行）；成绩按学号的索引顺序连接并分组，结果仍可逐行读取
+EXPORT_COLUMNS = {
+    'class': ("班级", [
+        ("班级", "c.class_name"),
+    ], ""),
+    'courses': ("课程", [
+        ("课程", "cl.courses"),
+    ], """LEFT JOIN (SELECT cc.class_id, group_concat(co.course_name, '、') AS courses
+                    FROM course_class cc
+                             JOIN courses co ON co.course_id = cc.course_id
+                    GROUP BY cc.class_id) cl ON cl.class_id = s.class_id"""),
+    'scores': ("成绩汇总", [
+        ("成绩条数", "COUNT(sc.score)"),
+        ("平均分", "ROUND(AVG(sc.score), 1)"),
+        ("最高分", "MAX(sc.score)"),
+        ("最低分", "MIN(sc.score)"),
+    ], "LEFT JOIN scores sc ON sc.student_id = s.student_id"),
+}
+
+BASE_COLUMNS = [
+    ("学号", "s.student_id"),
+    ("姓名", "s.name"),
+    ("性别", "s.gender"),
+]
+
+logger = logging.getLogger(__name__)
+
+
+class ExportCancelled(Exception):
+    """导出被用户取消"""
+
+
+def build_export_query(columns, where=None, params=()):
+    """导出查询 (SQL, 参数, 表头)；where 为学生筛选条件（与学生列表相同，表别名 s、c）"""
+    selected = list(BASE_COLUMNS)
+    joins = []
+    for key, (_, key_columns, join) in EXPORT_COLUMNS.items():
+        if key in columns:
+            selected += key_columns
+            if join:
+                joins.append(join)
+    sql = f"""
+        SELECT {", ".join(expression for _, expression in selected)}
+        FROM students s
+                 LEFT JOIN classes c ON s.class_id = c.class_id
+                 {" ".join(joins)}
+        WHERE {where or "1 = 1"}
+        GROUP BY s.student_id
+        ORDER BY s.student_id
+        """
+    return sql, list(params), [header for header, _ in selected]
+
+
+def _write_csv(path, headers, chunks):
+    # 带 BOM，Excel 直接打开不会乱码
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for rows in chunks:
+            writer.writerows(rows)
+
+
+def _write_xlsx(path, headers, chunks):
+    # openpyxl 导入较慢，用到时再导入；只写模式逐行写出，不在内存中保存整个工作表
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("学生")
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    ws.append(header_cells)
+    for rows in chunks:
+        for row in rows:
+            ws.append(row)
+    wb.save(path)
+
+
+def export_students(conn, path, columns=(), where=None, params=(), progress=None, cancelled=None):
+    """导出学生到 path（按扩展名选择 xlsx 或 CSV），返回导出的学生数
+
+    progress(已导出, 总数) 在每块写入后调用；cancelled() 返回 True 时停止导出并抛出 ExportCancelled。
+    """
+    sql, params, headers = build_export_query(columns, where, params)
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM students s LEFT JOIN classes c ON s.class_id = c.class_id "
+                   f"WHERE {where or '1 = 1'}", params)
+    total = cursor.fetchone()[0]
+    exported = 0
+    stopped = False
+
+    def chunks():
+        # 取消时只结束读取，待写入的文件正常关闭后再删除
+        nonlocal exported, stopped
+        cursor.execute(sql, params)
+        while True:
+            if cancelled is not None and cancelled():
+                stopped = True
+                break
+            rows = cursor.fetchmany(EXPORT_CHUNK)
+            if not rows:
+                break
+            yield rows
+            exported += len(rows)
+            if progress is not None:
+                progress(exported, total)
+
+    temp_path = path + '.part'
+    try:
+        if path.lower().endswith('.csv'):
+            _write_csv(temp_path, headers, chunks())
+        else:
+            _write_xlsx(temp_path, headers, chunks())
+        if stopped:
+            raise ExportCancelled("导出已取消")
+        os.replace(temp_path, path)
+    finally:
+        cursor.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    logger.info(f"导出 {exported} 名学生到 {path}",
+                **timing_extra("导出学生", time.perf_counter() - start, students=exported))
+    return exported
+
+
+class _ExportSignals(QObject):
+    progress = pyqtSignal(int, int)  # 已导出, 总数
+    finished = pyqtSignal(str, int)  # 文件路径, 学生数
+    failed = pyqtSignal(str)  # 错误信息
+    cancelled = pyqtSignal()
+
+
+class _ExportTask(QRunnable):
+    def __init__(self, db_path, path, columns, where, params, exporter):
+        super().__init__()
+        self.db_path = db_path
+        self.path = path
+        self.columns = columns
+        self.where = where
+        self.params = params
+        self.exporter = exporter
+
+    def run(self):
+        signals = self.exporter._signals
+        # 工作线程使用单独的连接
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA busy_timeout = 3000")
+            count = export_students(conn, self.path, self.columns, self.where, self.params,
+                                    signals.progress.emit, lambda: self.exporter.cancel_requested)
+            signals.finished.emit(self.path, count)
+        except ExportCancelled:
+            signals.cancelled.emit()
+        except Exception as e:
+            logger.error(f"导出学生错误: {str(e)}")
+            signals.failed.emit(str(e))
+        finally:
+            conn.close()
+
+
+class StudentExporter(QObject):
+    """在后台线程中导出学生，同一时间只执行一个导出任务"""
+    export_progress = pyqtSignal(int, int)
+    export_finished = pyqtSignal(str, int)
+    export_failed = pyqtSignal(str)
+    export_cancelled = pyqtSignal()
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.running = False
+        self.cancel_requested = False
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._signals = _ExportSignals()
+        self._signals.progress.connect(self.export_progress)
+        self._signals.finished.connect(self._on_finished)
+        self._signals.failed.connect(self._on_failed)
+        self._signals.cancelled.connect(self._on_cancelled)
+
+    def start(self, path, columns=(), where=None, params=()):
+        """开始导出，已有导出在进行时返回 False"""
+        if self.running:
+            return False
+        self.running = True
+        self.cancel_requested = False
+        self._pool.start(_ExportTask(self.db_path, path, tuple(columns), where, tuple(params), self))
+        return True
+
+    def cancel(self):
+        self.cancel_requested = True
+
+    def wait(self):
+        """等待正在进行的导出结束"""
+        self._pool.waitForDone()
+
+    def _on_finished(self, path, count):
+        self.running = False
+        self.export_finished.emit(path, count)
+
+    def _on_failed(self, error):
+        self.running = False
+        self.export_failed.emit(error)
+
+    def _on_cancelled(self):
+        self.running = False
+        self.export_cancelled.emit()
@@ -0,0 +1,423 @@
+"""
+界面响应监控：记录事件循环卡顿、表格填充和打开对话框的耗时
+
+心跳定时器每 50 ms 触发一次，触发时间明显晚于预期说明主线程在这段时间内没有处理事件
+（界面"卡住"）。卡顿期间后台线程定时采样主线程的调用栈，把卡顿归到当时正在运行的
+槽函数或加载方法上；没有采到样本时归到与卡顿重叠的最长的计时区段（timed 装饰器）。
+
+    python main.py --ui-monitor                      显示监控浮层
+    python main.py --ui-monitor-report 报告.json     退出时写入报告（可与 --ui-monitor 同时使用）
+    HUAIXU_UI_MONITOR=1 python main.py              只监控，卡顿记录写入日志
+
+监控是开发者工具，默认不启动（心跳定时器、采样线程和全局事件过滤器都有额外开销）；
+运行中按 Ctrl+Shift+M 启动监控并显示或隐藏浮层，浮层中可以导出报告。
+"""
+
+import os
+import sys
+import json
+import time
+import inspect
+import logging
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+from PyQt5.QtWidgets import (
+    QApplication, QDialog, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, QFileDialog
+)
+from PyQt5.QtCore import Qt, QObject, QEvent, QTimer, pyqtSignal
+from utils.log_utils import timing_extra
+
+# 显示监控浮层的命令行参数，以及只启动监控的环境变量（退出时写入报告用 --ui-monitor-report PATH）
+MONITOR_FLAG = '--ui-monitor'
+MONITOR_ENV = 'HUAIXU_UI_MONITOR'
+
+# 心跳间隔，以及心跳晚到多久算作卡顿（毫秒）
+HEARTBEAT_MS = 50
+STALL_MS = 200
+
+# 卡顿期间采样主线程调用栈的间隔（秒）
+SAMPLE_INTERVAL = 0.02
+
+# 保留的卡顿记录条数，报告中每个窗口列出的最严重项数
+MAX_STALLS = 500
+TOP_OFFENDERS = 10
+
+# 用户操作后多久内显示的对话框计入打开耗时（秒）
+INPUT_WINDOW = 5.0
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIP_FILES = (os.path.abspath(__file__), os.path.join(APP_DIR, 'main.py'))
+
+INPUT_EVENTS = (QEvent.MouseButtonRelease, QEvent.KeyPress)
+
+logger = logging.getLogger(__name__)
+
+
+def _location(frame):
+    """调用栈帧对应的 "文件:函数"（文件为程序目录下的相对路径）"""
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{os.path.relpath(code.co_filename, APP_DIR)}:{name}"
+
+
+def _attribute(frame):
+    """从主线程调用栈中找出程序自身代码的最外层（槽函数）、最内层（具体位置）及最外层的方法所属的类
+
+    只读取代码对象，不访问其他线程帧的局部变量。
+    """
+    slot = where = owner = None
+    while frame is not None:
+        code = frame.f_code
+        filename = os.path.abspath(code.co_filename)
+        # 模块级代码（运行事件循环的入口）不作为槽函数
+        if filename.startswith(APP_DIR) and filename not in _SKIP_FILES and code.co_name != '<module>':
+            slot = _location(frame)
+            qualname = getattr(code, 'co_qualname', code.co_name)
+            if '.' in qualname:
+                owner = qualname.split('.')[0]
+            if where is None:
+                where = slot
+        frame = frame.f_back
+    return slot, where, owner
+
+
+class _Stat:
+    """耗时统计：次数、合计、最大值"""
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def as_dict(self, **fields):
+        return dict(fields, count=self.count, total_ms=round(self.total, 1),
+                    avg_ms=round(self.total / self.count, 1) if self.count else 0.0, max_ms=round(self.max, 1))
+
+
+class UiMonitor(QObject):
+    """事件循环卡顿监控及界面耗时统计
+
+    stall_detected(卡顿记录) 在主线程中发出，记录为字典:
+    at（时间）、ms（卡顿时长）、window（窗口类）、slot（槽函数）、where（最内层位置）。
+    """
+    stall_detected = pyqtSignal(object)
+
+    def __init__(self, heartbeat_ms=HEARTBEAT_MS, stall_ms=STALL_MS, parent=None):
+        super().__init__(parent)
+        self.heartbeat_ms = heartbeat_ms
+        self.stall_ms = stall_ms
+        self.running = False
+        # 命令行带 --ui-monitor 时，主窗口显示后打开监控浮层
+        self.overlay_requested = False
+        self.stalls = deque(maxlen=MAX_STALLS)
+        self.lag_ms = 0.0
+        self._stall_stats = {}  # (窗口, 槽函数) -> _Stat
+        self._timings = {}  # (类别, 窗口, 名称) -> _Stat
+        self._sections = deque(maxlen=64)  # 最近结束的计时区段 (开始, 结束, 窗口, 名称)
+        self._active = []  # 正在运行的计时区段 [开始, 窗口, 名称]
+        self._last_beat = time.perf_counter()
+        self._last_input = None
+        self._samples = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watchdog = None
+        self._main_ident = threading.main_thread().ident
+
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._beat)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._last_beat = time.perf_counter()
+        self._timer.start(self.heartbeat_ms)
+        app = QApplication.instance()
+        if app is not None:
+            app.installEventFilter(self)
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="UiMonitorWatchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self._timer.stop()
+        app = QApplication.instance()
+        if app is not None:
+            app.removeEventFilter(self)
+        self._stop.set()
+        self._watchdog.join()
+
+    # ---------- 卡顿检测 ----------
+
+    def _watch(self):
+        """后台线程: 主线程超过卡顿阈值仍未心跳时采样其调用栈"""
+        threshold = self.stall_ms / 1000
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            if time.perf_counter() - self._last_beat < threshold:
+                continue
+            frame = sys._current_frames().get(self._main_ident)
+            if frame is None:
+                continue
+            sample = _attribute(frame)
+            del frame
+            with self._lock:
+                self._samples.append(sample)
+
+    def _beat(self):
+        now = time.perf_counter()
+        elapsed_ms = (now - self._last_beat) * 1000
+        self.lag_ms = max(0.0, elapsed_ms - self.heartbeat_ms)
+        if self.lag_ms >= self.stall_ms:
+            self._record_stall(self._last_beat, now)
+        else:
+            with self._lock:
+                self._samples.clear()
+        self._last_beat = now
+
+    def _record_stall(self, start, end):
+        with self._lock:
+            samples, self._samples = self._samples, []
+        slot = where = window = None
+        if samples:
+            # 采样次数最多的槽函数，以及它最常见的最内层位置
+            counts = {}
+            for sample in samples:
+                counts[sample[0]] = counts.get(sample[0], 0) + 1
+            slot = max(counts, key=counts.get)
+            located = [sample for sample in samples if sample[0] == slot]
+            where = max(set(s[1] for s in located), key=lambda w: sum(1 for s in located if s[1] == w))
+            window = next((s[2] for s in located if s[2]), None)
+        if slot is None:
+            section = self._overlapping_section(start, end)
+            if section is not None:
+                window, slot = section
+                where = slot
+        if window is None:
+            active = QApplication.activeWindow()
+            window = type(active).__name__ if active is not None else "（无窗口）"
+
+        stall = {
+            'at': time.strftime('%H:%M:%S'),
+            'ms': round(self.lag_ms, 1),
+            'window': window,
+            'slot': slot or "（未知，可能在 Qt 内部）",
+            'where': where or "",
+        }
+        self.stalls.append(stall)
+        self._stall_stats.setdefault((window, stall['slot']), _Stat()).add(self.lag_ms)
+        logger.warning(f"界面卡顿 {self.lag_ms:.0f} ms: {window} {stall['slot']}",
+                       **timing_extra("界面卡顿", self.lag_ms / 1000, window=window, slot=stall['slot']))
+        self.stall_detected.emit(stall)
+
+    def _overlapping_section(self, start, end):
+        """与卡顿时间重叠最长的计时区段 (窗口, 名称)"""
+        best, best_overlap = None, 0.0
+        sections = list(self._sections) + [(s, end, w, n) for s, w, n in self._active]
+        for section_start, section_end, window, name in sections:
+            overlap = min(end, section_end) - max(start, section_start)
+            if overlap > best_overlap:
+                best, best_overlap = (window, name), overlap
+        return best
+
+    # ---------- 界面耗时 ----------
+
+    @contextmanager
+    def section(self, kind, window, name):
+        """记录一段界面操作的耗时（如 table_fill），同时用于卡顿归因；未启动监控时不记录"""
+        if not self.running:
+            yield
+            return
+        entry = [time.perf_counter(), window, name]
+        self._active.append(entry)
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._active.remove(entry)
+            self._sections.append((entry[0], end, window, name))
+            self.record(kind, window, name, (end - entry[0]) * 1000)
+
+    def record(self, kind, window, name, ms):
+        self._timings.setdefault((kind, window, name), _Stat()).add(ms)
+
+    def eventFilter(self, obj, event):
+        event_type = event.type()
+        if event_type in INPUT_EVENTS:
+            self._last_input = time.perf_counter()
+        elif event_type == QEvent.Show and self._last_input is not None and isinstance(obj, QWidget) \
+                and obj.isWindow() and not isinstance(obj, UiMonitorOverlay):
+            # 从用户操作到窗口显示的耗时
+            elapsed = time.perf_counter() - self._last_input
+            self._last_input = None
+            if elapsed <= INPUT_WINDOW:
+                parent = obj.parentWidget()
+                window = type(parent.window()).__name__ if parent is not None else type(obj).__name__
+                kind = 'dialog_open' if isinstance(obj, QDialog) else 'window_open'
+                self.record(kind, window, type(obj).__name__, elapsed * 1000)
+        return False
+
+    # ---------- 报告 ----------
+
+    def report(self):
+        """按窗口汇总的卡顿和耗时统计，每类按最大耗时排序"""
+        windows = {}
+
+        def window_entry(window):
+            return windows.setdefault(window, {'stall_count': 0, 'stall_ms': 0.0, 'stalls': [], 'timings': {}})
+
+        for (window, slot), stat in self._stall_stats.items():
+            entry = window_entry(window)
+            entry['stall_count'] += stat.count
+            entry['stall_ms'] = round(entry['stall_ms'] + stat.total, 1)
+            entry['stalls'].append(stat.as_dict(slot=slot))
+        for (kind, window, name), stat in self._timings.items():
+            window_entry(window)['timings'].setdefault(kind, []).append(stat.as_dict(name=name))
+
+        for entry in windows.values():
+            entry['stalls'] = sorted(entry['stalls'], key=lambda s: s['total_ms'], reverse=True)[:TOP_OFFENDERS]
+            for kind, items in entry['timings'].items():
+                entry['timings'][kind] = sorted(items, key=lambda s: s['max_ms'], reverse=True)[:TOP_OFFENDERS]
+        return {
+            'heartbeat_ms': self.heartbeat_ms,
+            'stall_threshold_ms': self.stall_ms,
+            'stall_count': sum(entry['stall_count'] for entry in windows.values()),
+            'worst_stalls': sorted(self.stalls, key=lambda s: s['ms'], reverse=True)[:TOP_OFFENDERS * 2],
+            'windows': dict(sorted(windows.items(), key=lambda item: item[1]['stall_ms'], reverse=True)),
+        }
+
+    def export_report(self, path):
+        """写入报告: .json 为 JSON，其他后缀为文本"""
+        report = self.report()
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.lower().endswith('.json'):
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            else:
+                f.write(format_report(report))
+        logger.info(f"界面响应报告已写入 {path}")
+
+
+KIND_NAMES = {'table_fill': "表格填充", 'dialog_open': "打开对话框", 'window_open': "打开窗口"}
+
+
+def format_report(report):
+    """报告的文本形式"""
+    lines = [f"界面卡顿 {report['stall_count']} 次（心跳 {report['heartbeat_ms']} ms，"
+             f"晚到 {report['stall_threshold_ms']} ms 以上记为卡顿）"]
+    for window, entry in report['windows'].items():
+        lines.append(f"\n{window}: 卡顿 {entry['stall_count']} 次，合计 {entry['stall_ms']:.0f} ms")
+        for stall in entry['stalls']:
+            lines.append(f"  卡顿 {stall['slot']:<50} {stall['count']:4d} 次  最长 {stall['max_ms']:7.0f} ms")
+        for kind, items in entry['timings'].items():
+            for item in items:
+                lines.append(f"  {KIND_NAMES.get(kind, kind)} {item['name']:<44} {item['count']:4d} 次  "
+                             f"平均 {item['avg_ms']:7.1f} ms  最长 {item['max_ms']:7.1f} ms")
+    if report['worst_stalls']:
+        lines.append("\n最严重的卡顿:")
+        lines += [f"  {s['at']} {s['ms']:7.0f} ms  {s['window']}  {s['slot']}  {s['where']}"
+                  for s in report['worst_stalls']]
+    return "\n".join(lines)
+
+
+_monitor = None
+
+
+def get_ui_monitor():
+    """获取全局界面响应监控"""
+    global _monitor
+    if _monitor is None:
+        _monitor = UiMonitor()
+    return _monitor
+
+
+def timed(kind='table_fill'):
+    """记录窗口方法耗时的装饰器，按 (类别, 窗口类, 方法名) 统计"""
+
+    def decorator(func):
+        # 与 PyQt 直接连接方法时一样，丢弃信号多传的参数（如 clicked 的 checked）
+        params = list(inspect.signature(func).parameters.values())[1:]
+        max_args = None if any(p.kind == p.VAR_POSITIONAL for p in params) else \
+            sum(1 for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with get_ui_monitor().section(kind, type(self).__name__, func.__name__):
+                return func(self, *args[:max_args], **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class UiMonitorOverlay(QWidget):
+    """开发者浮层：显示心跳延迟、卡顿次数和最近的卡顿，可导出报告"""
+
+    def __init__(self, monitor, parent=None):
+        super().__init__(parent, Qt.Tool | Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
+        self.monitor = monitor
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
+        self.setStyleSheet("background-color: rgba(30, 30, 30, 220); color: #e0e0e0; font-size: 12px;")
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(8, 6, 8, 6)
+        self.status_label = QLabel()
+        self.stalls_label = QLabel()
+        self.stalls_label.setStyleSheet("color: #ffb74d;")
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.stalls_label)
+
+        btn_layout = QHBoxLayout()
+        export_btn = QPushButton("导出报告")
+        export_btn.clicked.connect(self.export_report)
+        btn_layout.addStretch()
+        btn_layout.addWidget(export_btn)
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self._timer.start(500)
+        self.refresh()
+        self._place()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self._timer.stop()
+        super().hideEvent(event)
+
+    def _place(self):
+        parent = self.parentWidget()
+        self.adjustSize()
+        if parent is not None:
+            corner = parent.mapToGlobal(parent.rect().topRight())
+            self.move(corner.x() - self.width() - 16, corner.y() + 16)
+
+    def refresh(self):
+        stalls = list(self.monitor.stalls)
+        worst = max((s['ms'] for s in stalls), default=0)
+        self.status_label.setText(f"心跳延迟 {self.monitor.lag_ms:5.0f} ms   卡顿 {len(stalls)} 次   最长 {worst:.0f} ms")
+        self.stalls_label.setText("\n".join(f"{s['at']} {s['ms']:5.0f} ms  {s['window']}  {s['slot']}"
+                                            for s in stalls[-5:][::-1]) or "暂无卡顿")
+        self.adjustSize()
+
+    def export_report(self):
+        path, _ = QFileDialog.getSaveFileName(self, "导出界面响应报告", "ui_report.txt",
+                                              "文本文件 (*.txt);;JSON 文件 (*.json)")
+        if path:
+            try:
+                self.monitor.export_report(path)
+            except OSError as e:
+                logger.error(f"导出界面响应报告错误: {str(e)}")